@@ -0,0 +1,116 @@
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import current_app, request, jsonify, g
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+from sqlalchemy import select, delete
+from models import db, ApiRevocation
+import config
+
+# 令牌有效期（秒），默认 7 天
+TOKEN_MAX_AGE = config.env_int('API_TOKEN_MAX_AGE', 7 * 24 * 3600)
+# 每个 worker 重新加载吊销列表的间隔（秒）
+REVOCATION_TTL = 30
+
+
+# 从令牌中解析出的调用方身份，校验时不访问数据库
+@dataclass(frozen=True)
+class TokenUser:
+    id: int
+    role: str
+
+    @property
+    def is_admin(self):
+        return self.role == 'admin'
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.secret_key, salt='api-token')
+
+
+def issue_token(user):
+    """签发携带用户 ID 和角色的令牌（HMAC 签名 + 签发时间）。"""
+    return _serializer().dumps({'uid': user.id, 'role': user.login_type})
+
+
+class RevocationCache:
+    """{用户 ID: 吊销时间} 的进程内缓存，定期从数据库整体刷新。"""
+
+    def __init__(self, ttl=REVOCATION_TTL):
+        self.ttl = ttl
+        self._revoked = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def revoked_at(self, user_id):
+        with self._lock:
+            stale = self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+        if stale:
+            self.reload()
+        return self._revoked.get(user_id)
+
+    def reload(self):
+        rows = dict(db.session.execute(select(ApiRevocation.user_id, ApiRevocation.revoked_at)).all())
+        with self._lock:
+            self._revoked = rows
+            self._loaded_at = time.monotonic()
+
+    def add(self, user_id, revoked_at):
+        with self._lock:
+            self._revoked[user_id] = revoked_at
+
+    def clear(self):
+        with self._lock:
+            self._revoked = {}
+            self._loaded_at = None
+
+
+revocations = RevocationCache()
+
+
+def revoke_user(user_id):
+    """吊销该用户已签发的所有令牌，随调用方的事务提交。
+
+    本 worker 立即生效，其他 worker 在 REVOCATION_TTL 秒内生效。
+    """
+    now = datetime.utcnow().replace(microsecond=0)
+    db.session.execute(delete(ApiRevocation).where(ApiRevocation.user_id == user_id))
+    # 超过令牌有效期的吊销记录已不再需要
+    db.session.execute(delete(ApiRevocation).where(
+        ApiRevocation.revoked_at < now - timedelta(seconds=TOKEN_MAX_AGE)
+    ))
+    db.session.add(ApiRevocation(user_id=user_id, revoked_at=now))
+    revocations.add(user_id, now)
+
+
+def verify_token(token):
+    """校验令牌并返回 TokenUser；无效、过期或已吊销时抛出 ValueError。"""
+    try:
+        payload, issued_at = _serializer().loads(token, max_age=TOKEN_MAX_AGE, return_timestamp=True)
+    except SignatureExpired:
+        raise ValueError('令牌已过期')
+    except BadSignature:
+        raise ValueError('无效的令牌')
+    if not isinstance(payload, dict) or not isinstance(payload.get('uid'), int):
+        raise ValueError('无效的令牌')
+    revoked_at = revocations.revoked_at(payload['uid'])
+    if revoked_at is not None and issued_at.replace(tzinfo=None) <= revoked_at:
+        raise ValueError('令牌已失效')
+    return TokenUser(id=payload['uid'], role=payload.get('role', ''))
+
+
+def token_required(f):
+    """要求请求头带 Authorization: Bearer <token>，通过后 g.api_user 为 TokenUser。"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not token:
+            return jsonify({'error': '需要登录令牌'}), 401
+        try:
+            g.api_user = verify_token(token.strip())
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 401
+        return f(*args, **kwargs)
+    return decorated_function
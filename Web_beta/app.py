@@ -1,73 +1,119 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Flask, Response, render_template, request, redirect, url_for, session, jsonify, g, abort, stream_with_context
+from markupsafe import Markup
+from werkzeug.middleware.proxy_fix import ProxyFix
 from functools import wraps
 from datetime import datetime
 import os
-import sys
+import time
+import click
 import logging
 from dotenv import load_dotenv
-from models import db, User, Post, Comment, Like, Complaint, Todo
-
-# 设置日志记录
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s %(levelname)s: %(message)s',
-    handlers=[logging.StreamHandler(sys.stdout)]
-)
+from models import db, User, Post, Comment, Like, Complaint, Todo, UserScore
+import leaderboard
+import counters
+import reactions
+import reaction_queue
+import forum_events
+import identity
+import cascade
+import fragment_cache
+import config
+import logging_config
+import api_auth
+import passwords
+import search
+import transfer
+import instrumentation
+import replica
+from passwords import HashingBusy, TooManyAttempts
+from api_auth import token_required
+import todo_store
+from todo_store import ordered_todos, todo_to_dict
+from feed import load_forum_feed, load_post_comments, viewer_reactions, clamp_limit, FORUM_PAGE_SIZE, COMMENT_PAGE_SIZE
 
 # 加载环境变量
 load_dotenv()
 
+# 设置日志记录：级别、格式和抽样由环境变量控制，写日志在后台线程进行，见 logging_config.py
+logging_config.configure()
+error_log = logging.getLogger('http_errors')
+
 app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY', 'your-secret-key')
+# 部署在反向代理之后时，按代理层数从 X-Forwarded-For 取客户端 IP（用于登录限流）
+trusted_proxies = config.env_int('TRUSTED_PROXIES', 0)
+if trusted_proxies:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=trusted_proxies)
+
+# 每个请求的 SQL 次数、数据库与模板耗时统计，慢请求写日志
+instrumentation.init_app(app)
+
+# 点赞/投诉可选延迟写入（REACTION_WRITE_MODE=queue），后台线程需要 app context
+reaction_queue.init_app(app)
+forum_events.init_app(app)
 
 # 配置数据库
-database_url = os.getenv('DATABASE_URL')
+database_url = config.database_url()
 if database_url:
-    # 修复 Render 的 PostgreSQL URL
-    if database_url.startswith('postgres://'):
-        database_url = database_url.replace('postgres://', 'postgresql://', 1)
     app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = config.engine_options(database_url)
     logging.info(f"Database URL configured: {database_url.split('@')[0]}@*****")
 else:
     logging.error("No DATABASE_URL environment variable found!")
     
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# 可选的只读副本（DATABASE_READ_URL），只有 replica.read_only 装饰的视图读副本
+replica.init_app(app)
+if replica.READ_URL:
+    logging.info(f"Read replica configured: {replica.READ_URL.split('@')[0]}@*****")
+
 # 初始化数据库
 db.init_app(app)
 
 @app.errorhandler(500)
 def internal_error(error):
-    logging.error(f"Internal Server Error: {error}")
+    error_log.error('Internal server error',
+                    exc_info=getattr(error, 'original_exception', None),
+                    extra={'status': 500, 'method': request.method, 'path': request.path})
     return "Internal Server Error", 500
 
 @app.errorhandler(404)
 def not_found_error(error):
-    logging.error(f"Page Not Found: {error}")
+    error_log.info('Page not found',
+                   extra={'status': 404, 'method': request.method, 'path': request.path})
     return "Page Not Found", 404
 
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'username' not in session:
+        user_id = session.get('user_id')
+        if user_id is None and 'username' in session:
+            user_id = identity.user_id_for_username(session['username'])
+            session['user_id'] = user_id
+        # 每个请求只解析一次当前用户，之后视图直接读取 g.user
+        user = identity.load_user(user_id) if user_id is not None else None
+        # 用户删除后 ID 可能被新用户复用（SQLite 的 rowid），用户名也要一致，旧 cookie 不会登录成新用户
+        if user is not None and user.username != session.get('username'):
+            user = None
+        if user is None:
+            session.clear()  # 清除无效的session
             return redirect(url_for('login'))
+        g.user = user
         return f(*args, **kwargs)
     return decorated_function
 
+def log_in(user):
+    session['user_id'] = user.id
+    session['username'] = user.username
+    identity.remember(user)
+
 @app.route('/')
+@login_required
 def index():
-    if 'username' in session:
-        username = session['username']
-        user = User.query.filter_by(username=username).first()
-        if user is None:
-            session.clear()  # 清除无效的session
-            return redirect(url_for('login'))
-        is_admin = user.login_type == 'admin'
-        return render_template('dashboard.html', 
-                            username=username,
-                            is_admin=is_admin)
-    return redirect(url_for('login'))
+    return render_template('dashboard.html', 
+                        username=g.user.username,
+                        is_admin=g.user.is_admin)
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -77,28 +123,37 @@ def login():
         username = request.form['username']
         password = request.form['password']
         
-        user = User.query.filter_by(username=username).first()
-        
-        if login_type == 'admin':
-            if user and user.login_type == 'admin':
-                if check_password_hash(user.password, password):
-                    session['username'] = username
-                    return redirect(url_for('index'))
+        try:
+            # 哈希计算前先限流，并在有界的哈希池中执行，登录高峰不会占满所有 worker
+            passwords.check_login_rate(username, request.remote_addr)
+            user = User.query.filter_by(username=username).first()
+            
+            if login_type == 'admin':
+                if user and user.login_type == 'admin':
+                    if passwords.verify_and_upgrade(user, password):
+                        db.session.commit()
+                        log_in(user)
+                        return redirect(url_for('index'))
+                    else:
+                        message = '用户名或密码错误。'
                 else:
                     message = '用户名或密码错误。'
-            else:
-                message = '用户名或密码错误。'
-        
-        elif login_type == 'birth':
-            birthdate = request.form['birthdate']
-            if user and user.login_type == 'birth':
-                if check_password_hash(user.password, password) and user.birthdate == birthdate:
-                    session['username'] = username
-                    return redirect(url_for('index'))
+            
+            elif login_type == 'birth':
+                birthdate = request.form['birthdate']
+                if user and user.login_type == 'birth':
+                    if user.birthdate == birthdate and passwords.verify_and_upgrade(user, password):
+                        db.session.commit()
+                        log_in(user)
+                        return redirect(url_for('index'))
+                    else:
+                        message = '用户名、密码或出生日期不正确。'
                 else:
-                    message = '用户名、密码或出生日期不正确。'
-            else:
-                message = '此用户名未被预设，请联系管理员。'
+                    message = '此用户名未被预设，请联系管理员。'
+            if message:
+                passwords.login_failed(username, request.remote_addr)
+        except (TooManyAttempts, HashingBusy) as e:
+            message = str(e)
     
     return render_template('login.html', message=message)
 
@@ -109,15 +164,11 @@ def logout():
 
 @app.route('/todos')
 @login_required
+@replica.read_only
 def todos():
-    username = session['username']
-    user = User.query.filter_by(username=username).first()
-    todos = Todo.query.filter_by(user_id=user.id).order_by(
-        Todo.completed,
-        Todo.priority != 'urgent',
-        Todo.priority != 'medium',
-        Todo.created_at.desc()
-    ).all()
+    user = g.user
+    username = user.username
+    todos = ordered_todos(user.id)
     
     return render_template('todos.html', 
                         todos=todos,
@@ -126,8 +177,7 @@ def todos():
 @app.route('/add-todo', methods=['POST'])
 @login_required
 def add_todo():
-    username = session['username']
-    user = User.query.filter_by(username=username).first()
+    user = g.user
     task = request.form.get('task')
     date = request.form.get('date', '')
     time = request.form.get('time', '')
@@ -138,8 +188,10 @@ def add_todo():
             task=task,
             date=date,
             time=time,
+            due_at=todo_store.due_at_for(date, time),
             priority=priority,
-            user_id=user.id
+            user_id=user.id,
+            change_seq=todo_store.next_change(user.id)
         )
         db.session.add(new_todo)
         db.session.commit()
@@ -149,47 +201,71 @@ def add_todo():
 @app.route('/toggle-todo/<int:todo_id>')
 @login_required
 def toggle_todo(todo_id):
-    username = session['username']
-    user = User.query.filter_by(username=username).first()
-    todo = Todo.query.filter_by(id=todo_id, user_id=user.id).first()
-    
-    if todo:
-        todo.completed = not todo.completed
+    if todo_store.toggle(g.user.id, todo_id) is not None:
         db.session.commit()
     
     return redirect(url_for('todos'))
 
+@app.route('/complete-all-todos', methods=['POST'])
+@login_required
+def complete_all_todos():
+    todo_store.complete_all(g.user.id)
+    db.session.commit()
+    return redirect(url_for('todos'))
+
+@app.route('/delete-completed-todos', methods=['POST'])
+@login_required
+def delete_completed_todos():
+    todo_store.delete_completed(g.user.id)
+    db.session.commit()
+    return redirect(url_for('todos'))
+
 @app.route('/delete-todo/<int:todo_id>')
 @login_required
 def delete_todo(todo_id):
-    username = session['username']
-    user = User.query.filter_by(username=username).first()
-    todo = Todo.query.filter_by(id=todo_id, user_id=user.id).first()
-    
-    if todo:
-        db.session.delete(todo)
+    if todo_store.delete_one(g.user.id, todo_id):
         db.session.commit()
     
     return redirect(url_for('todos'))
 
+# 待办页面通过 fetch 调用的 JSON 版本，只执行一次写操作，不重新渲染页面
+@app.route('/api/todos/<int:todo_id>/toggle', methods=['POST'])
+@login_required
+def api_toggle_todo(todo_id):
+    completed = todo_store.toggle(g.user.id, todo_id)
+    if completed is None:
+        return jsonify({'success': False, 'message': '待办不存在'}), 404
+    db.session.commit()
+    return jsonify({'success': True, 'id': todo_id, 'completed': completed})
+
+@app.route('/api/todos/<int:todo_id>/delete', methods=['POST'])
+@login_required
+def api_delete_todo(todo_id):
+    if not todo_store.delete_one(g.user.id, todo_id):
+        return jsonify({'success': False, 'message': '待办不存在'}), 404
+    db.session.commit()
+    return jsonify({'success': True, 'id': todo_id})
+
+# 用户管理页面模板需要 {用户名: {'birthdate': ...}} 结构
+def preset_users():
+    users = User.query.filter_by(login_type='birth').all()
+    return {user.username: {'birthdate': user.birthdate} for user in users}
+
 @app.route('/user-management')
 @login_required
 def user_management():
-    username = session['username']
-    user = User.query.filter_by(username=username).first()
+    user = g.user
     
     if user.login_type != 'admin':
         return redirect(url_for('index'))
     
-    users = User.query.filter_by(login_type='birth').all()
-    users_dict = {user.username: {'birthdate': user.birthdate} for user in users}
-    return render_template('user_management.html', users=users_dict)
+    return render_template('user_management.html', users=preset_users())
 
 @app.route('/create-user', methods=['POST'])
 @login_required
 def create_user():
-    admin_username = session['username']
-    admin = User.query.filter_by(username=admin_username).first()
+    admin = g.user
+    admin_username = admin.username
     
     if admin.login_type != 'admin':
         return redirect(url_for('index'))
@@ -200,52 +276,59 @@ def create_user():
     
     if username and password and birthdate:
         if User.query.filter_by(username=username).first():
-            users = User.query.filter_by(login_type='birth').all()
             return render_template('user_management.html', 
                                 message='用户名已存在',
                                 success=False,
-                                users=users)
+                                users=preset_users())
+        
+        try:
+            password_hash = passwords.hash_password(password)
+        except HashingBusy as e:
+            return render_template('user_management.html', 
+                                message=str(e),
+                                success=False,
+                                users=preset_users())
         
         new_user = User(
             username=username,
-            password=generate_password_hash(password),
+            password=password_hash,
             birthdate=birthdate,
             login_type='birth',
             created_by=admin_username
         )
         db.session.add(new_user)
+        db.session.flush()
+        leaderboard.add_user(new_user)
+        fragment_cache.bump(fragment_cache.LEADERBOARD)
+        identity.users_changed()
         db.session.commit()
         
-        users = User.query.filter_by(login_type='birth').all()
         return render_template('user_management.html', 
                             message='用户创建成功',
                             success=True,
-                            users=users)
+                            users=preset_users())
     
-    users = User.query.filter_by(login_type='birth').all()
     return render_template('user_management.html', 
                         message='请填写所有必填字段',
                         success=False,
-                        users=users)
+                        users=preset_users())
 
 @app.route('/delete-user/<username>')
 @login_required
 def delete_user(username):
-    admin_username = session['username']
-    admin = User.query.filter_by(username=admin_username).first()
+    admin = g.user
+    admin_username = admin.username
     
     if admin.login_type != 'admin':
         return redirect(url_for('index'))
     
-    user = User.query.filter_by(username=username).first()
-    if user and user.username != admin_username:
-        # 删除用户的所有数据
-        Todo.query.filter_by(user_id=user.id).delete()
-        Like.query.filter_by(user_id=user.id).delete()
-        Complaint.query.filter_by(user_id=user.id).delete()
-        Comment.query.filter_by(author_id=user.id).delete()
-        Post.query.filter_by(author_id=user.id).delete()
-        db.session.delete(user)
+    user_id = db.session.query(User.id).filter_by(username=username).scalar()
+    if user_id and username != admin_username:
+        # 删除用户的所有数据（固定数量的集合删除语句）
+        cascade.delete_user(user_id)
+        fragment_cache.bump(fragment_cache.FORUM, fragment_cache.LEADERBOARD)
+        api_auth.revoke_user(user_id)
+        identity.users_changed()
         db.session.commit()
     
     return redirect(url_for('user_management'))
@@ -253,8 +336,7 @@ def delete_user(username):
 @app.route('/view-user-todos/<username>')
 @login_required
 def view_user_todos(username):
-    admin_username = session['username']
-    admin = User.query.filter_by(username=admin_username).first()
+    admin = g.user
     
     if admin.login_type != 'admin':
         return redirect(url_for('index'))
@@ -263,12 +345,7 @@ def view_user_todos(username):
     if not user:
         return redirect(url_for('user_management'))
     
-    todos = Todo.query.filter_by(user_id=user.id).order_by(
-        Todo.completed,
-        Todo.priority != 'urgent',
-        Todo.priority != 'medium',
-        Todo.created_at.desc()
-    ).all()
+    todos = ordered_todos(user.id)
     
     return render_template('user_todos.html', 
                         todos=todos,
@@ -277,37 +354,84 @@ def view_user_todos(username):
 
 @app.route('/forum')
 @login_required
+@replica.read_only
 def forum():
-    username = session['username']
-    user = User.query.filter_by(username=username).first()
+    user = g.user
+    username = user.username
     is_admin = user.login_type == 'admin'
     
-    posts = Post.query.order_by(Post.created_at.desc()).all()
+    # 与用户无关的帖子列表片段按内容版本缓存（键集分页）
+    cursor = request.args.get('cursor')
+    limit = clamp_limit(request.args.get('limit'), FORUM_PAGE_SIZE)
     
-    # 处理每个帖子的数据
-    for post in posts:
-        post.like_count = post.likes.count()
-        post.complaint_count = post.complaints.count()
-        post.is_liked = post.likes.filter_by(user_id=user.id).first() is not None
-        post.is_complained = post.complaints.filter_by(user_id=user.id).first() is not None
-        post.author_name = post.author.username
-        
-        # 处理评论数据
-        comments = Comment.query.filter_by(post_id=post.id).all()
-        for comment in comments:
-            comment.author_name = comment.author.username
-        post.comments = comments
+    def build():
+        posts, next_cursor = load_forum_feed(None, cursor=cursor, limit=limit)
+        return {
+            'html': render_template('_forum_posts.html', posts=posts),
+            'post_ids': [post.id for post in posts],
+            'next_cursor': next_cursor
+        }
+    
+    version = fragment_cache.content_versions().get(fragment_cache.FORUM, 0)
+    try:
+        page = fragment_cache.cache.fetch(fragment_cache.FORUM, version, f"{cursor or ''}|{limit}", build)
+    except ValueError:
+        return redirect(url_for('forum'))
+    
+    # 命中缓存后只需一条查询取当前用户的点赞/投诉状态
+    liked, complained = viewer_reactions(user.id, page['post_ids'])
+    posts_html = fragment_cache.overlay(page['html'], {
+        'liked': liked,
+        'complained': complained,
+        'admin': {0} if is_admin else set()
+    })
     
     return render_template('forum.html', 
                         username=username,
                         is_admin=is_admin,
-                        posts=posts)
+                        posts_html=Markup(posts_html),
+                        next_cursor=page['next_cursor'],
+                        live_updates=not cursor)
+
+@app.route('/forum/stream')
+@login_required
+def forum_stream():
+    # Server-Sent Events：推送新帖子、新评论、计数变化和删除，页面增量更新
+    subscriber = forum_events.broker.subscribe()
+    if subscriber is None:
+        # 超出本进程的连接上限；EventSource 收到 204 后不再重连，页面退回手动刷新
+        return '', 204
+    forum_events.ensure_poller()
+    # 先订阅再补发，中间的事件可能重复，页面按事件 id 去重
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    backlog = forum_events.replay(last_id) if last_id is not None else []
+    # 响应体不使用 stream_with_context，数据库会话在返回前就已释放
+    return Response(forum_events.stream(subscriber, backlog),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def search_page_args():
+    query = request.args.get('q', '').strip()
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('limit', search.PAGE_SIZE, type=int)
+    return query, page, per_page
+
+@app.route('/forum/search')
+@login_required
+@replica.read_only
+def forum_search():
+    query, page, per_page = search_page_args()
+    hits, has_more = search.search(query, page=page, per_page=per_page)
+    return render_template('search.html',
+                        query=query,
+                        hits=hits,
+                        page=page,
+                        has_more=has_more)
 
 @app.route('/create-post', methods=['POST'])
 @login_required
 def create_post():
-    username = session['username']
-    user = User.query.filter_by(username=username).first()
+    user = g.user
     content = request.form.get('content')
     
     if content:
@@ -316,6 +440,10 @@ def create_post():
             author_id=user.id
         )
         db.session.add(new_post)
+        db.session.flush()
+        search.index_post(new_post.id, content)
+        fragment_cache.bump(fragment_cache.FORUM)
+        forum_events.post_created(new_post, user.username)
         db.session.commit()
     
     return redirect(url_for('forum'))
@@ -323,8 +451,7 @@ def create_post():
 @app.route('/create-comment/<int:post_id>', methods=['POST'])
 @login_required
 def create_comment(post_id):
-    username = session['username']
-    user = User.query.filter_by(username=username).first()
+    user = g.user
     content = request.form.get('content')
     
     if content:
@@ -334,86 +461,187 @@ def create_comment(post_id):
             author_id=user.id
         )
         db.session.add(new_comment)
+        db.session.flush()
+        search.index_comment(new_comment.id, post_id, content)
+        counters.bump(post_id, comment_count=1)
+        fragment_cache.bump(fragment_cache.FORUM)
+        forum_events.comment_created(new_comment, user.username)
         db.session.commit()
     
     return redirect(url_for('forum'))
 
+def toggle_reaction(model, post_id, user_id):
+    """切换点赞或投诉，同步排行榜、帖子计数和片段缓存版本，返回 (计数变化, 帖子的 (点赞数, 投诉数))。
+
+    帖子不存在时后者为 None，调用方应回滚；延迟写入模式下计数由后台线程更新，后者也为 None。
+    """
+    if reaction_queue.enabled():
+        # 延迟写入模式：只记入队列，计数、排行榜和缓存版本由后台线程写库时一并更新
+        return reaction_queue.toggle(model, post_id, user_id), None
+    # 唯一索引保证一次删除（没有删到时再插入）即可完成切换；计数用 UPDATE ... RETURNING 调整并取回
+    delta = reactions.toggle(model, post_id, user_id)
+    if model is Like:
+        counts = counters.apply(post_id, like_count=delta)
+        if counts is not None:
+            leaderboard.apply_reaction(post_id, likes=delta)
+    else:
+        counts = counters.apply(post_id, complaint_count=delta)
+        if counts is not None:
+            leaderboard.apply_reaction(post_id, complaints=delta)
+    if delta and counts is not None:
+        fragment_cache.bump(fragment_cache.FORUM, fragment_cache.LEADERBOARD)
+        forum_events.counts_updated(post_id, *counts)
+    return delta, counts
+
+# 不支持 fetch 时的整页版本；帖子已删除时不写入，避免留下孤立的点赞/投诉
+def toggle_reaction_page(model, post_id, counter):
+    if counters.current(post_id, counter) is not None:
+        toggle_reaction(model, post_id, g.user.id)
+        db.session.commit()
+    return redirect(url_for('forum'))
+
 @app.route('/toggle-like/<int:post_id>')
 @login_required
 def toggle_like(post_id):
-    username = session['username']
-    user = User.query.filter_by(username=username).first()
-    
-    like = Like.query.filter_by(post_id=post_id, user_id=user.id).first()
-    if like:
-        db.session.delete(like)
-    else:
-        new_like = Like(post_id=post_id, user_id=user.id)
-        db.session.add(new_like)
-    
-    db.session.commit()
-    return redirect(url_for('forum'))
+    return toggle_reaction_page(Like, post_id, 'like_count')
 
 @app.route('/toggle-complaint/<int:post_id>')
 @login_required
 def toggle_complaint(post_id):
-    username = session['username']
-    user = User.query.filter_by(username=username).first()
-    
-    complaint = Complaint.query.filter_by(post_id=post_id, user_id=user.id).first()
-    if complaint:
-        db.session.delete(complaint)
-    else:
-        new_complaint = Complaint(post_id=post_id, user_id=user.id)
-        db.session.add(new_complaint)
+    return toggle_reaction_page(Complaint, post_id, 'complaint_count')
+
+# 论坛页面通过 fetch 调用的 JSON 版本，只返回新的状态和计数
+def api_toggle_reaction(model, post_id, counter):
+    if reaction_queue.enabled():
+        count = counters.current(post_id, counter)
+        if count is None:
+            return jsonify({'success': False, 'message': '帖子不存在'}), 404
+        delta, _ = toggle_reaction(model, post_id, g.user.id)
+        db.session.commit()
+        count += reaction_queue.pending_delta(model, post_id)
+        return jsonify({'success': True, 'post_id': post_id, 'active': delta > 0, 'count': count})
     
+    delta, counts = toggle_reaction(model, post_id, g.user.id)
+    if counts is None:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': '帖子不存在'}), 404
     db.session.commit()
-    return redirect(url_for('forum'))
+    count = getattr(counts, counter)
+    # delta 为 0 说明并发请求已抢先插入，此时仍视为已点赞/投诉
+    return jsonify({'success': True, 'post_id': post_id, 'active': delta >= 0, 'count': count})
+
+@app.route('/api/posts/<int:post_id>/like', methods=['POST'])
+@login_required
+def api_toggle_like(post_id):
+    return api_toggle_reaction(Like, post_id, 'like_count')
+
+@app.route('/api/posts/<int:post_id>/complaint', methods=['POST'])
+@login_required
+def api_toggle_complaint(post_id):
+    return api_toggle_reaction(Complaint, post_id, 'complaint_count')
 
 @app.route('/delete-post/<int:post_id>')
 @login_required
 def delete_post(post_id):
-    username = session['username']
-    user = User.query.filter_by(username=username).first()
+    user = g.user
     
     if user.login_type != 'admin':
         return redirect(url_for('forum'))
     
-    post = Post.query.get(post_id)
-    if post:
-        # 删除相关的评论、点赞和投诉
-        Comment.query.filter_by(post_id=post_id).delete()
-        Like.query.filter_by(post_id=post_id).delete()
-        Complaint.query.filter_by(post_id=post_id).delete()
-        db.session.delete(post)
+    # 扣除作者分数并删除帖子及其评论、点赞和投诉
+    if cascade.delete_post(post_id):
+        fragment_cache.bump(fragment_cache.FORUM, fragment_cache.LEADERBOARD)
+        forum_events.post_deleted(post_id)
         db.session.commit()
+    else:
+        db.session.rollback()
     
     return redirect(url_for('forum'))
 
 @app.route('/group-leader')
 @login_required
+@replica.read_only
 def group_leader():
-    username = session['username']
-    users = User.query.all()
+    # 分数由 leaderboard 模块在写操作时增量维护；渲染好的列表按内容版本缓存
+    def build():
+        return render_template('_leaderboard.html', users=leaderboard.top_users())
     
-    # 计算每个用户的统计数据
-    for user in users:
-        # 获取用户的所有帖子
-        posts = Post.query.filter_by(author_id=user.id).all()
-        
-        # 计算总点赞和投诉数
-        total_likes = sum(post.likes.count() for post in posts)
-        total_complaints = sum(post.complaints.count() for post in posts)
-        
-        # 添加到用户对象
-        user.total_likes = total_likes
-        user.total_complaints = total_complaints
-        user.net_score = total_likes - total_complaints
+    version = fragment_cache.content_versions().get(fragment_cache.LEADERBOARD, 0)
+    users_html = fragment_cache.cache.fetch(fragment_cache.LEADERBOARD, version, 'top', build)
+    
+    return render_template('group_leader.html', users_html=Markup(users_html))
+
+@app.route('/admin/metrics')
+@login_required
+def admin_metrics():
+    if not g.user.is_admin:
+        return redirect(url_for('index'))
+    
+    rows = instrumentation.endpoint_metrics.snapshot()
+    if request.args.get('format') == 'json':
+        return jsonify({'window_minutes': instrumentation.WINDOW_MINUTES,
+                        'buckets': instrumentation.BUCKETS,
+                        'endpoints': rows})
+    return render_template('admin_metrics.html',
+                        rows=rows,
+                        window=instrumentation.WINDOW_MINUTES,
+                        buckets=instrumentation.BUCKETS,
+                        slow_ms=instrumentation.SLOW_REQUEST_MS,
+                        slow_queries=instrumentation.SLOW_REQUEST_QUERIES,
+                        pid=os.getpid())
+
+@app.route('/admin/export/<dataset>')
+@login_required
+def admin_export(dataset):
+    # 流式导出 users/todos/posts/comments，?format=csv（默认）或 ndjson；?hashes=1 时用户数据带上密码哈希，用于迁移
+    if not g.user.is_admin:
+        return redirect(url_for('index'))
     
-    # 按净得分降序排序
-    users.sort(key=lambda x: (-x.net_score, x.username))
+    fmt = request.args.get('format', 'csv')
+    stmt = transfer.export_query(dataset, include_hashes=request.args.get('hashes') == '1')
+    if stmt is None or fmt not in transfer.FORMATS:
+        abort(404)
+    filename = f"{dataset}-{datetime.utcnow():%Y%m%d-%H%M%S}.{fmt}"
+    # 数据库会话要在迭代响应体期间保持可用，因此使用 stream_with_context
+    return Response(stream_with_context(transfer.stream_export(stmt, fmt)),
+                    mimetype=transfer.FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"',
+                             'X-Accel-Buffering': 'no'})
+
+@app.route('/admin/import/users', methods=['POST'])
+@login_required
+def admin_import_users():
+    # 上传 CSV（表头 username,password,birthdate）或 NDJSON 批量创建普通用户；?format=json 时返回 JSON 报告
+    admin = g.user
+    if not admin.is_admin:
+        return redirect(url_for('index'))
     
-    return render_template('group_leader.html', users=users)
+    wants_json = request.args.get('format') == 'json'
+    upload = request.files.get('file')
+    if upload is None or not upload.filename:
+        if wants_json:
+            return jsonify({'success': False, 'message': '请选择要导入的文件'}), 400
+        return render_template('user_management.html',
+                            message='请选择要导入的文件',
+                            success=False,
+                            users=preset_users())
+    
+    # 每个密码哈希都要几百毫秒，按时间预算分小批处理，避免大文件超过 gunicorn worker 超时
+    report = transfer.import_users(transfer.read_rows(upload.stream, transfer.detect_format(upload.filename)),
+                                   admin.username,
+                                   batch_size=transfer.WEB_IMPORT_BATCH_SIZE,
+                                   deadline=time.monotonic() + transfer.IMPORT_TIME_BUDGET)
+    if wants_json:
+        return jsonify(report.to_dict())
+    message = f'导入完成：共 {report.total} 行，成功 {report.created} 行，失败 {report.error_count} 行'
+    if report.skipped:
+        message += (f'；超出时间限制，第 {report.resume_line} 行起的 {report.skipped} 行未处理，'
+                    f'请删除已处理的行后重新上传，或在服务器上执行 flask --app app import-users 导入整个文件')
+    return render_template('user_management.html',
+                        message=message,
+                        success=not report.error_count and not report.skipped,
+                        import_errors=report.errors,
+                        users=preset_users())
 
 # API 端点
 @app.route('/api/login', methods=['POST'])
@@ -437,40 +665,35 @@ def api_login():
                 'message': '用户名和密码不能为空'
             }), 400
 
-        user = User.query.filter_by(username=username).first()
-
-        if not user:
+        def failed(message):
+            # 只有失败的尝试计入登录限流
+            passwords.login_failed(username, request.remote_addr)
             return jsonify({
                 'success': False,
-                'message': '用户不存在'
+                'message': message
             }), 401
 
+        passwords.check_login_rate(username, request.remote_addr)
+        user = User.query.filter_by(username=username).first()
+
+        if not user:
+            return failed('用户不存在')
+
         if is_admin and user.login_type != 'admin':
-            return jsonify({
-                'success': False,
-                'message': '无管理员权限'
-            }), 401
+            return failed('无管理员权限')
 
         if not is_admin and user.login_type != 'birth':
-            return jsonify({
-                'success': False,
-                'message': '无效的用户类型'
-            }), 401
+            return failed('无效的用户类型')
 
-        if not check_password_hash(user.password, password):
-            return jsonify({
-                'success': False,
-                'message': '密码错误'
-            }), 401
+        if not passwords.verify_and_upgrade(user, password):
+            return failed('密码错误')
+        db.session.commit()
 
         if not is_admin and user.birthdate != birth_date:
-            return jsonify({
-                'success': False,
-                'message': '出生日期错误'
-            }), 401
+            return failed('出生日期错误')
 
-        # 生成 token（这里简单使用用户名作为 token，实际应使用 JWT）
-        token = username
+        # 签名令牌携带用户 ID 和角色，之后的 API 请求无需查询数据库即可校验
+        token = api_auth.issue_token(user)
 
         return jsonify({
             'success': True,
@@ -484,6 +707,16 @@ def api_login():
             }
         }), 200
 
+    except TooManyAttempts as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 429
+    except HashingBusy as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 503
     except Exception as e:
         logging.error(f"Login error: {str(e)}")
         return jsonify({
@@ -491,37 +724,89 @@ def api_login():
             'message': '服务器错误'
         }), 500
 
+def api_target_user(requested_id):
+    """API 操作的目标用户：默认为令牌本人，只有管理员可以指定其他用户。
+
+    requested_id 来自 JSON 或查询字符串，可以是整数或数字字符串；格式错误时抛出 ValueError，
+    无权访问时抛出 PermissionError，指定的用户不存在时抛出 LookupError。
+    """
+    api_user = g.api_user
+    if requested_id in (None, ''):
+        return api_user.id
+    if isinstance(requested_id, bool) or not isinstance(requested_id, (int, str)):
+        raise ValueError('user_id 必须是整数')
+    try:
+        requested_id = int(requested_id)
+    except ValueError:
+        raise ValueError('user_id 必须是整数')
+    if requested_id == api_user.id:
+        return api_user.id
+    if not api_user.is_admin:
+        raise PermissionError('无权访问其他用户的数据')
+    if db.session.get(User, requested_id) is None:
+        raise LookupError('用户不存在')
+    return requested_id
+
+def api_target_error(error):
+    status = 403 if isinstance(error, PermissionError) else 404 if isinstance(error, LookupError) else 400
+    return jsonify({'error': str(error)}), status
+
 @app.route('/api/todos', methods=['GET'])
+@token_required
+@replica.read_only
 def api_get_todos():
-    # 这里应该添加 token 验证
-    user_id = request.args.get('user_id')
-    if not user_id:
-        return jsonify({'error': '需要用户ID'}), 400
-        
-    todos = Todo.query.filter_by(user_id=user_id).order_by(
-        Todo.completed,
-        Todo.priority != 'urgent',
-        Todo.priority != 'medium',
-        Todo.created_at.desc()
-    ).all()
+    try:
+        user_id = api_target_user(request.args.get('user_id'))
+    except (ValueError, PermissionError, LookupError) as e:
+        return api_target_error(e)
     
-    return jsonify({
-        'todos': [{
-            'id': todo.id,
-            'task': todo.task,
-            'date': todo.date,
-            'time': todo.time,
-            'priority': todo.priority,
-            'completed': todo.completed,
-            'created_at': todo.created_at.isoformat()
-        } for todo in todos]
-    })
+    cursor = request.args.get('cursor')
+    updated_since = request.args.get('updated_since')
+    try:
+        limit = todo_store.parse_limit(request.args.get('limit'))
+        since = todo_store.parse_since(updated_since) if updated_since else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # 数据未变化时只做一次聚合查询就返回 304，不加载也不序列化待办
+    state = todo_store.sync_state(user_id)
+    etag = todo_store.etag_for(user_id, state, cursor, limit, updated_since)
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+    
+    try:
+        if since is None:
+            todos, next_cursor = todo_store.list_page(user_id, limit=limit, cursor=cursor)
+            payload = {'todos': [todo_to_dict(todo) for todo in todos]}
+            # 全量模式：第一页给出同步令牌，之后可用 updated_since 增量同步
+            if not cursor:
+                payload['sync_token'] = todo_store.sync_token(state)
+        else:
+            todos, deleted, next_cursor = todo_store.delta_page(user_id, since, limit=limit, cursor=cursor)
+            payload = {'todos': [todo_to_dict(todo) for todo in todos], 'deleted': deleted}
+            # 增量模式按 change_seq 升序翻页，最后一页的同步令牌覆盖翻页期间的修改
+            if next_cursor is None:
+                payload['sync_token'] = todo_store.sync_token(state) or updated_since
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    payload['next_cursor'] = next_cursor
+    response = jsonify(payload)
+    response.set_etag(etag)
+    return response
 
 @app.route('/api/todos', methods=['POST'])
+@token_required
 def api_create_todo():
-    # 这里应该添加 token 验证
-    data = request.get_json()
-    user_id = data.get('user_id')
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': '无效的请求数据'}), 400
+    try:
+        user_id = api_target_user(data.get('user_id'))
+    except (ValueError, PermissionError, LookupError) as e:
+        return api_target_error(e)
     task = data.get('task')
     date = data.get('date', '')
     time = data.get('time', '')
@@ -534,47 +819,201 @@ def api_create_todo():
         task=task,
         date=date,
         time=time,
+        due_at=todo_store.due_at_for(date, time),
         priority=priority,
-        user_id=user_id
+        user_id=user_id,
+        change_seq=todo_store.next_change(user_id)
     )
     db.session.add(new_todo)
     db.session.commit()
     
+    return jsonify(todo_to_dict(new_todo)), 201
+
+@app.route('/api/todos/batch', methods=['POST'])
+@token_required
+def api_batch_todos():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': '无效的请求数据'}), 400
+    try:
+        user_id = api_target_user(data.get('user_id'))
+    except (ValueError, PermissionError, LookupError) as e:
+        return api_target_error(e)
+    operations = data.get('operations')
+    if not isinstance(operations, list):
+        return jsonify({'error': '缺少必要参数'}), 400
+    if len(operations) > todo_store.MAX_BATCH_SIZE:
+        return jsonify({'error': f'单次最多 {todo_store.MAX_BATCH_SIZE} 个操作'}), 400
+    
+    # 所有操作在同一个事务中执行，出现数据库错误时整体回滚
+    try:
+        results = todo_store.apply_batch(user_id, operations)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Batch todo error: {str(e)}")
+        return jsonify({'error': '服务器错误'}), 500
+    
+    return jsonify({'results': results})
+
+@app.route('/api/posts', methods=['GET'])
+@login_required
+@replica.read_only
+def api_get_posts():
+    user = g.user
+    cursor = request.args.get('cursor')
+    limit = clamp_limit(request.args.get('limit'), FORUM_PAGE_SIZE)
+    
+    try:
+        posts, next_cursor = load_forum_feed(user.id, cursor=cursor, limit=limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     return jsonify({
-        'id': new_todo.id,
-        'task': new_todo.task,
-        'date': new_todo.date,
-        'time': new_todo.time,
-        'priority': new_todo.priority,
-        'completed': new_todo.completed,
-        'created_at': new_todo.created_at.isoformat()
-    }), 201
+        'posts': [post.to_dict() for post in posts],
+        'next_cursor': next_cursor
+    })
+
+@app.route('/api/search', methods=['GET'])
+@login_required
+@replica.read_only
+def api_search():
+    query, page, per_page = search_page_args()
+    if not query:
+        return jsonify({'error': '需要搜索关键词'}), 400
+    hits, has_more = search.search(query, page=page, per_page=per_page)
+    return jsonify({
+        'results': [hit.to_dict() for hit in hits],
+        'page': page,
+        'has_more': has_more
+    })
+
+@app.route('/api/posts/<int:post_id>/comments', methods=['GET'])
+@login_required
+def api_get_comments(post_id):
+    cursor = request.args.get('cursor')
+    limit = clamp_limit(request.args.get('limit'), COMMENT_PAGE_SIZE)
+    
+    try:
+        comments, next_cursor = load_post_comments(post_id, cursor=cursor, limit=limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'comments': [comment.to_dict() for comment in comments],
+        'next_cursor': next_cursor
+    })
 
 # 创建数据库表
+def migrate_db():
+    """建表并按顺序应用尚未执行的迁移，返回本次应用的版本号。"""
+    # 只有部署时的迁移命令需要 schema 模块，web worker 启动时不导入
+    from schema import upgrade_schema
+    with app.app_context():
+        logging.info("Creating database tables...")
+        db.create_all()
+        return upgrade_schema()
+
+def seed_db():
+    """创建管理员账户，排行榜为空时从现有数据重建；可以重复执行。"""
+    with app.app_context():
+        # 检查是否需要创建管理员账户
+        admin = User.query.filter_by(username='S1f').first()
+        if not admin:
+            logging.info("Creating admin user...")
+            admin = User(
+                username='S1f',
+                password=passwords.hash_password('yifan0316'),
+                login_type='admin'
+            )
+            db.session.add(admin)
+            db.session.flush()
+            leaderboard.add_user(admin)
+            fragment_cache.bump(fragment_cache.LEADERBOARD)
+            db.session.commit()
+            logging.info("Admin user created successfully")
+        else:
+            logging.info("Admin user already exists")
+        
+        # 旧数据库首次升级时排行榜表为空，从现有数据重建一次
+        if db.session.query(UserScore.user_id).first() is None:
+            count = leaderboard.rebuild()
+            fragment_cache.bump(fragment_cache.LEADERBOARD)
+            db.session.commit()
+            logging.info(f"Leaderboard rebuilt for {count} users")
+
 def init_db():
+    # 迁移并写入初始数据；部署时由 flask --app app bootstrap 执行一次，本地开发和脚本直接调用
     try:
-        with app.app_context():
-            logging.info("Creating database tables...")
-            db.create_all()
-            
-            # 检查是否需要创建管理员账户
-            admin = User.query.filter_by(username='S1f').first()
-            if not admin:
-                logging.info("Creating admin user...")
-                admin = User(
-                    username='S1f',
-                    password=generate_password_hash('yifan0316'),
-                    login_type='admin'
-                )
-                db.session.add(admin)
-                db.session.commit()
-                logging.info("Admin user created successfully")
-            else:
-                logging.info("Admin user already exists")
+        migrate_db()
+        seed_db()
     except Exception as e:
         logging.error(f"Error initializing database: {str(e)}")
         raise
 
+@app.cli.command('migrate')
+def migrate_command():
+    """应用尚未执行的数据库迁移（不写入初始数据）。"""
+    applied = migrate_db()
+    print(f"Applied migrations: {', '.join(map(str, applied))}" if applied else "Schema is up to date")
+
+@app.cli.command('bootstrap')
+def bootstrap_command():
+    """部署时运行一次：应用迁移并创建管理员账户，可以重复执行。"""
+    init_db()
+    print("Database ready")
+
+@app.cli.command('rebuild-leaderboard')
+def rebuild_leaderboard_command():
+    """从帖子、点赞和投诉数据重新计算排行榜。"""
+    count = leaderboard.rebuild()
+    fragment_cache.bump(fragment_cache.LEADERBOARD)
+    db.session.commit()
+    print(f"Leaderboard rebuilt for {count} users")
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """从帖子和评论重建全文检索索引。"""
+    count = search.rebuild()
+    db.session.commit()
+    print(f"Search index rebuilt with {count} documents")
+
+@app.cli.command('reconcile-counters')
+@click.option('--dry-run', is_flag=True, help='只报告漂移，不修复。')
+def reconcile_counters_command(dry_run):
+    """检测并修复帖子点赞/投诉/评论计数与明细表之间的漂移。"""
+    drift = counters.reconcile(dry_run=dry_run)
+    if drift and not dry_run:
+        fragment_cache.bump(fragment_cache.FORUM)
+    db.session.commit()
+    action = 'found' if dry_run else 'repaired'
+    print(f"Counter drift {action} on {len(drift)} posts")
+
+@app.cli.command('send-reminders')
+def send_reminders_command():
+    """立即发送所有已到期的待办提醒（使用 REMINDER_NOTIFIER 配置的通知方式）。"""
+    import reminders
+    notifier = reminders.notifier_from_env()
+    sent = 0
+    while True:
+        count = reminders.run_once(notifier)
+        sent += count
+        if count < reminders.BATCH_SIZE:
+            break
+    print(f"Sent {sent} todo reminders")
+
+@app.cli.command('import-users')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--created-by', default='cli', show_default=True, help='记录在新用户 created_by 字段中的名字。')
+def import_users_command(path, created_by):
+    """从 CSV（表头 username,password,birthdate）或 NDJSON 文件批量创建普通用户，不受网页导入的时间限制。"""
+    with open(path, 'rb') as stream:
+        report = transfer.import_users(transfer.read_rows(stream, transfer.detect_format(path)), created_by)
+    for item in report.errors:
+        username = f" ({item['username']})" if item['username'] else ''
+        print(f"line {item['line']}{username}: {item['error']}")
+    print(f"Imported {report.created} of {report.total} users ({report.error_count} failed)")
+
 if __name__ == '__main__':
     init_db()  # 初始化数据库
     port = int(os.getenv('PORT', 5000))
@@ -0,0 +1,62 @@
+from sqlalchemy import select, delete, or_
+from models import db, User, Post, Comment, Like, Complaint, Todo, TodoTombstone
+import counters
+import leaderboard
+import search
+
+
+def _delete(model, *conditions):
+    return db.session.execute(
+        delete(model).where(*conditions).execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def delete_post(post_id):
+    """删除帖子及其评论、点赞和投诉，不加载 ORM 对象；返回帖子是否存在。
+
+    语句数固定：更新作者分数 1 条 + 删除 5 条（含检索文档）。
+    """
+    leaderboard.remove_post(post_id)
+    search.remove_post(post_id)
+    _delete(Comment, Comment.post_id == post_id)
+    _delete(Like, Like.post_id == post_id)
+    _delete(Complaint, Complaint.post_id == post_id)
+    return _delete(Post, Post.id == post_id) > 0
+
+
+def delete_user(user_id):
+    """删除用户及其全部数据，包括其他用户在其帖子上的点赞、投诉和评论。
+
+    无论用户数据量多大，语句数固定（约 14 条），由调用方提交事务。
+    """
+    # 该用户点赞/投诉过的帖子作者需要重算排行榜分数，互动过的帖子需要重算计数
+    affected_authors = set(leaderboard.authors_reacted_by(user_id)) - {user_id}
+    affected_posts = counters.posts_touched_by(user_id)
+
+    search.remove_user_content(user_id)
+    own_posts = select(Post.id).where(Post.author_id == user_id)
+    _delete(Like, or_(Like.user_id == user_id, Like.post_id.in_(own_posts)))
+    _delete(Complaint, or_(Complaint.user_id == user_id, Complaint.post_id.in_(own_posts)))
+    _delete(Comment, or_(Comment.author_id == user_id, Comment.post_id.in_(own_posts)))
+    _delete(Post, Post.author_id == user_id)
+    _delete(Todo, Todo.user_id == user_id)
+    _delete(TodoTombstone, TodoTombstone.user_id == user_id)
+
+    leaderboard.remove_user(user_id)
+    leaderboard.refresh_users(affected_authors)
+    counters.refresh_posts(affected_posts)
+    return _delete(User, User.id == user_id) > 0
+
+
+def delete_orphans():
+    """清理旧版本删除帖子/用户时遗留的孤立记录，返回删除的行数。"""
+    post_ids = select(Post.id)
+    user_ids = select(User.id)
+    # 先删作者已不存在的帖子，再删指向不存在帖子或用户的明细
+    removed = _delete(Post, Post.author_id.not_in(user_ids))
+    removed += _delete(Todo, Todo.user_id.not_in(user_ids))
+    removed += _delete(TodoTombstone, TodoTombstone.user_id.not_in(user_ids))
+    for model, user_column in ((Like, Like.user_id), (Complaint, Complaint.user_id), (Comment, Comment.author_id)):
+        removed += _delete(model, or_(model.post_id.not_in(post_ids), user_column.not_in(user_ids)))
+    removed += search.remove_orphans()
+    return removed
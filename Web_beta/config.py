@@ -0,0 +1,122 @@
+import logging
+import os
+from sqlalchemy.pool import NullPool
+
+# 数据库连接池与 gunicorn 进程配置，均可通过环境变量覆盖：
+#   DB_POOL_SIZE          每个 worker 常驻连接数（默认 5）
+#   DB_MAX_OVERFLOW       超出常驻连接后允许临时创建的连接数（默认 5）
+#   DB_POOL_TIMEOUT       等待空闲连接的秒数，超时抛出异常（默认 10）
+#   DB_POOL_RECYCLE       连接最长复用秒数，避免被服务端或代理断开（默认 1800）
+#   DB_POOL_PRE_PING      取出连接前先探活（默认开启）
+#   DB_STATEMENT_TIMEOUT  PostgreSQL 单条语句超时毫秒数，0 表示不限制（默认 15000）
+#   DB_USE_NULLPOOL       前面有 PgBouncer 等外部连接池时设为 1，应用内不再池化
+#   DB_MAX_CONNECTIONS    数据库允许本服务使用的连接总数，用于推算 gunicorn worker 数（默认 90）
+#   DATABASE_READ_URL     可选的只读副本，连接池参数与主库相同（见 replica.py）
+#   WEB_CONCURRENCY / GUNICORN_THREADS  显式指定 worker 数和每个 worker 处理普通请求的线程数
+#   FORUM_STREAM_CONNECTIONS  每个 worker 为 /forum/stream 长连接额外保留的线程数（默认 32，见 forum_events.py）；
+#                             这些线程不提高普通请求的并发，同时访问数据库的请求仍不超过 request_threads()
+
+
+def env_int(name, default):
+    value = os.getenv(name)
+    if value in (None, ''):
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        logging.warning(f"Ignoring invalid {name}={value!r}, using {default}")
+        return default
+
+
+def env_str(name, default):
+    value = os.getenv(name)
+    return default if value in (None, '') else value.strip()
+
+
+def env_bool(name, default):
+    value = os.getenv(name)
+    if value in (None, ''):
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def database_url(name='DATABASE_URL'):
+    url = os.getenv(name)
+    # 修复 Render 的 PostgreSQL URL
+    if url and url.startswith('postgres://'):
+        url = url.replace('postgres://', 'postgresql://', 1)
+    return url
+
+
+def pool_settings():
+    return {
+        'pool_size': env_int('DB_POOL_SIZE', 5),
+        'max_overflow': env_int('DB_MAX_OVERFLOW', 5),
+        'pool_timeout': env_int('DB_POOL_TIMEOUT', 10),
+        'pool_recycle': env_int('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': env_bool('DB_POOL_PRE_PING', True),
+        'statement_timeout': env_int('DB_STATEMENT_TIMEOUT', 15000),
+        'use_nullpool': env_bool('DB_USE_NULLPOOL', False),
+    }
+
+
+def engine_options(url):
+    """根据数据库类型和环境变量生成 create_engine 参数（SQLALCHEMY_ENGINE_OPTIONS）。"""
+    settings = pool_settings()
+    options = {}
+    if not url:
+        return options
+    is_postgres = url.startswith('postgresql')
+    in_memory = url.startswith('sqlite') and (':memory:' in url or url.rstrip('/') == 'sqlite:')
+
+    if settings['use_nullpool']:
+        # 外部连接池负责复用连接，应用内每次用完即关闭
+        options['poolclass'] = NullPool
+    elif not in_memory:
+        options.update(
+            pool_size=settings['pool_size'],
+            max_overflow=settings['max_overflow'],
+            pool_timeout=settings['pool_timeout'],
+            pool_recycle=settings['pool_recycle'],
+        )
+    options['pool_pre_ping'] = settings['pool_pre_ping']
+
+    if is_postgres and settings['statement_timeout'] > 0:
+        options['connect_args'] = {'options': f"-c statement_timeout={settings['statement_timeout']}"}
+    return options
+
+
+def request_threads():
+    """每个 worker 同时处理普通请求的线程数。
+
+    每个线程同一时刻最多占用一个连接，所以不超过每个 worker 的连接上限。
+    """
+    settings = pool_settings()
+    threads = env_int('GUNICORN_THREADS', max(1, min(settings['pool_size'], 4)))
+    if not settings['use_nullpool']:
+        threads = max(1, min(threads, settings['pool_size'] + settings['max_overflow']))
+    return threads
+
+
+def stream_threads():
+    return max(0, env_int('FORUM_STREAM_CONNECTIONS', 32))
+
+
+def worker_settings(cpu_count=None):
+    """推算 gunicorn 的 (workers, threads)。
+
+    worker 数取 2 * CPU + 1，但不让 workers * 每 worker 连接上限超过 DB_MAX_CONNECTIONS。
+    """
+    settings = pool_settings()
+    per_worker = settings['pool_size'] + settings['max_overflow']
+    threads = request_threads()
+
+    workers = env_int('WEB_CONCURRENCY', 0)
+    if workers <= 0:
+        workers = 2 * (cpu_count or os.cpu_count() or 1) + 1
+        budget = env_int('DB_MAX_CONNECTIONS', 90)
+        connections_per_worker = threads if settings['use_nullpool'] else per_worker
+        workers = max(1, min(workers, budget // max(1, connections_per_worker)))
+    # /forum/stream 的长连接各占一个线程但不占数据库连接，在上面的线程数之外另加；
+    # gthread 的线程不区分请求类型，由 forum_events 的请求闸门保证同时处理的请求仍不超过 threads 个
+    return workers, threads + stream_threads()
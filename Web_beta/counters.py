@@ -0,0 +1,127 @@
+import logging
+from sqlalchemy import select, update, func, union, or_
+from models import db, Post, Comment, Like, Complaint
+
+# Post 上的冗余计数列与其对应的明细表
+COUNTED = {
+    'like_count': Like,
+    'complaint_count': Complaint,
+    'comment_count': Comment,
+}
+
+
+def bump(post_id, **deltas):
+    """原子地调整帖子计数，例如 bump(post_id, like_count=1)。
+
+    使用 UPDATE ... SET x = x + n，多个 gunicorn worker 并发时不会丢失更新。
+    """
+    values = {name: getattr(Post, name) + delta for name, delta in deltas.items() if delta}
+    if not values:
+        return
+    db.session.execute(
+        update(Post)
+        .where(Post.id == post_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def apply(post_id, **deltas):
+    """调整帖子计数并返回调整后的 (like_count, complaint_count)，帖子不存在时返回 None。
+
+    数据库支持 UPDATE ... RETURNING 时调整和读取合为一条语句。
+    """
+    columns = (Post.like_count, Post.complaint_count)
+    values = {name: getattr(Post, name) + delta for name, delta in deltas.items() if delta}
+    if values and db.session.get_bind().dialect.update_returning:
+        return db.session.execute(
+            update(Post)
+            .where(Post.id == post_id)
+            .values(**values)
+            .returning(*columns)
+            .execution_options(synchronize_session=False)
+        ).first()
+    bump(post_id, **deltas)
+    return db.session.execute(select(*columns).where(Post.id == post_id)).first()
+
+
+def current(post_id, name):
+    """读取帖子的某个计数，帖子不存在时返回 None。"""
+    return db.session.execute(select(getattr(Post, name)).where(Post.id == post_id)).scalar()
+
+
+def _actual_count(model):
+    return (
+        select(func.count(model.id))
+        .where(model.post_id == Post.id)
+        .correlate(Post)
+        .scalar_subquery()
+    )
+
+
+def posts_touched_by(user_id):
+    """某用户点赞、投诉或评论过的帖子 ID，删除该用户后需要重算这些帖子的计数。"""
+    stmt = union(
+        select(Like.post_id).where(Like.user_id == user_id),
+        select(Complaint.post_id).where(Complaint.user_id == user_id),
+        select(Comment.post_id).where(Comment.author_id == user_id),
+    )
+    return [row[0] for row in db.session.execute(stmt)]
+
+
+def refresh_posts(post_ids):
+    """从明细表重算指定帖子的全部计数。"""
+    if not post_ids:
+        return
+    db.session.execute(
+        update(Post)
+        .where(Post.id.in_(list(post_ids)))
+        .values({name: _actual_count(model) for name, model in COUNTED.items()})
+        .execution_options(synchronize_session=False)
+    )
+
+
+def find_drift():
+    """返回计数与明细表不一致的帖子：[(post_id, {列名: (存储值, 实际值)})]。"""
+    actual = {
+        name: (
+            select(model.post_id, func.count(model.id).label('n'))
+            .group_by(model.post_id)
+            .subquery()
+        )
+        for name, model in COUNTED.items()
+    }
+    columns = [Post.id]
+    conditions = []
+    stmt_joins = []
+    for name, subquery in actual.items():
+        stored = getattr(Post, name)
+        real = func.coalesce(subquery.c.n, 0)
+        columns += [stored, real]
+        conditions.append(stored != real)
+        stmt_joins.append(subquery)
+
+    stmt = select(*columns)
+    for subquery in stmt_joins:
+        stmt = stmt.outerjoin(subquery, subquery.c.post_id == Post.id)
+    stmt = stmt.where(or_(*conditions))
+
+    drift = []
+    for row in db.session.execute(stmt):
+        values = {}
+        for i, name in enumerate(actual):
+            stored, real = row[1 + 2 * i], row[2 + 2 * i]
+            if stored != real:
+                values[name] = (stored, real)
+        drift.append((row[0], values))
+    return drift
+
+
+def reconcile(dry_run=False):
+    """检测并修复计数漂移，返回发现的漂移列表。"""
+    drift = find_drift()
+    for post_id, values in drift:
+        logging.warning(f"Counter drift on post {post_id}: {values}")
+    if drift and not dry_run:
+        refresh_posts([post_id for post_id, _ in drift])
+    return drift
@@ -0,0 +1,231 @@
+import base64
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import select, func, and_, or_, exists, false, literal, union_all
+from models import db, User, Post, Comment, Like, Complaint
+import reaction_queue
+
+# 每页帖子数、每个帖子内联显示的最新评论数、“加载更多评论”每次的条数
+FORUM_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+INLINE_COMMENTS = 3
+COMMENT_PAGE_SIZE = 20
+
+
+# 论坛页面使用的只读视图对象，避免在 ORM 实例上挂临时属性
+@dataclass
+class FeedComment:
+    id: int
+    content: str
+    created_at: datetime
+    author_name: str
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'content': self.content,
+            'created_at': self.created_at.isoformat(),
+            'author_name': self.author_name,
+        }
+
+
+@dataclass
+class FeedPost:
+    id: int
+    content: str
+    created_at: datetime
+    author_name: str
+    like_count: int = 0
+    complaint_count: int = 0
+    comment_count: int = 0
+    is_liked: bool = False
+    is_complained: bool = False
+    comments: List[FeedComment] = field(default_factory=list)
+    comments_cursor: Optional[str] = None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'content': self.content,
+            'created_at': self.created_at.isoformat(),
+            'author_name': self.author_name,
+            'like_count': self.like_count,
+            'complaint_count': self.complaint_count,
+            'comment_count': self.comment_count,
+            'is_liked': self.is_liked,
+            'is_complained': self.is_complained,
+            'comments': [comment.to_dict() for comment in self.comments],
+            'comments_cursor': self.comments_cursor,
+        }
+
+
+# 游标格式：base64("<created_at iso>|<id>")，对应 (created_at, id) 键集分页
+def encode_cursor(created_at, row_id):
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded).decode().split('|')
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('无效的分页游标')
+
+
+def clamp_limit(limit, default):
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def _before(created_col, id_col, cursor):
+    created_at, row_id = decode_cursor(cursor)
+    return or_(
+        created_col < created_at,
+        and_(created_col == created_at, id_col < row_id),
+    )
+
+
+def _viewer_has(model, viewer_id):
+    if viewer_id is None:
+        return false()
+    return exists().where(model.post_id == Post.id, model.user_id == viewer_id)
+
+
+def viewer_reactions(viewer_id, post_ids):
+    """一条查询返回当前用户在这些帖子上的 (点赞的帖子 ID 集合, 投诉的帖子 ID 集合)。"""
+    if not post_ids:
+        return set(), set()
+    stmt = union_all(
+        select(literal('like'), Like.post_id).where(Like.user_id == viewer_id, Like.post_id.in_(post_ids)),
+        select(literal('complaint'), Complaint.post_id).where(Complaint.user_id == viewer_id, Complaint.post_id.in_(post_ids)),
+    )
+    liked, complained = set(), set()
+    for kind, post_id in db.session.execute(stmt):
+        (liked if kind == 'like' else complained).add(post_id)
+    # 延迟写入模式下叠加当前用户尚未写库的切换
+    return reaction_queue.apply_viewer_state(viewer_id, post_ids, liked, complained)
+
+
+def load_forum_feed(viewer_id, cursor=None, limit=FORUM_PAGE_SIZE):
+    """按 (created_at, id) 倒序加载一页帖子，返回 (帖子列表, 下一页游标)。
+
+    帖子、冗余计数列与当前用户的点赞/投诉状态一条查询，内联评论一条查询。
+    viewer_id 为 None 时不查询点赞/投诉状态（用于与用户无关的缓存片段）。
+    """
+    stmt = (
+        select(
+            Post.id,
+            Post.content,
+            Post.created_at,
+            User.username,
+            Post.like_count,
+            Post.complaint_count,
+            Post.comment_count,
+            _viewer_has(Like, viewer_id),
+            _viewer_has(Complaint, viewer_id),
+        )
+        .join(User, User.id == Post.author_id)
+        .order_by(Post.created_at.desc(), Post.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor:
+        stmt = stmt.where(_before(Post.created_at, Post.id, cursor))
+
+    posts = [
+        FeedPost(
+            id=row[0],
+            content=row[1],
+            created_at=row[2],
+            author_name=row[3],
+            like_count=row[4],
+            complaint_count=row[5],
+            comment_count=row[6],
+            is_liked=bool(row[7]),
+            is_complained=bool(row[8]),
+        )
+        for row in db.session.execute(stmt)
+    ]
+
+    next_cursor = None
+    if len(posts) > limit:
+        posts = posts[:limit]
+        next_cursor = encode_cursor(posts[-1].created_at, posts[-1].id)
+
+    if posts:
+        _attach_inline_comments(posts)
+        if viewer_id is not None:
+            reaction_queue.apply_to_posts(viewer_id, posts)
+    return posts, next_cursor
+
+
+def _attach_inline_comments(posts):
+    # 用窗口函数一次取出每个帖子最新的 INLINE_COMMENTS 条评论
+    by_id = {post.id: post for post in posts}
+    ranked = (
+        select(
+            Comment.id,
+            Comment.post_id,
+            Comment.content,
+            Comment.created_at,
+            User.username.label('author_name'),
+            func.row_number().over(
+                partition_by=Comment.post_id,
+                order_by=(Comment.created_at.desc(), Comment.id.desc()),
+            ).label('rn'),
+        )
+        .join(User, User.id == Comment.author_id)
+        .where(Comment.post_id.in_(list(by_id)))
+        .subquery()
+    )
+    stmt = (
+        select(ranked)
+        .where(ranked.c.rn <= INLINE_COMMENTS)
+        .order_by(ranked.c.post_id, ranked.c.created_at, ranked.c.id)
+    )
+    for row in db.session.execute(stmt):
+        post = by_id[row.post_id]
+        post.comments.append(
+            FeedComment(
+                id=row.id,
+                content=row.content,
+                created_at=row.created_at,
+                author_name=row.author_name,
+            )
+        )
+
+    for post in posts:
+        if post.comments and post.comment_count > len(post.comments):
+            oldest = post.comments[0]
+            post.comments_cursor = encode_cursor(oldest.created_at, oldest.id)
+
+
+def load_post_comments(post_id, cursor=None, limit=COMMENT_PAGE_SIZE):
+    """加载某个帖子中早于游标的评论（按时间正序返回），返回 (评论列表, 下一页游标)。"""
+    stmt = (
+        select(Comment.id, Comment.content, Comment.created_at, User.username)
+        .join(User, User.id == Comment.author_id)
+        .where(Comment.post_id == post_id)
+        .order_by(Comment.created_at.desc(), Comment.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor:
+        stmt = stmt.where(_before(Comment.created_at, Comment.id, cursor))
+
+    comments = [
+        FeedComment(id=row[0], content=row[1], created_at=row[2], author_name=row[3])
+        for row in db.session.execute(stmt)
+    ]
+
+    next_cursor = None
+    if len(comments) > limit:
+        comments = comments[:limit]
+        next_cursor = encode_cursor(comments[-1].created_at, comments[-1].id)
+
+    comments.reverse()
+    return comments, next_cursor
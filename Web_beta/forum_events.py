@@ -0,0 +1,303 @@
+import json
+import logging
+import queue
+import select as select_module
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, insert, func, text, or_
+from models import db, Post, ForumEvent
+from flask import g
+import config
+
+# 论坛实时更新（/forum/stream，Server-Sent Events），均可通过环境变量调整：
+#   FORUM_STREAM_CONNECTIONS  每个 worker 同时保持的订阅连接上限（默认 32）。每个连接占用一个空闲线程（约 60 KB 内存），
+#                             gunicorn.conf.py 会在处理普通请求的线程之外额外开这么多线程；超出时返回 204，页面不再自动更新。
+#                             gthread 会把任何请求交给任意空闲线程，所以 init_app 注册了请求闸门：视图函数（连同订阅请求
+#                             建立连接时的查询）最多 config.request_threads() 个同时执行，多出的线程排队等待而不去争抢
+#                             连接池；订阅连接在视图返回后只推送事件，不占用闸门。提高上限只增加空闲线程，不改变连接池的推算
+#   FORUM_STREAM_MAX_SECONDS  单个连接最长保持秒数，到时断开由浏览器带 Last-Event-ID 自动重连（默认 300）
+#   FORUM_EVENTS_POLL_MS      轮询 forum_events 表的间隔毫秒数（默认 1000）；PostgreSQL 上收到 NOTIFY 会立即读取
+#   FORUM_EVENTS_RETENTION_MINUTES  事件保留分钟数，重连时只能补发保留期内的事件（默认 10）
+# 事件与写操作在同一事务内写入 forum_events 表，各 worker 各有一个线程按 id 顺序读取并分发给本进程的订阅者。
+# PostgreSQL 上 id 在插入时分配、提交顺序却不一定相同，读到较大的 id 时较小的 id 可能还未提交：
+# 轮询时会在 GAP_SECONDS 内继续查询这些空缺的 id，晚提交的事件照常推送（回滚留下的空缺到期后放弃）
+MAX_CONNECTIONS = config.stream_threads()
+MAX_SECONDS = config.env_int('FORUM_STREAM_MAX_SECONDS', 300)
+POLL_INTERVAL = config.env_int('FORUM_EVENTS_POLL_MS', 1000) / 1000
+RETENTION = timedelta(minutes=config.env_int('FORUM_EVENTS_RETENTION_MINUTES', 10))
+KEEPALIVE_SECONDS = 15
+SUBSCRIBER_QUEUE = 100
+REPLAY_LIMIT = 200
+READ_BATCH = 500
+GAP_SECONDS = 30
+MAX_GAPS = 1000
+CHANNEL = 'forum_events'
+
+
+def publish(kind, payload):
+    """在当前事务内记录一条事件，随写操作一起提交。"""
+    db.session.execute(insert(ForumEvent).values(kind=kind, payload=json.dumps(payload, ensure_ascii=False)))
+    if db.session.get_bind().dialect.name == 'postgresql':
+        # NOTIFY 在事务提交时才发出，未提交的事件不会被读取
+        db.session.execute(text("SELECT pg_notify(:channel, '')"), {'channel': CHANNEL})
+
+
+def post_created(post, author_name):
+    # 字段与 FeedPost.to_dict 一致，页面直接复用 renderPost
+    publish('post', {
+        'id': post.id,
+        'content': post.content,
+        'created_at': post.created_at.isoformat(),
+        'author_name': author_name,
+        'like_count': 0,
+        'complaint_count': 0,
+        'comment_count': 0,
+        'is_liked': False,
+        'is_complained': False,
+        'comments': [],
+        'comments_cursor': None,
+    })
+
+
+def comment_created(comment, author_name):
+    publish('comment', {
+        'post_id': comment.post_id,
+        'comment': {
+            'id': comment.id,
+            'content': comment.content,
+            'created_at': comment.created_at.isoformat(),
+            'author_name': author_name,
+        },
+    })
+
+
+def counts_changed(post_ids):
+    """点赞/投诉计数变化后调用（计数已更新），事件带上最新的计数。"""
+    rows = db.session.execute(
+        select(Post.id, Post.like_count, Post.complaint_count).where(Post.id.in_(list(post_ids)))
+    )
+    for post_id, like_count, complaint_count in rows:
+        counts_updated(post_id, like_count, complaint_count)
+
+
+def counts_updated(post_id, like_count, complaint_count):
+    """调用方已知道最新计数时使用，省去 counts_changed 的查询。"""
+    publish('counts', {'post_id': post_id, 'like_count': like_count, 'complaint_count': complaint_count})
+
+
+def post_deleted(post_id):
+    publish('delete', {'post_id': post_id})
+
+
+def format_event(event_id, kind, payload, late=False):
+    """SSE 文本；data 中带上事件 id（seq），页面按它去重（见 static/forum_events.js）。
+
+    late 为 True（晚提交的事件）或没有 event_id 时不带 id 行，浏览器保留原来的 Last-Event-ID，
+    重连时不会从更小的 id 开始补发重复事件。
+    """
+    id_line = '' if late or event_id is None else f"id: {event_id}\n"
+    return f'{id_line}event: {kind}\ndata: {{"seq": {json.dumps(event_id)}, "data": {payload}}}\n\n'
+
+
+class Subscriber:
+    def __init__(self):
+        self.queue = queue.Queue(SUBSCRIBER_QUEUE)
+        self.overflowed = False
+
+
+class Broker:
+    """进程内的发布/订阅：轮询线程读到的事件分发给每个订阅者的有界队列。"""
+
+    def __init__(self, max_connections=MAX_CONNECTIONS):
+        self.max_connections = max_connections
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        """返回新的订阅者；已达连接上限时返回 None。"""
+        with self._lock:
+            if len(self._subscribers) >= self.max_connections:
+                return None
+            subscriber = Subscriber()
+            self._subscribers.add(subscriber)
+            return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def deliver(self, events):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            for event in events:
+                try:
+                    subscriber.queue.put_nowait(event)
+                except queue.Full:
+                    # 客户端读得太慢：不再补发，通知页面整页刷新
+                    subscriber.overflowed = True
+                    break
+
+    def __len__(self):
+        with self._lock:
+            return len(self._subscribers)
+
+
+broker = Broker()
+_app = None
+_poller = None
+_poller_lock = threading.Lock()
+
+
+request_gate = threading.BoundedSemaphore(config.request_threads())
+
+
+def _enter_gate():
+    request_gate.acquire()
+    g.request_gate = True
+
+
+def _leave_gate(exc=None):
+    # teardown 在请求上下文出栈时执行：普通请求在响应返回后，stream_with_context 的导出在响应体读完后，
+    # 订阅连接在视图返回后（推送事件期间不占闸门）
+    if g.pop('request_gate', False):
+        request_gate.release()
+
+
+def init_app(app):
+    """记录 app 以便轮询线程进入 app context（线程在第一个订阅者连接时才启动），并注册请求闸门。"""
+    global _app
+    _app = app
+    app.before_request(_enter_gate)
+    app.teardown_request(_leave_gate)
+
+
+def replay(last_id):
+    """重连时补发 last_id 之后的事件；事件已被清理或太多时返回 None，页面应整页刷新。"""
+    rows = db.session.execute(
+        select(ForumEvent.id, ForumEvent.kind, ForumEvent.payload)
+        .where(ForumEvent.id > last_id)
+        .order_by(ForumEvent.id)
+        .limit(REPLAY_LIMIT + 1)
+    ).all()
+    oldest = db.session.execute(select(func.min(ForumEvent.id))).scalar()
+    if len(rows) > REPLAY_LIMIT or (oldest is not None and oldest > last_id + 1):
+        return None
+    return [format_event(*row) for row in rows]
+
+
+def stream(subscriber, backlog):
+    """SSE 响应体生成器；不持有数据库连接，客户端断开时取消订阅。"""
+    try:
+        yield f"retry: {POLL_INTERVAL * 1000 + 2000:.0f}\n\n"
+        if backlog is None:
+            yield format_event(None, 'reload', '{}')
+            return
+        for event in backlog:
+            yield event
+        deadline = time.monotonic() + MAX_SECONDS
+        while time.monotonic() < deadline:
+            if subscriber.overflowed:
+                yield format_event(None, 'reload', '{}')
+                return
+            try:
+                yield subscriber.queue.get(timeout=KEEPALIVE_SECONDS)
+            except queue.Empty:
+                # 注释行保持连接，同时让服务器及时发现已断开的客户端
+                yield ': keepalive\n\n'
+    finally:
+        broker.unsubscribe(subscriber)
+
+
+class _Listener:
+    """PostgreSQL 上 LISTEN 专用的连接，等待 NOTIFY 或超时；其他数据库只按间隔休眠。"""
+
+    def __init__(self):
+        self.conn = None
+
+    def wait(self, timeout):
+        if db.engine.dialect.name != 'postgresql':
+            time.sleep(timeout)
+            return
+        if self.conn is None:
+            raw = db.engine.raw_connection()
+            raw.detach()  # 长期占用，不归还连接池
+            self.conn = raw.driver_connection
+            self.conn.autocommit = True
+            self.conn.cursor().execute(f"LISTEN {CHANNEL}")
+        try:
+            if select_module.select([self.conn], [], [], timeout) != ([], [], []):
+                self.conn.poll()
+                self.conn.notifies.clear()
+        except Exception:
+            self.conn = None
+            raise
+
+
+class EventCursor:
+    """轮询位置：已读到的最大 id，以及它之下尚未读到的 id（可能属于还没提交的事务）。"""
+
+    def __init__(self, last_id):
+        self.last_id = last_id
+        self.gaps = {}  # 空缺的 id -> 发现时间
+
+    def condition(self):
+        if not self.gaps:
+            return ForumEvent.id > self.last_id
+        return or_(ForumEvent.id > self.last_id, ForumEvent.id.in_(list(self.gaps)))
+
+    def advance(self, rows, now=None):
+        """记录读到的事件（按 id 排序），返回要推送的 SSE 文本。"""
+        now = time.monotonic() if now is None else now
+        events = []
+        for event_id, kind, payload in rows:
+            if event_id > self.last_id:
+                if event_id - self.last_id - 1 <= MAX_GAPS:
+                    self.gaps.update(dict.fromkeys(range(self.last_id + 1, event_id), now))
+                self.last_id = event_id
+                events.append(format_event(event_id, kind, payload))
+            elif self.gaps.pop(event_id, None) is not None:
+                # 晚提交的事件：不带 id 行，避免浏览器重连时从更小的 id 开始补发重复事件
+                events.append(format_event(event_id, kind, payload, late=True))
+        for event_id in [event_id for event_id, seen in self.gaps.items() if now - seen > GAP_SECONDS]:
+            del self.gaps[event_id]
+        return events
+
+
+def _run():
+    listener = _Listener()
+    with _app.app_context():
+        cursor = EventCursor(db.session.execute(select(func.max(ForumEvent.id))).scalar() or 0)
+        db.session.remove()
+    last_prune = time.monotonic()
+    while True:
+        try:
+            with _app.app_context():
+                listener.wait(POLL_INTERVAL)
+                rows = db.session.execute(
+                    select(ForumEvent.id, ForumEvent.kind, ForumEvent.payload)
+                    .where(cursor.condition())
+                    .order_by(ForumEvent.id)
+                    .limit(READ_BATCH)
+                ).all()
+                events = cursor.advance(rows)
+                if events:
+                    broker.deliver(events)
+                if time.monotonic() - last_prune > 60:
+                    last_prune = time.monotonic()
+                    db.session.execute(delete(ForumEvent).where(ForumEvent.created_at < datetime.utcnow() - RETENTION))
+                    db.session.commit()
+        except Exception:
+            logging.exception("Reading forum events failed, will retry")
+            time.sleep(POLL_INTERVAL)
+
+
+def ensure_poller():
+    global _poller
+    if _poller is not None and _poller.is_alive():
+        return
+    with _poller_lock:
+        if _poller is None or not _poller.is_alive():
+            _poller = threading.Thread(target=_run, name='forum-events', daemon=True)
+            _poller.start()
@@ -0,0 +1,182 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from flask import request, has_request_context
+from sqlalchemy import select, update, insert
+from models import db, ContentVersion
+
+# 论坛帖子列表与排行榜各自的内容版本名
+FORUM = 'forum'
+LEADERBOARD = 'leaderboard'
+_ENVIRON_KEY = 'fragment_cache.content_versions'
+
+
+def content_versions():
+    """一条查询读取所有内容版本号，未出现过的名字视为 0；同一请求内只查询一次（登录校验与片段缓存共用）。"""
+    # 记在 WSGI environ 而不是 g 上：app context 已存在时（如测试、脚本）多个请求会共用同一个 g
+    if has_request_context() and _ENVIRON_KEY in request.environ:
+        return request.environ[_ENVIRON_KEY]
+    versions = dict(db.session.execute(select(ContentVersion.name, ContentVersion.version)).all())
+    if has_request_context():
+        request.environ[_ENVIRON_KEY] = versions
+    return versions
+
+
+def bump(*names):
+    """在当前事务内递增内容版本号，随写操作一起提交。"""
+    if has_request_context():
+        request.environ.pop(_ENVIRON_KEY, None)
+    names = set(names)
+    if not names:
+        return
+    # 多个版本号用一条 UPDATE 递增；只有版本行还不存在时才需要再查询和插入
+    result = db.session.execute(
+        update(ContentVersion)
+        .where(ContentVersion.name.in_(names))
+        .values(version=ContentVersion.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount < len(names):
+        existing = set(db.session.scalars(select(ContentVersion.name).where(ContentVersion.name.in_(names))))
+        for name in sorted(names - existing):
+            db.session.execute(insert(ContentVersion).values(name=name, version=1))
+
+
+class LRUBackend:
+    """进程内 LRU 缓存，每个 worker 一份。"""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, namespace, version, key):
+        with self._lock:
+            entry_key = (namespace, version, key)
+            value = self._entries.get(entry_key)
+            if value is not None:
+                self._entries.move_to_end(entry_key)
+            return value
+
+    def set(self, namespace, version, key, value):
+        with self._lock:
+            entry_key = (namespace, version, key)
+            self._entries[entry_key] = value
+            self._entries.move_to_end(entry_key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteBackend:
+    """本机 SQLite 文件缓存，同一台机器上的多个 worker 共享；值以 JSON 保存。"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS fragments ("
+                "namespace TEXT NOT NULL, version INTEGER NOT NULL, key TEXT NOT NULL, "
+                "value TEXT NOT NULL, stored_at REAL NOT NULL, "
+                "PRIMARY KEY (namespace, version, key))"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace, version, key):
+        row = self._connect().execute(
+            "SELECT value FROM fragments WHERE namespace = ? AND version = ? AND key = ?",
+            (namespace, version, key),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, namespace, version, key, value):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO fragments VALUES (?, ?, ?, ?, ?)",
+                (namespace, version, key, json.dumps(value), time.time()),
+            )
+            # 旧版本的片段不会再被读到，写入时顺手清掉
+            conn.execute(
+                "DELETE FROM fragments WHERE namespace = ? AND version < ?",
+                (namespace, version),
+            )
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM fragments")
+
+
+class NullBackend:
+    """关闭缓存时使用，每次都重新渲染。"""
+
+    def get(self, namespace, version, key):
+        return None
+
+    def set(self, namespace, version, key, value):
+        pass
+
+    def clear(self):
+        pass
+
+
+def backend_from_env():
+    # FRAGMENT_CACHE=memory（默认）| sqlite | off
+    kind = os.getenv('FRAGMENT_CACHE', 'memory').lower()
+    if kind == 'off':
+        return NullBackend()
+    if kind == 'sqlite':
+        path = os.getenv('FRAGMENT_CACHE_PATH') or os.path.join(tempfile.gettempdir(), 'fragment_cache.db')
+        return SQLiteBackend(path)
+    if kind != 'memory':
+        logging.warning(f"Unknown FRAGMENT_CACHE={kind!r}, using in-process cache")
+    return LRUBackend(int(os.getenv('FRAGMENT_CACHE_SIZE', '256')))
+
+
+class FragmentCache:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def fetch(self, namespace, version, key, build):
+        """返回 (namespace, version, key) 对应的缓存值，未命中时调用 build() 生成并写入。
+
+        build() 的返回值需可 JSON 序列化。
+        """
+        value = self.backend.get(namespace, version, key)
+        if value is None:
+            value = build()
+            self.backend.set(namespace, version, key, value)
+        return value
+
+
+cache = FragmentCache(backend_from_env())
+
+
+# 缓存片段中与当前用户相关的部分用注释标记包住两种渲染结果：
+#   <!--liked:12-->已点赞时的 HTML<!--else-->未点赞时的 HTML<!--end-->
+# 用户内容会被模板转义，无法伪造这些标记
+_VIEWER_BLOCK = re.compile(r'<!--(\w+):(\d+)-->(.*?)<!--else-->(.*?)<!--end-->', re.S)
+
+
+def overlay(html, flags):
+    """按当前用户填充片段中的条件块；flags 是 {标记名: 满足条件的 ID 集合}。"""
+    def choose(match):
+        kind, item_id, when_true, when_false = match.groups()
+        return when_true if int(item_id) in flags.get(kind, ()) else when_false
+    return _VIEWER_BLOCK.sub(choose, html)
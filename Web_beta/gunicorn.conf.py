@@ -0,0 +1,10 @@
+# gunicorn 配置：worker 与线程数按连接池大小推算，见 config.worker_settings
+import config
+
+bind = f"0.0.0.0:{config.env_int('PORT', 8000)}"
+workers, threads = config.worker_settings()
+worker_class = 'gthread' if threads > 1 else 'sync'
+timeout = config.env_int('GUNICORN_TIMEOUT', 30)
+# 每个 worker 处理一定数量请求后重启，避免长时间运行的内存增长
+max_requests = config.env_int('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = 100
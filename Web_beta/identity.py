@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+from models import db, User
+import fragment_cache
+
+# content_versions 中的版本名，用户被删除或创建时递增
+VERSION = 'users'
+
+
+# 当前登录用户的只读快照，可以安全地跨请求缓存（不绑定数据库会话）
+@dataclass(frozen=True)
+class CurrentUser:
+    id: int
+    username: str
+    login_type: str
+    birthdate: Optional[str]
+
+    @property
+    def is_admin(self):
+        return self.login_type == 'admin'
+
+
+class IdentityCache:
+    """按用户 ID 缓存 CurrentUser 的小型 TTL + LRU 缓存（每个 worker 进程一份）。
+
+    每个条目记录写入时 content_versions 中 users 的版本号，读取时版本不同即视为未命中：
+    删除或创建用户时在同一事务内递增版本，所有 worker 的下一个请求就会重新查询，TTL 只是兜底。
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, version=0):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            user, expires_at, cached_version = entry
+            if expires_at < time.monotonic() or cached_version != version:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return user
+
+    def put(self, user, version=0):
+        with self._lock:
+            self._entries[user.id] = (user, time.monotonic() + self.ttl, version)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+identity_cache = IdentityCache()
+
+
+def snapshot(user):
+    return CurrentUser(
+        id=user.id,
+        username=user.username,
+        login_type=user.login_type,
+        birthdate=user.birthdate,
+    )
+
+
+def _version():
+    return fragment_cache.content_versions().get(VERSION, 0)
+
+
+def load_user(user_id):
+    """返回用户快照；先读一次内容版本号（与片段缓存共用），缓存失效时再查询用户；用户不存在时返回 None。"""
+    version = _version()
+    user = identity_cache.get(user_id, version)
+    if user is not None:
+        return user
+    row = db.session.get(User, user_id)
+    if row is None:
+        return None
+    user = snapshot(row)
+    identity_cache.put(user, version)
+    return user
+
+
+def remember(user):
+    """登录成功后缓存用户快照，省去下一个请求的用户查询。"""
+    identity_cache.put(snapshot(user), _version())
+
+
+def user_id_for_username(username):
+    # 兼容只保存了用户名的旧 session
+    return db.session.query(User.id).filter_by(username=username).scalar()
+
+
+def users_changed():
+    """删除或创建用户时在当前事务内调用，随写操作一起提交后所有 worker 的缓存同时失效。"""
+    fragment_cache.bump(VERSION)
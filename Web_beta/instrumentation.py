@@ -0,0 +1,228 @@
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from flask import g, request, has_request_context
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import config
+
+# 每个请求的 SQL 与耗时统计，均可通过环境变量调整：
+#   SLOW_REQUEST_MS        请求总耗时超过该毫秒数时写慢请求日志（默认 500，0 表示关闭）
+#   SLOW_REQUEST_QUERIES   单个请求 SQL 语句数超过该值时也写慢请求日志（默认 30，0 表示关闭）
+#   SERVER_TIMING          是否在响应中添加 Server-Timing 头（默认开启）
+#   METRICS_WINDOW_MINUTES /admin/metrics 统计最近多少分钟（默认 15）
+SLOW_REQUEST_MS = config.env_int('SLOW_REQUEST_MS', 500)
+SLOW_REQUEST_QUERIES = config.env_int('SLOW_REQUEST_QUERIES', 30)
+SERVER_TIMING = config.env_bool('SERVER_TIMING', True)
+WINDOW_MINUTES = config.env_int('METRICS_WINDOW_MINUTES', 15)
+SLOWEST_STATEMENTS = 3
+
+# 直方图的桶上界（毫秒），最后一个桶收集更慢的请求
+BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+slow_log = logging.getLogger('slow_requests')
+
+
+class RequestMetrics:
+    """单个请求内累计的统计，保存在 g.request_metrics。"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_ms = 0.0
+        self.render_ms = 0.0
+        self.slowest = []
+
+    def add_query(self, statement, elapsed_ms):
+        self.queries += 1
+        self.db_ms += elapsed_ms
+        self.slowest.append((elapsed_ms, statement))
+        if len(self.slowest) > SLOWEST_STATEMENTS:
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[SLOWEST_STATEMENTS:]
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+
+def _current():
+    return g.get('request_metrics') if has_request_context() else None
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current() is not None:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    metrics = _current()
+    started = conn.info.get('query_started')
+    if metrics is None or not started:
+        return
+    metrics.add_query(statement, (time.perf_counter() - started.pop()) * 1000)
+
+
+class TimedTemplate(Template):
+    """记录模板渲染耗时的 Jinja 模板类；片段与整页分别渲染，耗时累加。"""
+
+    def render(self, *args, **kwargs):
+        metrics = _current()
+        if metrics is None:
+            return super().render(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            metrics.render_ms += (time.perf_counter() - started) * 1000
+
+
+class _Slice:
+    """某个端点一分钟内的汇总。"""
+
+    __slots__ = ('minute', 'count', 'total_ms', 'max_ms', 'db_ms', 'queries', 'slow', 'buckets')
+
+    def __init__(self, minute):
+        self.minute = minute
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.db_ms = 0.0
+        self.queries = 0
+        self.slow = 0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+
+class EndpointMetrics:
+    """按端点、按分钟滚动的耗时直方图（每个 worker 进程一份）。"""
+
+    def __init__(self, window_minutes=WINDOW_MINUTES):
+        self.window = window_minutes
+        self._slices = defaultdict(deque)
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, elapsed_ms, db_ms, queries, slow):
+        minute = int(time.time() // 60)
+        with self._lock:
+            slices = self._slices[endpoint]
+            if not slices or slices[-1].minute != minute:
+                slices.append(_Slice(minute))
+                while slices[0].minute <= minute - self.window:
+                    slices.popleft()
+            current = slices[-1]
+            current.count += 1
+            current.total_ms += elapsed_ms
+            current.max_ms = max(current.max_ms, elapsed_ms)
+            current.db_ms += db_ms
+            current.queries += queries
+            current.slow += slow
+            current.buckets[_bucket(elapsed_ms)] += 1
+
+    def snapshot(self):
+        """返回窗口内每个端点的汇总，按总耗时从高到低排序。"""
+        oldest = int(time.time() // 60) - self.window
+        rows = []
+        with self._lock:
+            for endpoint, slices in self._slices.items():
+                live = [s for s in slices if s.minute > oldest]
+                count = sum(s.count for s in live)
+                if not count:
+                    continue
+                buckets = [sum(s.buckets[i] for s in live) for i in range(len(BUCKETS) + 1)]
+                total_ms = sum(s.total_ms for s in live)
+                rows.append({
+                    'endpoint': endpoint,
+                    'count': count,
+                    'mean_ms': round(total_ms / count, 1),
+                    'p50_ms': _quantile(buckets, count, 0.5),
+                    'p95_ms': _quantile(buckets, count, 0.95),
+                    'max_ms': round(max(s.max_ms for s in live), 1),
+                    'db_ms': round(sum(s.db_ms for s in live) / count, 1),
+                    'queries': round(sum(s.queries for s in live) / count, 1),
+                    'slow': sum(s.slow for s in live),
+                    'buckets': buckets,
+                    '_total_ms': total_ms,
+                })
+        rows.sort(key=lambda row: row.pop('_total_ms'), reverse=True)
+        return rows
+
+    def clear(self):
+        with self._lock:
+            self._slices.clear()
+
+
+def _bucket(elapsed_ms):
+    for index, bound in enumerate(BUCKETS):
+        if elapsed_ms <= bound:
+            return index
+    return len(BUCKETS)
+
+
+def _quantile(buckets, count, q):
+    # 直方图只能给出所在桶的上界；落在最后一个桶时返回 None 表示超过最大上界
+    target = q * count
+    seen = 0
+    for index, n in enumerate(buckets):
+        seen += n
+        if seen >= target:
+            return BUCKETS[index] if index < len(BUCKETS) else None
+    return None
+
+
+endpoint_metrics = EndpointMetrics()
+
+
+def _before_request():
+    g.request_metrics = RequestMetrics()
+
+
+def _after_request(response):
+    metrics = g.pop('request_metrics', None)
+    if metrics is None:
+        return response
+    elapsed_ms = metrics.elapsed_ms()
+    slow = (
+        (SLOW_REQUEST_MS and elapsed_ms > SLOW_REQUEST_MS)
+        or (SLOW_REQUEST_QUERIES and metrics.queries > SLOW_REQUEST_QUERIES)
+    )
+    endpoint = request.endpoint or 'unmatched'
+    endpoint_metrics.record(endpoint, elapsed_ms, metrics.db_ms, metrics.queries, bool(slow))
+
+    if slow:
+        # 字段通过 extra 传入，JsonFormatter 输出为一个扁平的 JSON 对象；消息本身供 text 格式阅读
+        slow_log.warning(
+            f'Slow request {request.method} {request.path}: {elapsed_ms:.1f} ms, {metrics.queries} queries',
+            extra={
+                'event': 'slow_request',
+                'method': request.method,
+                'path': request.path,
+                'endpoint': endpoint,
+                'status': response.status_code,
+                'total_ms': round(elapsed_ms, 1),
+                'db_ms': round(metrics.db_ms, 1),
+                'render_ms': round(metrics.render_ms, 1),
+                'queries': metrics.queries,
+                'slowest': [
+                    {'ms': round(ms, 1), 'sql': ' '.join(statement.split())[:300]}
+                    for ms, statement in sorted(metrics.slowest, key=lambda item: item[0], reverse=True)
+                ],
+            },
+        )
+
+    if SERVER_TIMING:
+        response.headers.add('Server-Timing', ', '.join([
+            f'db;dur={metrics.db_ms:.1f};desc="{metrics.queries} queries"',
+            f'render;dur={metrics.render_ms:.1f}',
+            f'total;dur={elapsed_ms:.1f}',
+        ]))
+    return response
+
+
+def init_app(app):
+    """注册请求钩子并替换模板类；需在加载任何模板之前调用。"""
+    app.jinja_env.template_class = TimedTemplate
+    app.before_request(_before_request)
+    app.after_request(_after_request)
@@ -0,0 +1,145 @@
+from sqlalchemy import select, update, delete, insert, func, union
+from models import db, User, Post, Like, Complaint, UserScore
+
+
+def _likes_received(author_id_col):
+    return (
+        select(func.count(Like.id))
+        .join(Post, Post.id == Like.post_id)
+        .where(Post.author_id == author_id_col)
+        .scalar_subquery()
+    )
+
+
+def _complaints_received(author_id_col):
+    return (
+        select(func.count(Complaint.id))
+        .join(Post, Post.id == Complaint.post_id)
+        .where(Post.author_id == author_id_col)
+        .scalar_subquery()
+    )
+
+
+def top_users():
+    # 直接走 ix_user_scores_rank 索引顺序
+    return (
+        UserScore.query
+        .order_by(UserScore.net_score.desc(), UserScore.username)
+        .all()
+    )
+
+
+def add_user(user):
+    # 新用户以 0 分进入排行榜，需在 user.id 可用（flush 之后）调用
+    db.session.add(UserScore(user_id=user.id, username=user.username))
+
+
+def add_users(users):
+    """批量导入用户时使用，users 为 (user_id, username) 列表。"""
+    if users:
+        db.session.execute(insert(UserScore), [
+            {'user_id': user_id, 'username': username} for user_id, username in users
+        ])
+
+
+def remove_user(user_id):
+    db.session.execute(delete(UserScore).where(UserScore.user_id == user_id))
+
+
+def apply_reaction(post_id, likes=0, complaints=0):
+    """帖子收到/撤销点赞或投诉时，给帖子作者的分数做原子增减。"""
+    if not likes and not complaints:
+        return
+    author_id = select(Post.author_id).where(Post.id == post_id).scalar_subquery()
+    db.session.execute(
+        update(UserScore)
+        .where(UserScore.user_id == author_id)
+        .values(
+            total_likes=UserScore.total_likes + likes,
+            total_complaints=UserScore.total_complaints + complaints,
+            net_score=UserScore.net_score + (likes - complaints),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def remove_post(post_id):
+    """删除帖子前调用：从作者分数中扣除该帖子的点赞和投诉。"""
+    likes = select(func.count(Like.id)).where(Like.post_id == post_id).scalar_subquery()
+    complaints = select(func.count(Complaint.id)).where(Complaint.post_id == post_id).scalar_subquery()
+    author_id = select(Post.author_id).where(Post.id == post_id).scalar_subquery()
+    db.session.execute(
+        update(UserScore)
+        .where(UserScore.user_id == author_id)
+        .values(
+            total_likes=UserScore.total_likes - likes,
+            total_complaints=UserScore.total_complaints - complaints,
+            net_score=UserScore.net_score - likes + complaints,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def authors_reacted_by(user_id):
+    """某用户点赞或投诉过的帖子的作者 ID，删除该用户后需要重算这些作者。"""
+    stmt = union(
+        select(Post.author_id).join(Like, Like.post_id == Post.id).where(Like.user_id == user_id),
+        select(Post.author_id).join(Complaint, Complaint.post_id == Post.id).where(Complaint.user_id == user_id),
+    )
+    return [row[0] for row in db.session.execute(stmt)]
+
+
+def refresh_users(user_ids):
+    """用相关子查询重算指定用户的分数。"""
+    if not user_ids:
+        return
+    likes = _likes_received(UserScore.user_id)
+    complaints = _complaints_received(UserScore.user_id)
+    db.session.execute(
+        update(UserScore)
+        .where(UserScore.user_id.in_(list(user_ids)))
+        .values(
+            total_likes=likes,
+            total_complaints=complaints,
+            net_score=likes - complaints,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def rebuild():
+    """清空并用一次 GROUP BY 聚合重建整张排行榜表，返回写入的行数。"""
+    like_totals = (
+        select(Post.author_id.label('user_id'), func.count(Like.id).label('n'))
+        .join(Like, Like.post_id == Post.id)
+        .group_by(Post.author_id)
+        .subquery()
+    )
+    complaint_totals = (
+        select(Post.author_id.label('user_id'), func.count(Complaint.id).label('n'))
+        .join(Complaint, Complaint.post_id == Post.id)
+        .group_by(Post.author_id)
+        .subquery()
+    )
+    total_likes = func.coalesce(like_totals.c.n, 0)
+    total_complaints = func.coalesce(complaint_totals.c.n, 0)
+    rows = (
+        select(
+            User.id,
+            User.username,
+            total_likes,
+            total_complaints,
+            total_likes - total_complaints,
+        )
+        .outerjoin(like_totals, like_totals.c.user_id == User.id)
+        .outerjoin(complaint_totals, complaint_totals.c.user_id == User.id)
+    )
+
+    db.session.execute(delete(UserScore))
+    result = db.session.execute(
+        insert(UserScore).from_select(
+            ['user_id', 'username', 'total_likes', 'total_complaints', 'net_score'],
+            rows,
+        )
+    )
+    return result.rowcount
@@ -0,0 +1,147 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+import config
+
+# 日志配置，均可通过环境变量调整：
+#   LOG_LEVEL       根日志级别（默认 INFO）
+#   LOG_FORMAT      json（默认，每行一个 JSON 对象）或 text
+#   LOG_LEVELS      按 logger 设置级别，如 sqlalchemy.engine=INFO,werkzeug=WARNING
+#   LOG_SAMPLE      按 logger 对 ERROR 以下的日志抽样，如 http_errors=0.1 只保留约 10%
+#   LOG_QUEUE_SIZE  待写日志队列长度，写满时丢弃新日志而不是阻塞请求（默认 10000）
+# 请求线程只把日志放入队列，格式化和写 stdout 由后台线程完成
+DEFAULT_LEVELS = {
+    # 根级别为 DEBUG 时 SQLAlchemy 会打印每条 SQL，需单独开启
+    'sqlalchemy': logging.WARNING,
+    'werkzeug': logging.INFO,
+}
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+# LogRecord 自带的属性，其余属性视为 extra 字段写入 JSON
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """按比例保留 ERROR 以下的日志，ERROR 及以上全部保留。"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.ERROR or random.random() < self.rate
+
+
+class DroppingQueueHandler(QueueHandler):
+    """队列满时丢弃日志并计数，不阻塞调用方。"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # 只合并消息参数并展开异常，不在请求线程里做格式化
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _parse_pairs(value):
+    pairs = {}
+    for item in (value or '').split(','):
+        name, sep, setting = item.partition('=')
+        if sep and name.strip():
+            pairs[name.strip()] = setting.strip()
+    return pairs
+
+
+_listener = None
+_sampled = []
+
+
+def configure():
+    """配置根 logger；重复调用时先停止之前的后台线程。返回队列 handler。"""
+    global _listener
+    shutdown()
+    while _sampled:
+        logger, sampler = _sampled.pop()
+        logger.removeFilter(sampler)
+
+    stream = logging.StreamHandler(sys.stdout)
+    if config.env_str('LOG_FORMAT', 'json') == 'text':
+        stream.setFormatter(logging.Formatter(TEXT_FORMAT))
+    else:
+        stream.setFormatter(JsonFormatter())
+
+    handler = DroppingQueueHandler(queue.Queue(config.env_int('LOG_QUEUE_SIZE', 10000)))
+    _listener = QueueListener(handler.queue, stream, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(config.env_str('LOG_LEVEL', 'INFO').upper())
+
+    levels = dict(DEFAULT_LEVELS)
+    levels.update(_parse_pairs(config.env_str('LOG_LEVELS', '')))
+    for name, level in levels.items():
+        try:
+            logging.getLogger(name).setLevel(level.upper() if isinstance(level, str) else level)
+        except ValueError:
+            logging.warning(f"Ignoring invalid log level {name}={level!r}")
+
+    for name, rate in _parse_pairs(config.env_str('LOG_SAMPLE', '')).items():
+        try:
+            sampler = SamplingFilter(float(rate))
+        except ValueError:
+            logging.warning(f"Ignoring invalid log sample rate {name}={rate!r}")
+            continue
+        logging.getLogger(name).addFilter(sampler)
+        _sampled.append((logging.getLogger(name), sampler))
+    return handler
+
+
+def shutdown():
+    """停止后台线程并写出队列中剩余的日志。"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown)
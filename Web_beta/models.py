@@ -2,9 +2,20 @@ from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from typing import Optional, List
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import String, Integer, Text, Boolean, DateTime, ForeignKey
+from sqlalchemy import String, Integer, SmallInteger, Text, Boolean, DateTime, ForeignKey, Index, func, text, and_, false
+import sqlalchemy.dialects.postgresql  # 注册 to_tsvector 等全文检索函数的类型
+from replica import RoutingSession
 
-db = SQLAlchemy()
+# 会话按视图把只读查询路由到副本（配置了 DATABASE_READ_URL 时），见 replica.py
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+# 待办优先级在数据库中以整数存储（数值越小越靠前），对外仍使用字符串
+PRIORITY_RANKS = {'urgent': 0, 'medium': 1, 'low': 2}
+PRIORITY_NAMES = {rank: name for name, rank in PRIORITY_RANKS.items()}
+DEFAULT_PRIORITY = 'medium'
+
+def priority_rank(name):
+    return PRIORITY_RANKS.get(name, PRIORITY_RANKS[DEFAULT_PRIORITY])
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -15,47 +26,70 @@ class User(db.Model):
     birthdate: Mapped[Optional[str]] = mapped_column(String(10), nullable=True)
     created_by: Mapped[Optional[str]] = mapped_column(String(80), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
-    posts: Mapped[List["Post"]] = relationship("Post", back_populates="author", lazy="dynamic")
-    todos: Mapped[List["Todo"]] = relationship("Todo", back_populates="user", lazy="dynamic")
-    comments: Mapped[List["Comment"]] = relationship("Comment", back_populates="author", lazy="dynamic")
-    likes: Mapped[List["Like"]] = relationship("Like", back_populates="user", lazy="dynamic")
-    complaints: Mapped[List["Complaint"]] = relationship("Complaint", back_populates="user", lazy="dynamic")
+    # 待办增量同步的变更计数：每次修改该用户的待办时在同一事务内加一（见 todo_store.next_change）
+    todo_version: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default='0')
+    posts: Mapped[List["Post"]] = relationship("Post", back_populates="author", lazy="dynamic", passive_deletes=True)
+    todos: Mapped[List["Todo"]] = relationship("Todo", back_populates="user", lazy="dynamic", passive_deletes=True)
+    comments: Mapped[List["Comment"]] = relationship("Comment", back_populates="author", lazy="dynamic", passive_deletes=True)
+    likes: Mapped[List["Like"]] = relationship("Like", back_populates="user", lazy="dynamic", passive_deletes=True)
+    complaints: Mapped[List["Complaint"]] = relationship("Complaint", back_populates="user", lazy="dynamic", passive_deletes=True)
 
 class Post(db.Model):
     __tablename__ = 'posts'
+    __table_args__ = (
+        Index('ix_posts_created_at_id', 'created_at', 'id'),
+        Index('ix_posts_author_id', 'author_id'),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     content: Mapped[str] = mapped_column(Text, nullable=False)
-    author_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), nullable=False)
+    author_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # 冗余计数，由 counters 模块用原子 UPDATE 维护
+    like_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default='0')
+    complaint_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default='0')
+    comment_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default='0')
     author: Mapped["User"] = relationship("User", back_populates="posts")
-    comments: Mapped[List["Comment"]] = relationship("Comment", back_populates="post", lazy="dynamic")
-    likes: Mapped[List["Like"]] = relationship("Like", back_populates="post", lazy="dynamic")
-    complaints: Mapped[List["Complaint"]] = relationship("Complaint", back_populates="post", lazy="dynamic")
+    comments: Mapped[List["Comment"]] = relationship("Comment", back_populates="post", lazy="dynamic", passive_deletes=True)
+    likes: Mapped[List["Like"]] = relationship("Like", back_populates="post", lazy="dynamic", passive_deletes=True)
+    complaints: Mapped[List["Complaint"]] = relationship("Complaint", back_populates="post", lazy="dynamic", passive_deletes=True)
 
 class Comment(db.Model):
     __tablename__ = 'comments'
+    __table_args__ = (
+        Index('ix_comments_post_created', 'post_id', 'created_at', 'id'),
+        Index('ix_comments_author_id', 'author_id'),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     content: Mapped[str] = mapped_column(Text, nullable=False)
-    post_id: Mapped[int] = mapped_column(Integer, ForeignKey('posts.id'), nullable=False)
-    author_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), nullable=False)
+    post_id: Mapped[int] = mapped_column(Integer, ForeignKey('posts.id', ondelete='CASCADE'), nullable=False)
+    author_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     post: Mapped["Post"] = relationship("Post", back_populates="comments")
     author: Mapped["User"] = relationship("User", back_populates="comments")
 
 class Like(db.Model):
     __tablename__ = 'likes'
+    # 唯一索引同时充当 (post_id, user_id) 查询索引，SQLite 不支持 ALTER TABLE ADD CONSTRAINT
+    __table_args__ = (
+        Index('uq_likes_post_user', 'post_id', 'user_id', unique=True),
+        Index('ix_likes_user_id', 'user_id'),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    post_id: Mapped[int] = mapped_column(Integer, ForeignKey('posts.id'), nullable=False)
-    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), nullable=False)
+    post_id: Mapped[int] = mapped_column(Integer, ForeignKey('posts.id', ondelete='CASCADE'), nullable=False)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     post: Mapped["Post"] = relationship("Post", back_populates="likes")
     user: Mapped["User"] = relationship("User", back_populates="likes")
 
 class Complaint(db.Model):
     __tablename__ = 'complaints'
+    __table_args__ = (
+        Index('uq_complaints_post_user', 'post_id', 'user_id', unique=True),
+        Index('ix_complaints_user_id', 'user_id'),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    post_id: Mapped[int] = mapped_column(Integer, ForeignKey('posts.id'), nullable=False)
-    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), nullable=False)
+    post_id: Mapped[int] = mapped_column(Integer, ForeignKey('posts.id', ondelete='CASCADE'), nullable=False)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     post: Mapped["Post"] = relationship("Post", back_populates="complaints")
     user: Mapped["User"] = relationship("User", back_populates="complaints")
@@ -66,8 +100,102 @@ class Todo(db.Model):
     task: Mapped[str] = mapped_column(String(200), nullable=False)
     date: Mapped[Optional[str]] = mapped_column(String(10), nullable=True)
     time: Mapped[Optional[str]] = mapped_column(String(5), nullable=True)
-    priority: Mapped[str] = mapped_column(String(10), default='medium')
+    priority_rank: Mapped[int] = mapped_column(SmallInteger, nullable=False, default=PRIORITY_RANKS[DEFAULT_PRIORITY], server_default='1')
     completed: Mapped[bool] = mapped_column(Boolean, default=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
-    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), nullable=False)
-    user: Mapped["User"] = relationship("User", back_populates="todos") 
\ No newline at end of file
+    # 增量同步使用；旧数据由迁移回填，所以数据库层面允许为空
+    updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True, default=datetime.utcnow, onupdate=datetime.utcnow)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    # 由 date/time 字符串换算出的 UTC 截止时间（见 todo_store.due_at_for），无法解析时为空
+    due_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    # 已发送提醒的时间；修改日期或时间后清空，重新提醒
+    reminded_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    # 最后一次修改时用户的 todo_version，增量同步按它而不是 updated_at 筛选
+    change_seq: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default='0')
+    user: Mapped["User"] = relationship("User", back_populates="todos")
+
+    @property
+    def priority(self):
+        return PRIORITY_NAMES.get(self.priority_rank, DEFAULT_PRIORITY)
+
+    @priority.setter
+    def priority(self, name):
+        self.priority_rank = priority_rank(name)
+
+# 待办列表排序 (completed, priority_rank, created_at DESC) 可直接按索引顺序读取；PostgreSQL 上附带常用列成为覆盖索引
+Index(
+    'ix_todos_user_order',
+    Todo.user_id, Todo.completed, Todo.priority_rank, Todo.created_at.desc(),
+    postgresql_include=['task', 'date', 'time'],
+)
+Index('ix_todos_user_change', Todo.user_id, Todo.change_seq, Todo.id)
+
+# 等待提醒的待办：提醒调度按 due_at 顺序读取，部分索引只包含这些行；查询条件必须与索引条件一致才能使用
+REMINDER_PENDING = and_(Todo.due_at.isnot(None), Todo.completed == false(), Todo.reminded_at.is_(None))
+Index('ix_todos_due_pending', Todo.due_at, Todo.id, sqlite_where=REMINDER_PENDING, postgresql_where=REMINDER_PENDING)
+
+# 已删除待办的墓碑记录，供客户端增量同步时得知哪些条目被删除
+class TodoTombstone(db.Model):
+    __tablename__ = 'todo_tombstones'
+    __table_args__ = (
+        Index('ix_todo_tombstones_user_change', 'user_id', 'change_seq'),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    todo_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    deleted_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    change_seq: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default='0')
+
+# 群主排行榜的物化表：点赞/投诉/删除时增量维护，页面只需一次索引排序读取
+class UserScore(db.Model):
+    __tablename__ = 'user_scores'
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    username: Mapped[str] = mapped_column(String(80), nullable=False)
+    total_likes: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default='0')
+    total_complaints: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default='0')
+    net_score: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default='0')
+
+Index('ix_user_scores_rank', UserScore.net_score.desc(), UserScore.username)
+
+# 页面片段缓存的内容版本号：写操作在同一事务内递增，缓存键带上版本号，多个 worker 共享失效信号
+class ContentVersion(db.Model):
+    __tablename__ = 'content_versions'
+    name: Mapped[str] = mapped_column(String(40), primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default='0')
+
+# API 令牌吊销记录：该用户在 revoked_at 之前签发的令牌全部失效（用户删除后 ID 可能被复用，所以不加外键）
+class ApiRevocation(db.Model):
+    __tablename__ = 'api_revocations'
+    user_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    revoked_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+
+# 论坛实时更新事件：写操作在同一事务内插入，各 worker 的 forum_events 线程按 id 顺序读取后推送给 SSE 订阅者，定期清理
+class ForumEvent(db.Model):
+    __tablename__ = 'forum_events'
+    __table_args__ = (
+        Index('ix_forum_events_created_at', 'created_at'),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    kind: Mapped[str] = mapped_column(String(20), nullable=False)
+    payload: Mapped[str] = mapped_column(Text, nullable=False)  # JSON
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+
+# 全文检索文档：每个帖子、每条评论一行，tokens 为 search.index_text 生成的分词结果（CJK 单字 + 二元组）
+# SQLite 上由 search_fts（FTS5 外部内容表，触发器同步）建索引，PostgreSQL 上使用 GIN 表达式索引
+class SearchDocument(db.Model):
+    __tablename__ = 'search_documents'
+    __table_args__ = (
+        Index('uq_search_documents_source', 'kind', 'source_id', unique=True),
+        Index('ix_search_documents_post_id', 'post_id'),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    kind: Mapped[str] = mapped_column(String(10), nullable=False)  # 'post' 或 'comment'
+    source_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    post_id: Mapped[int] = mapped_column(Integer, ForeignKey('posts.id', ondelete='CASCADE'), nullable=False)
+    tokens: Mapped[str] = mapped_column(Text, nullable=False)
+
+Index(
+    'ix_search_documents_tsv',
+    func.to_tsvector(text("'simple'"), SearchDocument.tokens),
+    postgresql_using='gin',
+).ddl_if(dialect='postgresql')
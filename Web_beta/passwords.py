@@ -0,0 +1,171 @@
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from functools import lru_cache
+from werkzeug.security import generate_password_hash, check_password_hash
+import config
+
+# 密码哈希策略与执行方式，均可通过环境变量调整：
+#   PASSWORD_HASH_METHOD    werkzeug 的哈希方法，如 pbkdf2:sha256:600000（默认）、scrypt:32768:8:1
+#   PASSWORD_HASH_WORKERS   同时进行哈希计算的线程/进程数（默认 2）
+#   PASSWORD_HASH_QUEUE     排队等待哈希的最大请求数，超过时直接拒绝（默认 16）
+#   PASSWORD_HASH_EXECUTOR  thread（默认，hashlib 计算时会释放 GIL）或 process
+#   PASSWORD_IMPORT_WORKERS 批量导入用户时并行哈希的线程/进程数（默认 2），与登录使用的哈希池分开
+#   LOGIN_RATE_PER_USER / LOGIN_RATE_PER_IP  每分钟允许的登录失败次数（默认 5 / 50），达到后拒绝该用户名或 IP 的登录；
+#                           成功的登录不计数，同一出口 IP 后的整个班级同时登录不会被拒绝
+HASH_METHOD = config.env_str('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+HASH_WORKERS = config.env_int('PASSWORD_HASH_WORKERS', 2)
+HASH_QUEUE = config.env_int('PASSWORD_HASH_QUEUE', 16)
+HASH_TIMEOUT = 10
+
+
+class HashingBusy(Exception):
+    """哈希队列已满，调用方应提示稍后重试。"""
+
+
+class TooManyAttempts(Exception):
+    """登录尝试过于频繁。"""
+
+
+class _HashPool:
+    """有界的哈希执行池：最多 workers 个同时计算，最多 queue 个排队，其余立即拒绝。"""
+
+    def __init__(self, workers, queue, kind):
+        self._slots = threading.BoundedSemaphore(workers + queue)
+        self._executor = None
+        self._workers = workers
+        self._kind = kind
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # 延迟创建，避免 gunicorn fork 前启动线程或子进程
+        with self._lock:
+            if self._executor is None:
+                if self._kind == 'process':
+                    # 进程池模块导入较慢，只在配置使用时导入
+                    from concurrent.futures import ProcessPoolExecutor
+                    self._executor = ProcessPoolExecutor(max_workers=self._workers)
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self._workers)
+            return self._executor
+
+    def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy('服务器繁忙，请稍后再试')
+        try:
+            return self._get_executor().submit(fn, *args).result(timeout=HASH_TIMEOUT)
+        except FutureTimeout:
+            raise HashingBusy('服务器繁忙，请稍后再试')
+        finally:
+            self._slots.release()
+
+    def map(self, fn, values, *args):
+        """对 values 逐个执行 fn(value, *args)，整批占用一个名额。"""
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy('服务器繁忙，请稍后再试')
+        try:
+            futures = [self._get_executor().submit(fn, value, *args) for value in values]
+            return [future.result() for future in futures]
+        finally:
+            self._slots.release()
+
+
+pool = _HashPool(HASH_WORKERS, HASH_QUEUE, config.env_str('PASSWORD_HASH_EXECUTOR', 'thread'))
+# 批量导入单独使用一个池，导入大量用户时不会让登录请求因哈希池占满而被拒绝
+import_pool = _HashPool(config.env_int('PASSWORD_IMPORT_WORKERS', 2), 0, config.env_str('PASSWORD_HASH_EXECUTOR', 'thread'))
+
+
+def hash_password(password):
+    return pool.run(generate_password_hash, password, HASH_METHOD)
+
+
+def hash_passwords(plain_passwords):
+    """批量导入时并行哈希一批密码，按输入顺序返回；同时进行的导入过多时抛出 HashingBusy。"""
+    return import_pool.map(generate_password_hash, plain_passwords, HASH_METHOD)
+
+
+def looks_like_hash(value):
+    """导出再导入时直接沿用的密码哈希（werkzeug 格式：方法$盐$摘要）。"""
+    return isinstance(value, str) and value.count('$') == 2 and value.split(':', 1)[0] in ('pbkdf2', 'scrypt')
+
+
+def verify_password(password_hash, password):
+    return pool.run(check_password_hash, password_hash, password)
+
+
+@lru_cache(maxsize=None)
+def _policy_prefix():
+    # werkzeug 会补全省略的参数（如 pbkdf2 -> pbkdf2:sha256:600000），以实际生成的前缀为准
+    return generate_password_hash('', HASH_METHOD).split('$', 1)[0]
+
+
+def needs_rehash(password_hash):
+    return password_hash.split('$', 1)[0] != _policy_prefix()
+
+
+def verify_and_upgrade(user, password):
+    """校验密码；哈希策略变化后登录成功时顺便按新策略重新哈希（由调用方提交）。"""
+    if not verify_password(user.password, password):
+        return False
+    if needs_rehash(user.password):
+        logging.info(f"Rehashing password for user {user.id}")
+        user.password = hash_password(password)
+    return True
+
+
+class RateLimiter:
+    """按键统计滑动窗口内的次数（每个 worker 进程一份）。"""
+
+    def __init__(self, limit, window=60):
+        self.limit = limit
+        self.window = window
+        self._hits = defaultdict(deque)
+        self._lock = threading.Lock()
+
+    def _prune(self, hits, now):
+        while hits and hits[0] <= now - self.window:
+            hits.popleft()
+
+    def exceeded(self, key):
+        """窗口内的次数是否已达到限制。"""
+        now = time.monotonic()
+        with self._lock:
+            hits = self._hits.get(key)
+            if not hits:
+                return False
+            self._prune(hits, now)
+            return len(hits) >= self.limit
+
+    def hit(self, key):
+        """记录一次。"""
+        now = time.monotonic()
+        with self._lock:
+            hits = self._hits[key]
+            self._prune(hits, now)
+            hits.append(now)
+            # 定期清理已过期的键，防止字典无限增长
+            if len(self._hits) > 10000:
+                for stale in [k for k, v in self._hits.items() if not v or v[-1] <= now - self.window]:
+                    del self._hits[stale]
+
+    def clear(self):
+        with self._lock:
+            self._hits.clear()
+
+
+user_limiter = RateLimiter(config.env_int('LOGIN_RATE_PER_USER', 5))
+ip_limiter = RateLimiter(config.env_int('LOGIN_RATE_PER_IP', 50))
+
+
+def check_login_rate(username, ip):
+    """在进行哈希计算前调用；同一用户名或同一 IP 最近失败过多时抛出 TooManyAttempts。"""
+    if ip_limiter.exceeded(ip) or user_limiter.exceeded(username):
+        raise TooManyAttempts('登录尝试过于频繁，请稍后再试')
+
+
+def login_failed(username, ip):
+    """记录一次失败的登录（用户不存在、密码或出生日期错误），只有失败计入限流。"""
+    ip_limiter.hit(ip)
+    user_limiter.hit(username)
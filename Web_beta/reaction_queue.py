@@ -0,0 +1,479 @@
+import atexit
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from sqlalchemy import select, exists
+from sqlalchemy.exc import OperationalError, InterfaceError
+from models import db, User, Post, Like, Complaint
+import config
+import counters
+import forum_events
+import fragment_cache
+import leaderboard
+import reactions
+
+# 点赞/投诉的延迟写入，均可通过环境变量调整：
+#   REACTION_WRITE_MODE      sync（默认，请求内直接写库）或 queue（先记入待写队列，由后台线程批量写库）
+#   REACTION_QUEUE           memory（默认，每个 worker 进程一份）或 sqlite（本机文件，同一台机器上的 worker 共享，
+#                            worker 重启也不会丢失未写入的操作，路径由 REACTION_QUEUE_PATH 指定）
+#   REACTION_FLUSH_MS        后台线程写库的间隔毫秒数（默认 200）
+#   REACTION_BATCH_SIZE      每个事务最多写入的操作数（默认 500）
+#   REACTION_MAX_ATTEMPTS    单独写入仍失败多少次后移入死信（默认 5）；数据库连接错误不计次数，按指数退避一直重试
+# 同一用户对同一帖子的多次切换在队列中合并为一个目标状态，写库时按目标状态插入或删除（可重复执行）。
+# 一批写入因数据错误失败时，记录这一批并在之后的轮次中减半批量，找出出错的操作；
+# 死信写入日志（logger reaction_queue），sqlite 模式下还保存在 dead_reactions 表中。
+# memory 模式下其他 worker 最多要等一个写库间隔才能看到新状态
+FLUSH_INTERVAL = config.env_int('REACTION_FLUSH_MS', 200) / 1000
+BATCH_SIZE = config.env_int('REACTION_BATCH_SIZE', 500)
+MAX_ATTEMPTS = config.env_int('REACTION_MAX_ATTEMPTS', 5)
+MAX_BACKOFF_SECONDS = 30
+# 失败日志中最多列出的操作数
+LOGGED_ENTRIES = 20
+
+queue_log = logging.getLogger('reaction_queue')
+
+KINDS = {Like: 'like', Complaint: 'complaint'}
+MODELS = {kind: model for model, kind in KINDS.items()}
+
+
+class MemoryStore:
+    """进程内的待写队列：键为 (kind, user_id, post_id)，值为 [目标状态, 数据库原状态, 序号]。"""
+
+    def __init__(self):
+        self._entries = {}
+        self._seq = 0
+        self._acked = 0  # 已写库并移出队列的条目数，用于判断查到的数据库状态是否可能已过时
+        self.dead = []
+        self._lock = threading.Lock()
+
+    def toggle(self, key, load_base):
+        base = None
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is None and base is not None and self._acked == acked:
+                    entry = self._entries[key] = [base, base, 0]
+                if entry is not None:
+                    self._seq += 1
+                    entry[0] = not entry[0]
+                    entry[2] = self._seq
+                    return entry[0]
+                acked = self._acked
+            # 查询数据库时不持有锁，其他键的切换不必等待；
+            # 期间有条目写库后移出队列（可能正是这个键）时，查到的状态可能已过时，重新查询
+            base = bool(load_base())
+
+    def take(self, limit):
+        with self._lock:
+            return [(key, desired, seq) for key, (desired, _, seq) in list(self._entries.items())[:limit]]
+
+    def ack(self, flushed):
+        with self._lock:
+            for key, desired, seq in flushed:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if entry[2] == seq:
+                    del self._entries[key]
+                    self._acked += 1
+                else:
+                    # 写库期间又有新的切换：数据库已是本次写入的状态，留待下次写入
+                    entry[1] = desired
+
+    def dead_letter(self, flushed):
+        """把无法写库的操作移出队列，保留在 dead 列表中（进程内，同时写入日志）。"""
+        with self._lock:
+            for key, desired, seq in flushed:
+                entry = self._entries.get(key)
+                if entry is not None and entry[2] == seq:
+                    del self._entries[key]
+                    self._acked += 1
+                    self.dead.append((key, desired, seq))
+
+    def viewer_state(self, user_id, post_ids):
+        post_ids = set(post_ids)
+        with self._lock:
+            return {
+                (kind, post_id): desired
+                for (kind, entry_user, post_id), (desired, _, _) in self._entries.items()
+                if entry_user == user_id and post_id in post_ids
+            }
+
+    def post_deltas(self, post_ids):
+        post_ids = set(post_ids)
+        deltas = {}
+        with self._lock:
+            for (kind, _, post_id), (desired, base, _) in self._entries.items():
+                if post_id in post_ids and desired != base:
+                    deltas[(kind, post_id)] = deltas.get((kind, post_id), 0) + (1 if desired else -1)
+        return deltas
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class SQLiteStore:
+    """本机 SQLite 文件中的待写队列，同一台机器上的 worker 共享，写库后才删除。"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pending_reactions ("
+                "kind TEXT NOT NULL, user_id INTEGER NOT NULL, post_id INTEGER NOT NULL, "
+                "desired INTEGER NOT NULL, base INTEGER NOT NULL, seq INTEGER NOT NULL, "
+                "PRIMARY KEY (kind, user_id, post_id))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_pending_reactions_post ON pending_reactions (post_id)")
+            # acked 为已移出队列的条目数，作用与 MemoryStore._acked 相同，但在所有 worker 之间共享
+            conn.execute("CREATE TABLE IF NOT EXISTS queue_state (acked INTEGER NOT NULL)")
+            conn.execute("INSERT INTO queue_state SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM queue_state)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS dead_reactions ("
+                "kind TEXT NOT NULL, user_id INTEGER NOT NULL, post_id INTEGER NOT NULL, "
+                "desired INTEGER NOT NULL, seq INTEGER NOT NULL, failed_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _pending(self, conn, key):
+        row = conn.execute(
+            "SELECT desired FROM pending_reactions WHERE kind = ? AND user_id = ? AND post_id = ?", key
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def _acked(self, conn):
+        return conn.execute("SELECT acked FROM queue_state").fetchone()[0]
+
+    def toggle(self, key, load_base):
+        conn = self._connect()
+        while True:
+            # 查询主库时不持有队列文件的写锁，主库慢时其他切换和写库不必等待
+            base = acked = None
+            if self._pending(conn, key) is None:
+                acked = self._acked(conn)
+                base = bool(load_base())
+            # IMMEDIATE 事务保证多个 worker 对同一键的读改写不会交错
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                desired = self._pending(conn, key)
+                if desired is not None:
+                    desired = not desired
+                    conn.execute(
+                        "UPDATE pending_reactions SET desired = ?, "
+                        "seq = (SELECT MAX(seq) + 1 FROM pending_reactions) "
+                        "WHERE kind = ? AND user_id = ? AND post_id = ?",
+                        (desired, *key),
+                    )
+                elif base is not None and self._acked(conn) == acked:
+                    desired = not base
+                    conn.execute(
+                        "INSERT INTO pending_reactions VALUES (?, ?, ?, ?, ?, "
+                        "(SELECT COALESCE(MAX(seq), 0) + 1 FROM pending_reactions))",
+                        (*key, desired, base),
+                    )
+                else:
+                    # 查询主库期间有条目写库后移出队列（可能正是这个键），查到的状态可能已过时，重新查询
+                    conn.execute('ROLLBACK')
+                    continue
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            return desired
+
+    def take(self, limit):
+        rows = self._connect().execute(
+            "SELECT kind, user_id, post_id, desired, seq FROM pending_reactions ORDER BY seq LIMIT ?", (limit,)
+        ).fetchall()
+        return [((kind, user_id, post_id), bool(desired), seq) for kind, user_id, post_id, desired, seq in rows]
+
+    def ack(self, flushed):
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            removed = 0
+            for key, desired, seq in flushed:
+                removed += conn.execute(
+                    "DELETE FROM pending_reactions WHERE kind = ? AND user_id = ? AND post_id = ? AND seq = ?",
+                    (*key, seq),
+                ).rowcount
+                conn.execute(
+                    "UPDATE pending_reactions SET base = ? WHERE kind = ? AND user_id = ? AND post_id = ?",
+                    (desired, *key),
+                )
+            if removed:
+                conn.execute("UPDATE queue_state SET acked = acked + ?", (removed,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def dead_letter(self, flushed):
+        """把无法写库的操作移入 dead_reactions 表。"""
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            removed = 0
+            for (kind, user_id, post_id), desired, seq in flushed:
+                deleted = conn.execute(
+                    "DELETE FROM pending_reactions WHERE kind = ? AND user_id = ? AND post_id = ? AND seq = ?",
+                    (kind, user_id, post_id, seq),
+                ).rowcount
+                if deleted:
+                    conn.execute("INSERT INTO dead_reactions VALUES (?, ?, ?, ?, ?, ?)",
+                                 (kind, user_id, post_id, desired, seq, time.time()))
+                removed += deleted
+            if removed:
+                conn.execute("UPDATE queue_state SET acked = acked + ?", (removed,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _in(self, post_ids):
+        post_ids = list(post_ids)
+        return ','.join('?' * len(post_ids)), post_ids
+
+    def viewer_state(self, user_id, post_ids):
+        if not post_ids:
+            return {}
+        marks, params = self._in(post_ids)
+        rows = self._connect().execute(
+            f"SELECT kind, post_id, desired FROM pending_reactions WHERE user_id = ? AND post_id IN ({marks})",
+            (user_id, *params),
+        )
+        return {(kind, post_id): bool(desired) for kind, post_id, desired in rows}
+
+    def post_deltas(self, post_ids):
+        if not post_ids:
+            return {}
+        marks, params = self._in(post_ids)
+        rows = self._connect().execute(
+            f"SELECT kind, post_id, SUM(desired - base) FROM pending_reactions "
+            f"WHERE post_id IN ({marks}) AND desired != base GROUP BY kind, post_id",
+            params,
+        )
+        return {(kind, post_id): delta for kind, post_id, delta in rows}
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM pending_reactions").fetchone()[0]
+
+
+def store_from_env():
+    if config.env_str('REACTION_WRITE_MODE', 'sync') != 'queue':
+        return None
+    if config.env_str('REACTION_QUEUE', 'memory') == 'sqlite':
+        path = config.env_str('REACTION_QUEUE_PATH', os.path.join(tempfile.gettempdir(), 'reaction_queue.sqlite3'))
+        return SQLiteStore(path)
+    return MemoryStore()
+
+
+# 为 None 时表示同步写入，以下函数都不做任何事
+store = store_from_env()
+_app = None
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def enabled():
+    return store is not None
+
+
+def init_app(app):
+    """记录 app 以便后台线程进入 app context；线程在第一次切换时才启动，避免 gunicorn fork 前启动线程。"""
+    global _app
+    _app = app
+
+
+def _has_reaction(model, post_id, user_id):
+    return db.session.execute(
+        select(exists().where(model.post_id == post_id, model.user_id == user_id))
+    ).scalar()
+
+
+def toggle(model, post_id, user_id):
+    """把切换记入队列，返回与同步写入相同含义的计数变化（+1 或 -1）。"""
+    _ensure_flusher()
+    desired = store.toggle(
+        (KINDS[model], user_id, post_id),
+        lambda: _has_reaction(model, post_id, user_id),
+    )
+    return 1 if desired else -1
+
+
+def apply_viewer_state(user_id, post_ids, liked, complained):
+    """用当前用户尚未写库的切换修正 (点赞集合, 投诉集合)。"""
+    if store is None:
+        return liked, complained
+    for (kind, post_id), desired in store.viewer_state(user_id, post_ids).items():
+        target = liked if kind == 'like' else complained
+        if desired:
+            target.add(post_id)
+        else:
+            target.discard(post_id)
+    return liked, complained
+
+
+def pending_delta(model, post_id):
+    """该帖子尚未写库的计数变化。"""
+    if store is None:
+        return 0
+    return store.post_deltas([post_id]).get((KINDS[model], post_id), 0)
+
+
+def apply_to_posts(user_id, posts):
+    """修正 FeedPost 列表的点赞/投诉状态和计数。"""
+    if store is None or not posts:
+        return
+    post_ids = [post.id for post in posts]
+    states = store.viewer_state(user_id, post_ids)
+    deltas = store.post_deltas(post_ids)
+    for post in posts:
+        post.is_liked = states.get(('like', post.id), post.is_liked)
+        post.is_complained = states.get(('complaint', post.id), post.is_complained)
+        post.like_count += deltas.get(('like', post.id), 0)
+        post.complaint_count += deltas.get(('complaint', post.id), 0)
+
+
+# 当前每批最多取出的操作数：一批因数据错误失败后减半，队列清空或出错的操作移入死信后恢复
+_batch_limit = BATCH_SIZE
+# (键, seq) -> 单独写入失败的次数
+_failures = {}
+
+
+def _is_transient(error):
+    """数据库连接或锁等暂时性错误：整批等待后重试，不拆分也不计入死信次数。"""
+    return isinstance(error, (OperationalError, InterfaceError, sqlite3.OperationalError))
+
+
+def _describe(entries):
+    shown = ', '.join(f'{kind}:{user_id}:{post_id}={int(desired)}'
+                      for (kind, user_id, post_id), desired, _ in entries[:LOGGED_ENTRIES])
+    more = len(entries) - LOGGED_ENTRIES
+    return shown + (f' 等另外 {more} 条' if more > 0 else '')
+
+
+def _write(entries):
+    """在一个事务内按目标状态逐条插入或删除，再按帖子合并调整计数和排行榜；帖子或用户已删除的操作直接丢弃。"""
+    post_ids = {key[2] for key, _, _ in entries}
+    user_ids = {key[1] for key, _, _ in entries}
+    live_posts = set(db.session.scalars(select(Post.id).where(Post.id.in_(post_ids))))
+    live_users = set(db.session.scalars(select(User.id).where(User.id.in_(user_ids))))
+
+    deltas = {}
+    for (kind, user_id, post_id), desired, _ in entries:
+        if post_id not in live_posts or user_id not in live_users:
+            continue
+        delta = reactions.set_state(MODELS[kind], post_id, user_id, desired)
+        if delta:
+            likes, complaints = deltas.get(post_id, (0, 0))
+            deltas[post_id] = (likes + delta, complaints) if kind == 'like' else (likes, complaints + delta)
+
+    for post_id, (likes, complaints) in deltas.items():
+        leaderboard.apply_reaction(post_id, likes=likes, complaints=complaints)
+        counters.bump(post_id, like_count=likes, complaint_count=complaints)
+    if deltas:
+        fragment_cache.bump(fragment_cache.FORUM, fragment_cache.LEADERBOARD)
+        forum_events.counts_changed(deltas.keys())
+    db.session.commit()
+
+
+def flush(limit=None):
+    """把一批待写操作写入数据库，需在 app context 中调用，返回写入的操作数。
+
+    暂时性错误原样抛出，由调用方退避后重试；其他错误记录这一批后返回 0，下一轮减半批量重试，
+    单独一条连续失败 MAX_ATTEMPTS 次后移入死信。
+    """
+    global _batch_limit
+    if store is None:
+        return 0
+    limit = limit or _batch_limit
+    entries = store.take(limit)
+    if not entries:
+        return 0
+    try:
+        _write(entries)
+    except Exception as error:
+        db.session.rollback()
+        if _is_transient(error):
+            raise
+        if len(entries) > 1:
+            _batch_limit = max(1, len(entries) // 2)
+            queue_log.warning('Writing %d queued reactions failed (%s), retrying in batches of %d: %s',
+                              len(entries), error, _batch_limit, _describe(entries))
+            return 0
+        (key, _, seq), = entries
+        attempts = _failures[key, seq] = _failures.get((key, seq), 0) + 1
+        if attempts < MAX_ATTEMPTS:
+            queue_log.warning('Writing queued reaction failed (%d/%d): %s: %s',
+                              attempts, MAX_ATTEMPTS, _describe(entries), error)
+            return 0
+        store.dead_letter(entries)
+        del _failures[key, seq]
+        _batch_limit = BATCH_SIZE
+        queue_log.error('Dropping queued reaction after %d failed attempts: %s: %s',
+                        attempts, _describe(entries), error)
+        return 0
+    store.ack(entries)
+    if len(entries) < limit:
+        # 队列已清空，之前失败的操作都已写入
+        _batch_limit = BATCH_SIZE
+        _failures.clear()
+    return len(entries)
+
+
+def flush_all():
+    written = 0
+    while True:
+        limit = _batch_limit
+        count = flush(limit)
+        written += count
+        if count < limit:
+            return written
+
+
+def _run():
+    failures = 0
+    while True:
+        # 连续出现暂时性错误时按指数退避，最长 MAX_BACKOFF_SECONDS 秒
+        time.sleep(min(FLUSH_INTERVAL * 2 ** failures, MAX_BACKOFF_SECONDS))
+        try:
+            with _app.app_context():
+                flush_all()
+            failures = 0
+        except Exception:
+            failures = min(failures + 1, 16)
+            queue_log.exception("Flushing queued reactions failed, will retry")
+
+
+def _flush_at_exit():
+    try:
+        with _app.app_context():
+            flush_all()
+    except Exception:
+        queue_log.exception("Flushing queued reactions at exit failed")
+
+
+def _ensure_flusher():
+    global _flusher
+    if _flusher is not None and _flusher.is_alive():
+        return
+    with _flusher_lock:
+        if _flusher is None or not _flusher.is_alive():
+            if _flusher is None:
+                atexit.register(_flush_at_exit)
+            _flusher = threading.Thread(target=_run, name='reaction-flusher', daemon=True)
+            _flusher.start()
@@ -0,0 +1,52 @@
+from sqlalchemy import delete, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from models import db
+
+
+def _insert_ignoring_duplicate(model, values):
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        module = postgresql if dialect == 'postgresql' else sqlite
+        stmt = (
+            module.insert(model)
+            .values(**values)
+            .on_conflict_do_nothing(index_elements=['post_id', 'user_id'])
+        )
+        return db.session.execute(stmt).rowcount
+
+    # 其他数据库：依赖唯一索引，冲突时回滚到保存点
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(model).values(**values))
+        return 1
+    except IntegrityError:
+        return 0
+
+
+def toggle(model, post_id, user_id):
+    """切换点赞或投诉（model 为 Like / Complaint），返回计数变化：-1、+1 或 0。
+
+    依赖 (post_id, user_id) 唯一索引：先尝试删除，没有删到再插入，不需要先查询。
+    并发请求抢先插入时返回 0。
+    """
+    result = db.session.execute(
+        delete(model)
+        .where(model.post_id == post_id, model.user_id == user_id)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount:
+        return -1
+    return _insert_ignoring_duplicate(model, {'post_id': post_id, 'user_id': user_id})
+
+
+def set_state(model, post_id, user_id, active):
+    """把点赞或投诉设为指定状态（可重复执行），返回计数变化：-1、+1 或 0。"""
+    if active:
+        return _insert_ignoring_duplicate(model, {'post_id': post_id, 'user_id': user_id})
+    result = db.session.execute(
+        delete(model)
+        .where(model.post_id == post_id, model.user_id == user_id)
+        .execution_options(synchronize_session=False)
+    )
+    return -result.rowcount
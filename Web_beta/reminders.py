@@ -0,0 +1,156 @@
+import importlib
+import json
+import logging
+import time
+import urllib.request
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, func
+from models import db, User, Todo, REMINDER_PENDING
+import config
+
+# 待办到期提醒，由单独的 worker 进程（python worker.py）发送，均可通过环境变量调整：
+#   REMINDER_NOTIFIER      log（默认，写入 reminders 日志）、webhook，或 模块:工厂函数（返回带 send 方法的对象）
+#   REMINDER_WEBHOOK_URL   webhook 模式下 POST JSON 的地址
+#   REMINDER_LEAD_MINUTES  提前多少分钟提醒（默认 0）
+#   REMINDER_BATCH_SIZE    每次取出并发送的提醒数（默认 500）
+#   REMINDER_MAX_SLEEP     两次检查之间最长休眠秒数，新建的更早到期的待办最多延迟这么久（默认 30）
+# ix_todos_due_pending 部分索引只包含等待提醒的待办并按 due_at 排序，相当于放在数据库里的定时器堆：
+# 查最近的到期时间和取一批到期待办都只是索引范围扫描，与待办总数无关。
+# 先在事务中标记 reminded_at 再发送，多个 worker 不会重复发送；发送失败时撤销标记，等下次重试
+LEAD = timedelta(minutes=config.env_int('REMINDER_LEAD_MINUTES', 0))
+BATCH_SIZE = config.env_int('REMINDER_BATCH_SIZE', 500)
+MAX_SLEEP = config.env_int('REMINDER_MAX_SLEEP', 30)
+
+reminder_log = logging.getLogger('reminders')
+
+
+@dataclass
+class Reminder:
+    todo_id: int
+    user_id: int
+    username: str
+    task: str
+    due_at: datetime
+
+    def to_dict(self):
+        data = asdict(self)
+        data['due_at'] = self.due_at.isoformat()
+        return data
+
+
+class LogNotifier:
+    def send(self, reminders):
+        for reminder in reminders:
+            reminder_log.info(f"Todo {reminder.todo_id} due for {reminder.username}", extra=reminder.to_dict())
+
+
+class WebhookNotifier:
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, reminders):
+        body = json.dumps({'reminders': [reminder.to_dict() for reminder in reminders]}, ensure_ascii=False)
+        request = urllib.request.Request(
+            self.url, data=body.encode(), headers={'Content-Type': 'application/json'}, method='POST'
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+def notifier_from_env():
+    name = config.env_str('REMINDER_NOTIFIER', 'log')
+    if name == 'log':
+        return LogNotifier()
+    if name == 'webhook':
+        url = config.env_str('REMINDER_WEBHOOK_URL', '')
+        if not url:
+            raise RuntimeError('REMINDER_NOTIFIER=webhook 需要设置 REMINDER_WEBHOOK_URL')
+        return WebhookNotifier(url)
+    module_name, _, factory = name.partition(':')
+    if not factory:
+        raise RuntimeError(f"Unknown REMINDER_NOTIFIER={name!r}")
+    return getattr(importlib.import_module(module_name), factory)()
+
+
+def next_due():
+    """最早的待提醒截止时间，没有时返回 None。"""
+    return db.session.execute(select(func.min(Todo.due_at)).where(REMINDER_PENDING)).scalar()
+
+
+def due_batch(until, limit=BATCH_SIZE):
+    """截止时间不晚于 until 的待提醒待办，按截止时间排序。"""
+    rows = db.session.execute(
+        select(Todo.id, Todo.user_id, User.username, Todo.task, Todo.due_at)
+        .join(User, User.id == Todo.user_id)
+        .where(REMINDER_PENDING, Todo.due_at <= until)
+        .order_by(Todo.due_at, Todo.id)
+        .limit(limit)
+    )
+    return [Reminder(*row) for row in rows]
+
+
+def claim(todo_ids, now):
+    """标记为已提醒，返回本次成功标记的 id；已被其他 worker 标记、完成或改期的待办不会返回。"""
+    if not todo_ids:
+        return set()
+    # 显式保留 updated_at，标记提醒不应让客户端把待办当作已修改重新同步
+    result = db.session.execute(
+        update(Todo)
+        .where(Todo.id.in_(todo_ids), REMINDER_PENDING)
+        .values(reminded_at=now, updated_at=Todo.updated_at)
+        .returning(Todo.id)
+        .execution_options(synchronize_session=False)
+    )
+    return set(result.scalars())
+
+
+def _unclaim(todo_ids, now):
+    db.session.execute(
+        update(Todo)
+        .where(Todo.id.in_(todo_ids), Todo.reminded_at == now)
+        .values(reminded_at=None, updated_at=Todo.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def run_once(notifier, limit=BATCH_SIZE):
+    """发送一批已到期的提醒，需在 app context 中调用，返回发送的条数；发送失败时撤销标记并抛出异常。"""
+    now = datetime.utcnow()
+    reminders = due_batch(now + LEAD, limit)
+    claimed = claim([reminder.todo_id for reminder in reminders], now)
+    db.session.commit()
+    reminders = [reminder for reminder in reminders if reminder.todo_id in claimed]
+    if not reminders:
+        return 0
+    try:
+        notifier.send(reminders)
+    except Exception:
+        _unclaim([reminder.todo_id for reminder in reminders], now)
+        raise
+    return len(reminders)
+
+
+def run_forever(app, notifier=None):
+    """worker 主循环：发送到期提醒，然后休眠到下一个截止时间（最长 MAX_SLEEP 秒）。"""
+    notifier = notifier or notifier_from_env()
+    logging.info(f"Reminder worker started with {type(notifier).__name__}")
+    while True:
+        wait = MAX_SLEEP
+        try:
+            with app.app_context():
+                sent = run_once(notifier)
+                if sent:
+                    logging.info(f"Sent {sent} todo reminders")
+                if sent >= BATCH_SIZE:
+                    wait = 0
+                else:
+                    due = next_due()
+                    if due is not None:
+                        # 至少休眠 1 秒，到期却取不出来的行（如用户已删除）不会让循环空转
+                        wait = max((due - LEAD - datetime.utcnow()).total_seconds(), 1)
+        except Exception:
+            logging.exception("Sending todo reminders failed, will retry")
+        time.sleep(min(max(wait, 0), MAX_SLEEP))
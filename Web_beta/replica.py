@@ -0,0 +1,82 @@
+import threading
+import time
+from functools import wraps
+from flask import g, session, has_request_context
+from flask_sqlalchemy.session import Session
+import config
+
+# 读写分离，均可通过环境变量调整：
+#   DATABASE_READ_URL         只读副本的数据库 URL；不设置时所有语句都走 DATABASE_URL
+#   READ_AFTER_WRITE_SECONDS  用户写入后多少秒内，他的读页面仍然走主库（默认 5），应大于副本的复制延迟
+# 只有用 read_only 装饰的视图读副本，其余请求、后台线程和命令行都只用主库。
+# 写入后的粘滞时间记在会话 cookie 中（浏览器重定向回列表页时生效），同时按用户 ID 记在本进程内
+# （供不带 cookie 的 API 客户端使用，只在同一个 worker 内有效）
+READ_URL = config.database_url('DATABASE_READ_URL')
+STICKY_SECONDS = config.env_int('READ_AFTER_WRITE_SECONDS', 5)
+BIND_KEY = 'replica'
+SESSION_KEY = 'read_primary_until'
+
+_recent_writers = {}
+_lock = threading.Lock()
+
+
+class RoutingSession(Session):
+    """read_only 视图中的查询发往副本；写语句（包括 flush）始终发往主库，并记录本请求发生过写入。"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context():
+            if self._flushing or getattr(clause, 'is_dml', False):
+                g.db_wrote = True
+                # 只读视图里出现写操作时，本请求之后的语句也改回主库
+                g.read_replica = False
+            elif g.get('read_replica'):
+                return self._db.engines[BIND_KEY]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def init_app(app):
+    """配置了 DATABASE_READ_URL 时注册副本引擎，需在 db.init_app 之前调用。"""
+    if not READ_URL:
+        return
+    app.config['SQLALCHEMY_BINDS'] = {BIND_KEY: {'url': READ_URL, **config.engine_options(READ_URL)}}
+    app.after_request(_remember_write)
+
+
+def _current_user_id():
+    user = g.get('user') or g.get('api_user')
+    return getattr(user, 'id', None)
+
+
+def _remember_write(response):
+    if not g.get('db_wrote'):
+        return response
+    until = time.time() + STICKY_SECONDS
+    session[SESSION_KEY] = until
+    user_id = _current_user_id()
+    if user_id is not None:
+        with _lock:
+            _recent_writers[user_id] = until
+            if len(_recent_writers) > 10000:
+                now = time.time()
+                for stale in [key for key, value in _recent_writers.items() if value <= now]:
+                    del _recent_writers[stale]
+    return response
+
+
+def _recently_wrote():
+    now = time.time()
+    if session.get(SESSION_KEY, 0) > now:
+        return True
+    user_id = _current_user_id()
+    with _lock:
+        return _recent_writers.get(user_id, 0) > now
+
+
+def read_only(f):
+    """视图只读且能容忍复制延迟时使用，放在 login_required / token_required 之后（里层）。"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if READ_URL and not _recently_wrote():
+            g.read_replica = True
+        return f(*args, **kwargs)
+    return decorated_function
@@ -0,0 +1,233 @@
+import logging
+from sqlalchemy import inspect, text, Table, Column, Integer, MetaData, select, delete, func, bindparam
+from sqlalchemy.schema import CreateColumn
+from datetime import datetime
+from models import db, Like, Complaint, Todo, PRIORITY_RANKS, DEFAULT_PRIORITY
+import counters
+import leaderboard
+import cascade
+import search
+import todo_store
+
+# 记录已应用的迁移版本；不放进 db.metadata，避免 db.create_all 时被误认为业务表
+version_metadata = MetaData()
+schema_version = Table(
+    'schema_version', version_metadata,
+    Column('version', Integer, nullable=False),
+)
+
+
+def add_missing_columns(table_name, column_names):
+    """为已存在的表补齐指定的模型列，返回新增的列名。
+
+    每个迁移只传入自己新增的列；新增列必须可为空或带有 server_default。
+    """
+    conn = db.session.connection()
+    table = db.metadata.tables[table_name]
+    existing = {column['name'] for column in inspect(conn).get_columns(table_name)}
+    added = []
+    for name in column_names:
+        if name in existing:
+            continue
+        ddl = CreateColumn(table.columns[name]).compile(dialect=conn.dialect)
+        logging.info(f"Adding column {table_name}.{name}")
+        conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {ddl}"))
+        added.append(name)
+    return added
+
+
+def create_missing_indexes(table_name, index_names):
+    """创建指定的、模型中声明但数据库中还不存在的索引，返回新建的索引名。
+
+    每个迁移只传入自己新增的索引：旧数据库重放迁移时，后续迁移才添加的列在这一步还不存在。
+    """
+    conn = db.session.connection()
+    existing = {index['name'] for index in inspect(conn).get_indexes(table_name)}
+    declared = {index.name: index for index in db.metadata.tables[table_name].indexes}
+    created = []
+    for name in index_names:
+        if name in existing:
+            continue
+        logging.info(f"Creating index {name}")
+        declared[name].create(conn)
+        created.append(name)
+    return created
+
+
+def _remove_duplicate_reactions(model):
+    # 建唯一索引前，每个 (post_id, user_id) 只保留最早的一条
+    keep = select(func.min(model.id)).group_by(model.post_id, model.user_id)
+    result = db.session.execute(
+        delete(model)
+        .where(model.id.not_in(keep))
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+def _post_counters():
+    if add_missing_columns('posts', ['like_count', 'complaint_count', 'comment_count']):
+        # 新增的计数列默认为 0，需要从明细表回填
+        counters.reconcile()
+
+
+def _hot_path_indexes():
+    removed = _remove_duplicate_reactions(Like) + _remove_duplicate_reactions(Complaint)
+    if removed:
+        logging.warning(f"Removed {removed} duplicate likes/complaints")
+        counters.reconcile()
+        leaderboard.rebuild()
+    # 待办列表索引 ix_todos_user_order 依赖 priority_rank，由迁移 3 创建
+    for table_name, index_names in (
+        ('posts', ['ix_posts_created_at_id', 'ix_posts_author_id']),
+        ('comments', ['ix_comments_post_created', 'ix_comments_author_id']),
+        ('likes', ['uq_likes_post_user', 'ix_likes_user_id']),
+        ('complaints', ['uq_complaints_post_user', 'ix_complaints_user_id']),
+        ('user_scores', ['ix_user_scores_rank']),
+    ):
+        create_missing_indexes(table_name, index_names)
+
+
+def _todo_priority_rank():
+    conn = db.session.connection()
+    columns = {column['name'] for column in inspect(conn).get_columns('todos')}
+    add_missing_columns('todos', ['priority_rank'])
+    if 'priority' in columns:
+        # 把旧的字符串优先级转换为整数排序值，然后删除旧列及依赖它的旧索引
+        cases = ' '.join(f"WHEN '{name}' THEN {rank}" for name, rank in PRIORITY_RANKS.items())
+        default = PRIORITY_RANKS[DEFAULT_PRIORITY]
+        conn.execute(text(f"UPDATE todos SET priority_rank = CASE priority {cases} ELSE {default} END"))
+        if any(index['name'] == 'ix_todos_user_order' for index in inspect(conn).get_indexes('todos')):
+            conn.execute(text("DROP INDEX ix_todos_user_order"))
+        conn.execute(text("ALTER TABLE todos DROP COLUMN priority"))
+    create_missing_indexes('todos', ['ix_todos_user_order'])
+
+
+def _todo_sync():
+    add_missing_columns('todos', ['updated_at'])
+    # 不依赖本次是否新增了列：中断后重跑或列已由旧版本添加时也要回填
+    db.session.execute(text("UPDATE todos SET updated_at = created_at WHERE updated_at IS NULL"))
+    # 增量同步的索引改由迁移 8 按 change_seq 建立
+
+
+def _drop_index_if_exists(table_name, index_name):
+    conn = db.session.connection()
+    if any(index['name'] == index_name for index in inspect(conn).get_indexes(table_name)):
+        logging.info(f"Dropping index {index_name}")
+        conn.execute(text(f"DROP INDEX {index_name}"))
+
+
+def _todo_change_seq():
+    # 已有的待办和墓碑 change_seq 为 0；旧客户端的时间戳令牌按 0 处理，下次同步会收到全部数据
+    add_missing_columns('users', ['todo_version'])
+    add_missing_columns('todos', ['change_seq'])
+    add_missing_columns('todo_tombstones', ['change_seq'])
+    _drop_index_if_exists('todos', 'ix_todos_user_updated')
+    _drop_index_if_exists('todo_tombstones', 'ix_todo_tombstones_user_deleted')
+    create_missing_indexes('todos', ['ix_todos_user_change'])
+    create_missing_indexes('todo_tombstones', ['ix_todo_tombstones_user_change'])
+
+
+def _cascade_foreign_keys():
+    removed = cascade.delete_orphans()
+    if removed:
+        logging.warning(f"Removed {removed} orphaned rows")
+        counters.reconcile()
+        leaderboard.rebuild()
+    conn = db.session.connection()
+    # SQLite 不支持修改已有外键，删除逻辑由 cascade 模块显式完成
+    if conn.dialect.name != 'postgresql':
+        return
+    inspector = inspect(conn)
+    for table in db.metadata.sorted_tables:
+        for constraint in table.foreign_key_constraints:
+            if constraint.ondelete != 'CASCADE':
+                continue
+            columns = [column.name for column in constraint.columns]
+            for existing in inspector.get_foreign_keys(table.name):
+                if existing['constrained_columns'] != columns:
+                    continue
+                if existing.get('options', {}).get('ondelete', '').upper() == 'CASCADE':
+                    continue
+                referred = constraint.referred_table.name
+                logging.info(f"Recreating {table.name}.{existing['name']} with ON DELETE CASCADE")
+                conn.execute(text(f"ALTER TABLE {table.name} DROP CONSTRAINT {existing['name']}"))
+                conn.execute(text(
+                    f"ALTER TABLE {table.name} ADD CONSTRAINT {existing['name']} "
+                    f"FOREIGN KEY ({', '.join(columns)}) "
+                    f"REFERENCES {referred} ({', '.join(existing['referred_columns'])}) ON DELETE CASCADE"
+                ))
+
+
+def _search_index():
+    if db.session.connection().dialect.name == 'sqlite':
+        search.create_sqlite_index()
+    else:
+        create_missing_indexes('search_documents', ['ix_search_documents_tsv'])
+    count = search.rebuild()
+    logging.info(f"Indexed {count} posts and comments for search")
+
+
+def _todo_due_at(batch_size=5000):
+    add_missing_columns('todos', ['due_at', 'reminded_at'])
+    # 分批解析已有的日期和时间字符串；已经过期的待办视为已提醒，上线后不会集中补发历史提醒
+    now = datetime.utcnow()
+    todos = Todo.__table__
+    stmt = (
+        select(todos.c.id, todos.c.date, todos.c.time)
+        .where(todos.c.due_at.is_(None), todos.c.date.isnot(None), todos.c.date != '')
+        .execution_options(yield_per=batch_size)
+    )
+    # 显式保留 updated_at，回填不应让客户端把所有待办当作已修改重新同步
+    fill = (
+        todos.update()
+        .where(todos.c.id == bindparam('todo_id'))
+        .values(due_at=bindparam('due'), reminded_at=bindparam('reminded'), updated_at=todos.c.updated_at)
+    )
+    parsed = 0
+    for rows in db.session.execute(stmt).partitions():
+        values = []
+        for todo_id, date, time in rows:
+            due_at = todo_store.due_at_for(date, time)
+            if due_at is not None:
+                values.append({'todo_id': todo_id, 'due': due_at, 'reminded': now if due_at < now else None})
+        if values:
+            db.session.execute(fill, values)
+            parsed += len(values)
+    logging.info(f"Parsed due times for {parsed} todos")
+    create_missing_indexes('todos', ['ix_todos_due_pending'])
+
+
+# (版本号, 说明, 迁移函数)；迁移函数需可重复执行，新建的数据库也会依次跑一遍
+MIGRATIONS = [
+    (1, 'post like/complaint/comment counters', _post_counters),
+    (2, 'hot path indexes and unique likes/complaints', _hot_path_indexes),
+    (3, 'integer todo priority rank', _todo_priority_rank),
+    (4, 'todo updated_at and tombstones for delta sync', _todo_sync),
+    (5, 'remove orphaned rows and cascade foreign keys', _cascade_foreign_keys),
+    (6, 'full-text search index over posts and comments', _search_index),
+    (7, 'indexed todo due_at for reminders', _todo_due_at),
+    (8, 'commit-ordered change counter for todo delta sync', _todo_change_seq),
+]
+
+
+def current_version():
+    conn = db.session.connection()
+    if not inspect(conn).has_table('schema_version'):
+        return 0
+    return conn.execute(select(func.max(schema_version.c.version))).scalar() or 0
+
+
+def upgrade_schema():
+    """按顺序应用尚未执行的迁移，每个迁移单独提交，返回本次应用的版本号。"""
+    version_metadata.create_all(db.engine)
+    applied = []
+    for version, description, migrate in MIGRATIONS:
+        if version <= current_version():
+            continue
+        logging.info(f"Applying schema migration {version}: {description}")
+        migrate()
+        db.session.execute(schema_version.insert().values(version=version))
+        db.session.commit()
+        applied.append(version)
+    return applied
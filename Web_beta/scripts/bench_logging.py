@@ -0,0 +1,112 @@
+"""日志配置吞吐量对比：分别在旧配置（basicConfig DEBUG + 同步写 stdout，SQLAlchemy 打印每条 SQL）
+和新配置（logging_config：INFO + 队列 + 后台线程写 JSON）下，用 test client 反复请求几个常用路由，
+比较每秒请求数。stdout 重定向到临时文件，写日志的开销真实计入。
+
+    python scripts/bench_logging.py --requests 2000 --threads 4
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PATHS = ['/forum', '/todos', '/group-leader', '/api/posts', '/no-such-page']
+
+
+def legacy_logging():
+    # 与改动前 app.py 中的配置相同
+    import logging
+    import logging_config
+    logging_config.shutdown()
+    for name in logging_config.DEFAULT_LEVELS:
+        logging.getLogger(name).setLevel(logging.NOTSET)
+    logging.basicConfig(
+        level=logging.DEBUG,
+        format='%(asctime)s %(levelname)s: %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)],
+        force=True,
+    )
+
+
+def run_worker(args):
+    """在子进程中执行：建库、写入数据、按指定日志配置压测，结果写入 --result 文件。"""
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_logging.db')
+    import logging
+    from app import app, init_db
+    from models import User
+    from seed import seed
+
+    logging.getLogger().setLevel(logging.WARNING)
+    init_db()
+    with app.app_context():
+        seed(users=20, posts=500, todos_per_user=50)
+        user = User.query.filter_by(login_type='birth').first()
+        user_id, username = user.id, user.username
+
+    if args.mode == 'legacy':
+        legacy_logging()
+    else:
+        import logging_config
+        logging_config.configure()
+
+    def worker(count):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = user_id
+            sess['username'] = username
+        for i in range(count):
+            client.get(PATHS[i % len(PATHS)]).close()
+
+    per_thread = args.requests // args.threads
+    worker(len(PATHS))  # 预热
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        list(pool.map(worker, [per_thread] * args.threads))
+    elapsed = time.perf_counter() - started
+
+    import logging_config
+    logging_config.shutdown()
+    sys.stdout.flush()
+    with open(args.result, 'w') as f:
+        json.dump({'requests': per_thread * args.threads, 'seconds': elapsed}, f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--mode', choices=['legacy', 'new'], help=argparse.SUPPRESS)
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_worker(args)
+        return
+
+    workdir = tempfile.mkdtemp()
+    print(f"{'mode':<8}{'req/s':>10}{'log MB':>10}")
+    for mode in ('legacy', 'new'):
+        result_path = os.path.join(workdir, f'{mode}.json')
+        log_path = os.path.join(workdir, f'{mode}.log')
+        # 每种配置单独起进程，避免全局日志配置互相影响
+        env = dict(os.environ, LOG_FORMAT='json', LOG_LEVEL='INFO')
+        with open(log_path, 'w') as log:
+            subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--mode', mode, '--result', result_path,
+                 '--requests', str(args.requests), '--threads', str(args.threads)],
+                stdout=log, stderr=subprocess.STDOUT, env=env, check=True,
+            )
+        with open(result_path) as f:
+            result = json.load(f)
+        size = os.path.getsize(log_path) / 1024 / 1024
+        print(f"{mode:<8}{result['requests'] / result['seconds']:>10.0f}{size:>10.1f}")
+    print(f"logs kept in {workdir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""待办提醒调度的查询开销（默认 20 个用户 × 10000 条待办，约一半带截止时间）：
+
+- scan: 旧做法，读出所有未完成待办的日期和时间字符串，在 Python 里逐条解析找出一小时内到期的
+- next_due / due_batch: 提醒 worker 每次循环执行的两条查询，走 ix_todos_due_pending 部分索引
+- run_once: 标记并“发送”（空通知器）已过期的积压提醒，统计每秒处理条数
+
+    python scripts/bench_reminders.py --users 20 --todos 10000 --runs 50
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class NullNotifier:
+    def __init__(self):
+        self.sent = 0
+
+    def send(self, reminders):
+        self.sent += len(reminders)
+
+
+def timed(fn, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='默认使用临时 SQLite 文件')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--todos', type=int, default=10000, help='每个用户的待办数')
+    parser.add_argument('--runs', type=int, default=50)
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_reminders.db')
+
+    import logging
+    from sqlalchemy import select, func
+    from app import app, init_db
+    from models import db, Todo, REMINDER_PENDING
+    from seed import seed
+    import reminders
+    import todo_store
+
+    init_db()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with app.app_context():
+        seed(users=args.users, posts=0, todos_per_user=args.todos)
+        open_count = db.session.execute(select(func.count()).where(Todo.completed.is_(False))).scalar()
+        pending = db.session.execute(select(func.count()).where(REMINDER_PENDING)).scalar()
+        print(f'{open_count} open todos, {pending} waiting for a reminder')
+
+        now = datetime.utcnow()
+        until = now + timedelta(hours=1)
+
+        def scan():
+            rows = db.session.execute(select(Todo.id, Todo.date, Todo.time).where(Todo.completed.is_(False)))
+            return [todo_id for todo_id, date, time_ in rows
+                    if (due := todo_store.due_at_for(date, time_)) is not None and now <= due <= until]
+
+        queries = {
+            'scan': (scan, None),
+            'next_due': (reminders.next_due, select(func.min(Todo.due_at)).where(REMINDER_PENDING)),
+            'due_batch': (
+                lambda: reminders.due_batch(until),
+                select(Todo.id).where(REMINDER_PENDING, Todo.due_at <= until)
+                .order_by(Todo.due_at, Todo.id).limit(reminders.BATCH_SIZE),
+            ),
+        }
+        for name, (fn, stmt) in queries.items():
+            runs = max(args.runs // 10, 3) if name == 'scan' else args.runs
+            plan = ''
+            if stmt is not None and db.engine.dialect.name == 'sqlite':
+                compiled = stmt.compile(db.engine, compile_kwargs={'literal_binds': True})
+                plan = '; '.join(row[-1] for row in db.session.execute(db.text(f'EXPLAIN QUERY PLAN {compiled}')))
+            print(f'{name:10} p50={timed(fn, runs):8.2f}ms  {plan}')
+
+        notifier = NullNotifier()
+        started = time.perf_counter()
+        while reminders.run_once(notifier):
+            pass
+        elapsed = time.perf_counter() - started
+        print(f'run_once   sent {notifier.sent} overdue reminders in {elapsed:.2f}s '
+              f'({notifier.sent / elapsed:.0f}/s, batch {reminders.BATCH_SIZE})')
+        print(f'next_due after draining: {reminders.next_due()}')
+
+
+if __name__ == '__main__':
+    main()
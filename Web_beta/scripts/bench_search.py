@@ -0,0 +1,78 @@
+"""全文检索基准测试（默认 100000 个帖子）：
+
+- indexed: search.search()，SQLite 上走 FTS5、PostgreSQL 上走 GIN 索引，按相关度排序分页
+- scan: 对 posts.content / comments.content 做 LIKE '%关键词%' 扫描（没有索引时的做法）。
+  不排序，找到一页结果就停止，所以常见词很快、罕见词或无结果时要扫完整张表
+
+    python scripts/bench_search.py --posts 100000 --runs 30
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+QUERIES = ['数学作业', '期末考试 图书馆', '篮球', 'python', '化学方程式 评论', '不存在的词语']
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='默认使用临时 SQLite 文件')
+    parser.add_argument('--posts', type=int, default=100000)
+    parser.add_argument('--comments-per-post', type=int, default=1)
+    parser.add_argument('--runs', type=int, default=30)
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_search.db')
+
+    import logging
+    from sqlalchemy import select, union_all
+    from app import app, init_db
+    from models import db, Post, Comment
+    from seed import seed
+    import search
+
+    init_db()
+    logging.getLogger().setLevel(logging.WARNING)
+    with app.app_context():
+        started = time.perf_counter()
+        seed(users=50, posts=args.posts, comments_per_post=args.comments_per_post,
+             likes_per_post=0, complaints_per_post=0, todos_per_user=0)
+        print(f"seeded {args.posts} posts and built the index in {time.perf_counter() - started:.1f}s")
+
+        def indexed(query):
+            return search.search(query)[0]
+
+        def scan(query):
+            words = query.split()
+            stmt = union_all(
+                select(Post.id).where(*[Post.content.contains(word) for word in words]),
+                select(Comment.id).where(*[Comment.content.contains(word) for word in words]),
+            ).limit(search.PAGE_SIZE + 1)
+            return db.session.execute(stmt).all()
+
+        print(f"{'query':<18}{'method':<10}{'p50 ms':>10}{'p95 ms':>10}{'hits':>6}")
+        for query in QUERIES:
+            for name, fn in (('indexed', indexed), ('scan', scan)):
+                timings = []
+                for _ in range(args.runs):
+                    started = time.perf_counter()
+                    hits = fn(query)
+                    timings.append((time.perf_counter() - started) * 1000)
+                print(f"{query:<18}{name:<10}{statistics.median(timings):>10.2f}"
+                      f"{percentile(timings, 95):>10.2f}{len(hits):>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""对比待办列表的两种排序方式（每个用户默认 10000 条待办）：
+
+- legacy: ORDER BY completed, priority != 'urgent', priority != 'medium', created_at DESC
+  （旧的字符串表达式排序，数据库必须读出全部行再排序）
+- indexed: ORDER BY completed, priority_rank, created_at DESC（直接按 ix_todos_user_order 读取）
+
+    python scripts/bench_todos.py --todos 10000 --runs 50
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='默认使用临时 SQLite 文件')
+    parser.add_argument('--users', type=int, default=3)
+    parser.add_argument('--todos', type=int, default=10000, help='每个用户的待办数')
+    parser.add_argument('--runs', type=int, default=50)
+    parser.add_argument('--limit', type=int, default=50, help='只取前 N 条时的对比（分页场景）')
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_todos.db')
+
+    import logging
+    from sqlalchemy import select, case
+    from app import app, init_db
+    from models import db, Todo, User
+    from seed import seed
+    from todo_store import TODO_ORDER
+
+    init_db()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    # 用 CASE 还原旧的字符串优先级，模拟迁移前的排序表达式
+    legacy_priority = case(
+        (Todo.priority_rank == 0, 'urgent'),
+        (Todo.priority_rank == 1, 'medium'),
+        else_='low',
+    )
+    orders = {
+        'legacy': (Todo.completed, legacy_priority != 'urgent', legacy_priority != 'medium', Todo.created_at.desc()),
+        'indexed': TODO_ORDER,
+    }
+
+    with app.app_context():
+        usernames = seed(users=args.users, posts=0, todos_per_user=args.todos)
+        user_id = db.session.query(User.id).filter_by(username=usernames[0]).scalar()
+
+        for limit in (None, args.limit):
+            label = 'all rows' if limit is None else f'first {limit} rows'
+            print(f'--- {label} of {args.todos} todos ---')
+            for name, order in orders.items():
+                # 只取核心列，避免 ORM 实例化开销掩盖排序本身的差异
+                stmt = select(Todo.__table__).where(Todo.user_id == user_id).order_by(*order)
+                if limit:
+                    stmt = stmt.limit(limit)
+                timings = []
+                for _ in range(args.runs):
+                    started = time.perf_counter()
+                    db.session.execute(stmt).all()
+                    timings.append((time.perf_counter() - started) * 1000)
+                if db.engine.dialect.name == 'sqlite':
+                    compiled = stmt.compile(db.engine, compile_kwargs={'literal_binds': True})
+                    plan = db.session.execute(db.text(f'EXPLAIN QUERY PLAN {compiled}')).all()
+                    plan = '; '.join(row[-1] for row in plan)
+                else:
+                    plan = ''
+                print(f'{name:8} p50={statistics.median(timings):8.2f}ms  '
+                      f'min={min(timings):8.2f}ms  plan: {plan}')
+
+
+if __name__ == '__main__':
+    main()
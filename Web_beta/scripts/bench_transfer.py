@@ -0,0 +1,102 @@
+"""管理员导出/导入的开销：
+
+- export: 通过 /admin/export/todos 流式导出不同行数的待办，打印耗时和峰值内存（tracemalloc），
+  峰值内存应与行数无关；对比一次性读出全部 ORM 对象再序列化的做法
+- import: 对比逐个调用 /create-user（每个用户单独哈希、提交）与 /admin/import/users 批量导入的耗时
+
+    python scripts/bench_transfer.py --rows 10000 100000 --import-users 50
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def measure(fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = fn()
+    elapsed = (time.perf_counter() - started) * 1000
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size, elapsed, peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000], help='导出的待办行数')
+    parser.add_argument('--import-users', type=int, default=50)
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_transfer.db')
+    import logging
+    from sqlalchemy import delete
+    from app import app, init_db
+    from models import db, User, Todo
+    from seed import seed
+    from todo_store import todo_to_dict
+
+    init_db()
+    logging.getLogger().setLevel(logging.WARNING)
+    with app.app_context():
+        admin = User.query.filter_by(login_type='admin').first()
+        admin_session = {'user_id': admin.id, 'username': admin.username}
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess.update(admin_session)
+
+    def streamed():
+        response = client.get('/admin/export/todos')
+        size = sum(len(chunk) for chunk in response.response)
+        response.close()
+        return size
+
+    def buffered():
+        # 旧页面的做法：一次取出全部 ORM 对象，再整体序列化
+        with app.app_context():
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for todo in Todo.query.order_by(Todo.id).all():
+                writer.writerow(todo_to_dict(todo).values())
+            return len(buffer.getvalue().encode())
+
+    with app.app_context():
+        seed(users=10, posts=0, todos_per_user=max(args.rows) // 10)
+
+    print(f"{'rows':>8} {'method':<10}{'ms':>10}{'peak KB':>12}{'MB out':>10}")
+    # 先测最大行数，然后删掉多余的行依次测较小的行数
+    for rows in sorted(args.rows, reverse=True):
+        with app.app_context():
+            cutoff = db.session.query(Todo.id).order_by(Todo.id).offset(rows).limit(1).scalar()
+            if cutoff is not None:
+                db.session.execute(delete(Todo).where(Todo.id >= cutoff))
+                db.session.commit()
+        for name, fn in (('streamed', streamed), ('buffered', buffered)):
+            size, elapsed, peak = measure(fn)
+            print(f"{rows:>8} {name:<10}{elapsed:>10.0f}{peak:>12.0f}{size / 1024 / 1024:>10.1f}")
+
+    count = args.import_users
+    started = time.perf_counter()
+    for i in range(count):
+        client.post('/create-user', data={'username': f'single_{i}', 'password': 'pw', 'birthdate': '2010-01-01'})
+    single = time.perf_counter() - started
+
+    lines = ['username,password,birthdate'] + [f'bulk_{i},pw,2010-01-01' for i in range(count)]
+    started = time.perf_counter()
+    response = client.post('/admin/import/users?format=json',
+                           data={'file': (io.BytesIO('\n'.join(lines).encode()), 'users.csv')},
+                           content_type='multipart/form-data')
+    bulk = time.perf_counter() - started
+    report = response.get_json()
+    print(f"import {count} users: one by one {single:.2f}s, bulk {bulk:.2f}s "
+          f"(created {report['created']}, errors {report['error_count']})")
+
+
+if __name__ == '__main__':
+    main()
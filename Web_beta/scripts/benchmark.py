@@ -0,0 +1,345 @@
+"""可重复的全路由基准测试：写入测试数据后，用 Flask test client 依次请求 app.py 中的每个路由，
+统计每个路由的 p50/p95 延迟、SQL 语句数和峰值内存（tracemalloc），结果写入 JSON 文件。
+
+    python scripts/benchmark.py --users 200 --posts 5000 --skew 1.0 --output bench.json
+    python scripts/benchmark.py --output after.json --compare bench.json   # 与之前的结果对比
+
+默认使用临时 SQLite 文件；--database-url 可指向本地 PostgreSQL，请不要指向生产数据库。
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# (方法, 路径, 请求参数, 客户端, 准备函数名)
+#   路径和请求参数中的 {name} 在运行时替换为种子数据或准备函数的返回值
+#   客户端：admin / user 为已登录的 session，api 为带令牌的请求，anon 为未登录的新客户端
+#   准备函数在每次请求前执行（不计入耗时和语句数），为删除类路由准备新的目标
+ROUTES = [
+    ('GET', '/', None, 'user', None),
+    ('GET', '/login', None, 'anon', None),
+    ('POST', '/login?type=birth', {'data': {'username': '{username}', 'password': 'password', 'birthdate': '2000-01-01'}}, 'anon', 'reset_rate_limits'),
+    ('GET', '/logout', None, 'anon', None),
+    ('GET', '/static/styles.css', None, 'anon', None),
+    ('GET', '/todos', None, 'user', None),
+    ('POST', '/add-todo', {'data': {'task': 'bench', 'date': '', 'time': '', 'priority': 'urgent'}}, 'user', None),
+    ('GET', '/toggle-todo/{todo_id}', None, 'user', None),
+    ('GET', '/delete-todo/{new_todo_id}', None, 'user', 'new_todo'),
+    ('GET', '/forum', None, 'user', None),
+    ('GET', '/forum/search?q=数学作业', None, 'user', None),
+    ('POST', '/create-post', {'data': {'content': '基准测试帖子'}}, 'user', None),
+    ('POST', '/create-comment/{post_id}', {'data': {'content': '基准测试评论'}}, 'user', None),
+    ('GET', '/toggle-like/{post_id}', None, 'user', None),
+    ('GET', '/toggle-complaint/{post_id}', None, 'user', None),
+    ('GET', '/delete-post/{new_post_id}', None, 'admin', 'new_post'),
+    ('GET', '/group-leader', None, 'user', None),
+    ('GET', '/user-management', None, 'admin', None),
+    ('GET', '/admin/metrics', None, 'admin', None),
+    ('GET', '/admin/export/todos', None, 'admin', None),
+    ('POST', '/create-user', {'data': {'username': '{new_username}', 'password': 'password', 'birthdate': '2000-01-01'}}, 'admin', 'new_username'),
+    ('GET', '/delete-user/{new_user}', None, 'admin', 'new_user'),
+    ('GET', '/view-user-todos/{username}', None, 'admin', None),
+    ('POST', '/api/login', {'json': {'username': '{username}', 'password': 'password', 'birth_date': '2000-01-01'}}, 'anon', 'reset_rate_limits'),
+    ('GET', '/api/todos', None, 'api', None),
+    ('GET', '/api/todos?limit=50', None, 'api', None),
+    ('POST', '/api/todos', {'json': {'task': 'bench', 'priority': 'low'}}, 'api', None),
+    ('POST', '/api/todos/batch', {'json': {'operations': [{'op': 'create', 'task': 'bench'}, {'op': 'update', 'id': '{todo_id}', 'completed': True}]}}, 'api', None),
+    ('POST', '/api/todos/{todo_id}/toggle', None, 'user', None),
+    ('POST', '/api/todos/{new_todo_id}/delete', None, 'user', 'new_todo'),
+    ('GET', '/api/posts', None, 'user', None),
+    ('GET', '/api/posts/{post_id}/comments', None, 'user', None),
+    ('POST', '/api/posts/{post_id}/like', None, 'user', None),
+    ('POST', '/api/posts/{post_id}/complaint', None, 'user', None),
+    ('GET', '/api/search?q=期末考试', None, 'user', None),
+    # 会删除已完成的待办（包括 {todo_id}），放在最后
+    ('POST', '/complete-all-todos', None, 'user', None),
+    ('POST', '/delete-completed-todos', None, 'user', None),
+]
+
+# 不适合用请求-响应计时的端点
+SKIPPED = {
+    'forum_stream': 'SSE 长连接，见 scripts/sse_load_test.py',
+    'admin_import_users': '需要上传文件且每行都要哈希密码，见 scripts/bench_transfer.py',
+}
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def fill(value, values):
+    """把请求参数中的 {name} 占位符替换为实际值；整个字符串就是占位符时保留原类型。"""
+    if isinstance(value, str):
+        if value.startswith('{') and value.endswith('}') and value[1:-1] in values:
+            return values[value[1:-1]]
+        return value.format(**values)
+    if isinstance(value, dict):
+        return {key: fill(item, values) for key, item in value.items()}
+    if isinstance(value, list):
+        return [fill(item, values) for item in value]
+    return value
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, threshold):
+    """打印与之前结果的对比，返回出现退化的路由数。"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {route['name']: route for route in json.load(f)['routes']}
+    regressions = 0
+    print()
+    print(f"compared with {baseline_path}")
+    print(f"{'route':<48}{'p50 ms':>18}{'queries':>12}")
+    for route in results:
+        old = baseline.get(route['name'])
+        if old is None:
+            continue
+        # 亚毫秒级的波动不算退化
+        slower = route['p50_ms'] - old['p50_ms'] > max(old['p50_ms'] * threshold, 0.5)
+        more_queries = route['queries'] > old['queries']
+        flag = '  !' if slower or more_queries else ''
+        regressions += bool(flag)
+        print(f"{route['name']:<48}{old['p50_ms']:>8.2f} -> {route['p50_ms']:<7.2f}"
+              f"{old['queries']:>5} -> {route['queries']:<4}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='默认使用临时 SQLite 文件')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--posts', type=int, default=2000)
+    parser.add_argument('--comments-per-post', type=int, default=3)
+    parser.add_argument('--likes-per-post', type=int, default=5)
+    parser.add_argument('--complaints-per-post', type=int, default=1)
+    parser.add_argument('--todos-per-user', type=int, default=50)
+    parser.add_argument('--skew', type=float, default=1.0, help='Zipf 指数，0 为均匀分布')
+    parser.add_argument('--runs', type=int, default=20, help='每个路由计时的请求次数')
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--route', action='append', help='只运行路径包含该字符串的路由，可重复')
+    parser.add_argument('--no-fragment-cache', action='store_true', help='关闭论坛/排行榜片段缓存')
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--compare', help='之前的结果文件，打印 p50 和语句数的变化')
+    parser.add_argument('--threshold', type=float, default=0.2, help='p50 变慢超过该比例视为退化')
+    parser.add_argument('--strict', action='store_true', help='出现退化时以非零状态退出')
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+    if args.no_fragment_cache:
+        os.environ['FRAGMENT_CACHE'] = 'off'
+
+    import logging
+    from sqlalchemy import event, insert
+    from app import app, init_db
+    from models import db, User, Post, Todo, Comment, Like
+    from seed import seed
+    import api_auth
+    import leaderboard
+    import passwords
+
+    init_db()
+    logging.getLogger().setLevel(logging.WARNING)
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        started = time.perf_counter()
+        usernames = seed(
+            users=args.users, posts=args.posts, comments_per_post=args.comments_per_post,
+            likes_per_post=args.likes_per_post, complaints_per_post=args.complaints_per_post,
+            todos_per_user=args.todos_per_user, skew=args.skew,
+        )
+        seed_seconds = time.perf_counter() - started
+        # 以待办最多的用户作为登录用户，以评论最多的帖子作为操作目标，覆盖最重的情况
+        user = (
+            User.query.filter(User.username.in_(usernames))
+            .outerjoin(Todo).group_by(User.id).order_by(db.func.count(Todo.id).desc()).first()
+        )
+        admin = User.query.filter_by(login_type='admin').first()
+        post_id = db.session.query(Post.id).order_by(Post.comment_count.desc()).first()[0]
+        todo_id = db.session.query(Todo.id).filter_by(user_id=user.id).first()[0]
+        with app.test_request_context():
+            token = api_auth.issue_token(user)
+        values = {'username': user.username, 'user_id': user.id, 'post_id': post_id, 'todo_id': todo_id}
+        sessions = {'user': (user.id, user.username), 'admin': (admin.id, admin.username)}
+
+    counter = {'queries': 0}
+    with app.app_context():
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def count_query(conn, cursor, statement, parameters, context, executemany):
+            counter['queries'] += 1
+
+    clients = {}
+    for name, (session_user_id, session_username) in sessions.items():
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = session_user_id
+            sess['username'] = session_username
+        clients[name] = client
+
+    sequence = {'n': 0}
+
+    def next_suffix():
+        sequence['n'] += 1
+        return f"{os.getpid()}_{sequence['n']}"
+
+    # 准备函数：在 app context 中写入并提交，返回需要填入路径的值
+    def new_todo():
+        todo_id = db.session.execute(
+            insert(Todo).returning(Todo.id), [{'task': 'bench', 'user_id': user.id}]
+        ).scalar()
+        return {'new_todo_id': todo_id}
+
+    def new_post():
+        post = Post(content='待删除的帖子', author_id=user.id, comment_count=3, like_count=1)
+        db.session.add(post)
+        db.session.flush()
+        db.session.execute(insert(Comment), [
+            {'content': '评论', 'post_id': post.id, 'author_id': user.id} for _ in range(3)
+        ])
+        db.session.execute(insert(Like).values(post_id=post.id, user_id=admin.id))
+        leaderboard.apply_reaction(post.id, likes=1)
+        return {'new_post_id': post.id}
+
+    def new_username():
+        return {'new_username': f'bench_{next_suffix()}'}
+
+    def new_user():
+        created = User(username=f'bench_{next_suffix()}', password='x', login_type='birth', birthdate='2000-01-01')
+        db.session.add(created)
+        db.session.flush()
+        leaderboard.add_user(created)
+        db.session.execute(insert(Post), [{'content': '帖子', 'author_id': created.id} for _ in range(5)])
+        db.session.execute(insert(Todo), [{'task': '待办', 'user_id': created.id} for _ in range(20)])
+        return {'new_user': created.username}
+
+    def reset_rate_limits():
+        passwords.user_limiter.clear()
+        passwords.ip_limiter.clear()
+        return {}
+
+    setups = {
+        'new_todo': new_todo,
+        'new_post': new_post,
+        'new_username': new_username,
+        'new_user': new_user,
+        'reset_rate_limits': reset_rate_limits,
+    }
+
+    def run_once(method, path, body, client_name, setup):
+        request_values = dict(values)
+        if setup:
+            with app.app_context():
+                request_values.update(setups[setup]())
+                db.session.commit()
+        kwargs = fill(body or {}, request_values)
+        headers = {}
+        if client_name == 'api':
+            headers['Authorization'] = f'Bearer {token}'
+        client = clients.get(client_name) or app.test_client()
+        counter['queries'] = 0
+        started = time.perf_counter()
+        response = client.open(fill(path, request_values), method=method, headers=headers, **kwargs)
+        elapsed = (time.perf_counter() - started) * 1000
+        response.close()
+        return elapsed, counter['queries'], response.status_code
+
+    # 检查是否有路由没有被覆盖
+    adapter = app.url_map.bind('localhost')
+    covered = set()
+    for method, path, *_ in ROUTES:
+        endpoint, _ = adapter.match(fill(path, dict(values, new_todo_id=1, new_post_id=1, new_user='x')).split('?')[0], method=method)
+        covered.add(endpoint)
+    missing = sorted({rule.endpoint for rule in app.url_map.iter_rules()} - covered - set(SKIPPED))
+    if missing:
+        print(f"warning: routes not covered by the benchmark: {', '.join(missing)}")
+
+    results = []
+    print(f"seeded {args.users} users / {args.posts} posts in {seed_seconds:.1f}s (skew={args.skew})")
+    print(f"{'route':<48}{'status':>7}{'p50 ms':>9}{'p95 ms':>9}{'queries':>9}{'peak KB':>9}")
+    for method, path, body, client_name, setup in ROUTES:
+        name = f'{method} {path}'
+        if args.route and not any(part in path for part in args.route):
+            continue
+        for _ in range(args.warmup):
+            run_once(method, path, body, client_name, setup)
+        timings, queries, statuses = [], [], set()
+        for _ in range(args.runs):
+            elapsed, query_count, status = run_once(method, path, body, client_name, setup)
+            timings.append(elapsed)
+            queries.append(query_count)
+            statuses.add(status)
+
+        # 峰值内存单独测一次，避免 tracemalloc 的开销影响计时
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        run_once(method, path, body, client_name, setup)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        route = {
+            'name': name,
+            'method': method,
+            'path': path,
+            'status': sorted(statuses),
+            'runs': args.runs,
+            'p50_ms': round(statistics.median(timings), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'mean_ms': round(statistics.fmean(timings), 3),
+            'queries': int(statistics.median(queries)),
+            'peak_kb': round(peak / 1024, 1),
+        }
+        results.append(route)
+        status = ','.join(str(code) for code in route['status'])
+        print(f"{name[:47]:<48}{status:>7}{route['p50_ms']:>9.2f}{route['p95_ms']:>9.2f}"
+              f"{route['queries']:>9}{route['peak_kb']:>9.1f}")
+
+    output = {
+        'meta': {
+            'revision': git_revision(),
+            'timestamp': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'database': os.environ['DATABASE_URL'].split(':', 1)[0],
+            'fragment_cache': not args.no_fragment_cache,
+            'params': {
+                'users': args.users, 'posts': args.posts, 'comments_per_post': args.comments_per_post,
+                'likes_per_post': args.likes_per_post, 'complaints_per_post': args.complaints_per_post,
+                'todos_per_user': args.todos_per_user, 'skew': args.skew, 'runs': args.runs,
+            },
+            'missing_routes': missing,
+        },
+        'routes': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(output, f, ensure_ascii=False, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions and args.strict:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""worker 冷启动耗时：每次新开一个 Python 进程，模拟 gunicorn worker 加载 wsgi:app 并处理第一个请求。
+
+- legacy: 旧的 wsgi.py 做法，导入 app 后在每个 worker 中执行 init_db()（建表、迁移检查、查管理员）
+- new:    只导入 wsgi，数据库已由部署时的 flask --app app bootstrap 准备好
+
+    python scripts/cold_start.py --runs 10
+    python scripts/cold_start.py --race 4     # 空数据库上同时启动 4 个 worker，统计失败的进程数
+
+默认使用临时 SQLite；--database-url 可指向本地 PostgreSQL（会建表，请不要指向生产数据库）。
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+WEB_BETA = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, WEB_BETA)
+
+
+def run_worker(mode):
+    """在子进程中执行：按指定方式加载应用并处理一个请求，把各阶段耗时以 JSON 打印到 stdout。"""
+    started = time.perf_counter()
+    if mode == 'legacy':
+        from app import app, init_db
+        imported = time.perf_counter()
+        init_db()
+    else:
+        from wsgi import app
+        imported = time.perf_counter()
+    initialized = time.perf_counter()
+    response = app.test_client().get('/login')
+    finished = time.perf_counter()
+    print(json.dumps({
+        'status': response.status_code,
+        'import_ms': (imported - started) * 1000,
+        'init_ms': (initialized - imported) * 1000,
+        'first_request_ms': (finished - initialized) * 1000,
+    }))
+
+
+def spawn(mode, env):
+    return subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--mode', mode],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=env, cwd=WEB_BETA, text=True,
+    )
+
+
+def bootstrap(env):
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'bootstrap'],
+                   env=env, cwd=WEB_BETA, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='默认使用临时 SQLite 文件')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--race', type=int, default=0, help='在空数据库上同时启动的 worker 数')
+    parser.add_argument('--mode', choices=['legacy', 'new'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_worker(args.mode)
+        return
+
+    def fresh_env():
+        url = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'cold_start.db')
+        return dict(os.environ, DATABASE_URL=url, LOG_LEVEL='WARNING')
+
+    if args.race:
+        for mode in ('legacy', 'new'):
+            env = fresh_env()
+            if mode == 'new':
+                bootstrap(env)
+            workers = [spawn(mode, env) for _ in range(args.race)]
+            failed = sum(worker.wait() != 0 for worker in workers)
+            print(f"{mode:<8} {args.race} workers started together on an empty database: {failed} failed")
+        return
+
+    env = fresh_env()
+    bootstrap(env)
+    print(f"{'mode':<8}{'import ms':>11}{'init ms':>10}{'1st req ms':>12}{'wall ms':>10}")
+    for mode in ('legacy', 'new'):
+        samples = []
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            worker = spawn(mode, env)
+            output, _ = worker.communicate()
+            wall = (time.perf_counter() - started) * 1000
+            if worker.returncode:
+                raise SystemExit(f"{mode} worker failed")
+            samples.append(dict(json.loads(output.strip().splitlines()[-1]), wall_ms=wall))
+        median = {key: statistics.median(sample[key] for sample in samples)
+                  for key in ('import_ms', 'init_ms', 'first_request_ms', 'wall_ms')}
+        print(f"{mode:<8}{median['import_ms']:>11.0f}{median['init_ms']:>10.0f}"
+              f"{median['first_request_ms']:>12.0f}{median['wall_ms']:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""打印每个路由实际发出的 SQL 及其执行计划。
+
+    python scripts/explain_queries.py                      # 临时 SQLite 数据库
+    python scripts/explain_queries.py --database-url postgresql://...  # PostgreSQL
+    python scripts/explain_queries.py --postgres-ddl       # 额外打印 PostgreSQL 建表/索引语句
+
+脚本会建表并写入测试数据，不要指向生产数据库。
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# (方法, 路径, 表单数据)；{post_id}/{todo_id}/{username} 在运行时替换为种子数据
+ROUTES = [
+    ('GET', '/', None),
+    ('GET', '/todos', None),
+    ('GET', '/forum', None),
+    ('GET', '/api/posts', None),
+    ('GET', '/api/posts/{post_id}/comments', None),
+    ('GET', '/group-leader', None),
+    ('GET', '/user-management', None),
+    ('GET', '/view-user-todos/{username}', None),
+    ('GET', '/api/todos?user_id={user_id}', None),
+    ('GET', '/forum/search?q=数学作业', None),
+    ('POST', '/add-todo', {'task': 'explain', 'priority': 'urgent'}),
+    ('GET', '/toggle-todo/{todo_id}', None),
+    ('POST', '/create-post', {'content': 'explain'}),
+    ('POST', '/create-comment/{post_id}', {'content': 'explain'}),
+    ('GET', '/toggle-like/{post_id}', None),
+    ('GET', '/toggle-complaint/{post_id}', None),
+]
+
+
+def print_postgres_ddl(db):
+    from sqlalchemy.dialects import postgresql
+    from sqlalchemy.schema import CreateTable, CreateIndex
+    dialect = postgresql.dialect()
+    print('=' * 80)
+    print('PostgreSQL schema')
+    print('=' * 80)
+    for table in db.metadata.sorted_tables:
+        print(str(CreateTable(table).compile(dialect=dialect)).strip() + ';')
+        for index in table.indexes:
+            print(str(CreateIndex(index).compile(dialect=dialect)).strip() + ';')
+        print()
+
+
+def explain(engine, statement, parameters):
+    if engine.dialect.name == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    else:
+        prefix = 'EXPLAIN '
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        cursor.execute(prefix + statement, parameters)
+        rows = cursor.fetchall()
+    finally:
+        raw.close()
+    if engine.dialect.name == 'sqlite':
+        return [row[-1] for row in rows]
+    return [row[0] for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='默认使用临时 SQLite 文件')
+    parser.add_argument('--postgres-ddl', action='store_true', help='打印 PostgreSQL 方言的建表与索引语句')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--posts', type=int, default=500)
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        path = os.path.join(tempfile.mkdtemp(), 'explain.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+
+    import logging
+    from sqlalchemy import event
+    from app import app, init_db
+    from models import db, Post, Todo, User
+    from seed import seed
+    import api_auth
+
+    init_db()
+    logging.getLogger().setLevel(logging.WARNING)
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        usernames = seed(users=args.users, posts=args.posts)
+        engine = db.engine
+        target = User.query.filter_by(username=usernames[0]).first()
+        values = {
+            'username': target.username,
+            'user_id': target.id,
+            'post_id': db.session.query(Post.id).order_by(Post.id.desc()).first()[0],
+            'todo_id': db.session.query(Todo.id).filter_by(user_id=target.id).first()[0],
+        }
+        admin = User.query.filter_by(login_type='admin').first()
+        admin_id, admin_name = admin.id, admin.username
+        # /api/todos 需要令牌，管理员令牌可以查看其他用户的待办
+        with app.test_request_context():
+            headers = {'Authorization': f'Bearer {api_auth.issue_token(admin)}'}
+
+    if args.postgres_ddl:
+        print_postgres_ddl(db)
+
+    captured = []
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany:
+            captured.append((statement, parameters))
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['username'] = admin_name
+        sess['user_id'] = admin_id
+
+    for method, path, data in ROUTES:
+        url = path.format(**values)
+        captured.clear()
+        response = client.open(url, method=method, data=data, headers=headers)
+        statements = list(captured)
+
+        print('=' * 80)
+        print(f'{method} {url} -> {response.status_code}, {len(statements)} statements')
+        print('=' * 80)
+        for statement, parameters in statements:
+            print(' '.join(statement.split()))
+            print(f'  params: {parameters}')
+            for line in explain(engine, statement, parameters):
+                print(f'    {line}')
+            print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""连接池负载测试：用多个线程同时占用连接，验证 config.engine_options 的池配置是否生效。
+
+每个线程取一个连接、执行一条语句并持有 --hold 秒（模拟慢请求），统计同时借出的连接峰值、
+实际新建的连接数和等待超时次数。线程数超过 DB_POOL_SIZE + DB_MAX_OVERFLOW 时，
+多出的请求会排队等待，等待超过 DB_POOL_TIMEOUT 则计为超时。
+
+    DB_POOL_SIZE=2 DB_MAX_OVERFLOW=1 DB_POOL_TIMEOUT=1 python scripts/pool_load_test.py --threads 8 --hold 0.5
+    python scripts/pool_load_test.py --database-url postgresql://localhost/web_beta
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='默认使用临时 SQLite 文件')
+    parser.add_argument('--threads', type=int, default=16, help='并发线程数')
+    parser.add_argument('--requests', type=int, default=64, help='总请求数')
+    parser.add_argument('--hold', type=float, default=0.2, help='每个请求持有连接的秒数')
+    args = parser.parse_args()
+
+    import config
+    from sqlalchemy import create_engine, event, text
+    from sqlalchemy.exc import TimeoutError as PoolTimeout
+
+    url = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'pool_load_test.db')
+    options = config.engine_options(url)
+    engine = create_engine(url, **options)
+    is_postgres = engine.dialect.name == 'postgresql'
+
+    stats = {'checked_out': 0, 'peak': 0, 'connects': 0, 'timeouts': 0, 'errors': 0}
+    lock = threading.Lock()
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, record):
+        with lock:
+            stats['connects'] += 1
+
+    @event.listens_for(engine, 'checkout')
+    def on_checkout(dbapi_connection, record, proxy):
+        with lock:
+            stats['checked_out'] += 1
+            stats['peak'] = max(stats['peak'], stats['checked_out'])
+
+    @event.listens_for(engine, 'checkin')
+    def on_checkin(dbapi_connection, record):
+        with lock:
+            stats['checked_out'] -= 1
+
+    waits = []
+
+    def request(_):
+        started = time.perf_counter()
+        try:
+            with engine.connect() as conn:
+                waits.append(time.perf_counter() - started)
+                if is_postgres:
+                    conn.execute(text('SELECT pg_sleep(:s)'), {'s': args.hold})
+                else:
+                    conn.execute(text('SELECT 1'))
+                    time.sleep(args.hold)
+        except PoolTimeout:
+            with lock:
+                stats['timeouts'] += 1
+        except Exception as e:
+            with lock:
+                stats['errors'] += 1
+            print(f"error: {e}")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        list(executor.map(request, range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    shown = {key: value for key, value in options.items() if key != 'connect_args'}
+    print(f"engine: {engine.dialect.name}, pool: {type(engine.pool).__name__} {shown}")
+    if 'connect_args' in options:
+        print(f"connect_args: {options['connect_args']}")
+    print(f"threads={args.threads} requests={args.requests} hold={args.hold}s elapsed={elapsed:.2f}s")
+    print(f"peak checked out: {stats['peak']}  connections opened: {stats['connects']}  "
+          f"pool timeouts: {stats['timeouts']}  errors: {stats['errors']}")
+    if waits:
+        waits.sort()
+        print(f"checkout wait p50={waits[len(waits) // 2] * 1000:.1f}ms max={waits[-1] * 1000:.1f}ms")
+
+    limit = options.get('pool_size', 0) + options.get('max_overflow', 0)
+    if limit and stats['peak'] > limit:
+        print(f"FAIL: peak {stats['peak']} exceeds pool_size + max_overflow = {limit}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
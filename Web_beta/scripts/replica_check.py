@@ -0,0 +1,94 @@
+"""读写分离检查：用两个 SQLite 文件模拟主库和只读副本（副本是主库某一时刻的拷贝，之后不再同步，
+相当于复制延迟无限大），按步骤请求页面并统计每个引擎执行的语句数：
+
+1. 只读页面（/todos、/forum、/group-leader、/api/todos）的查询发往副本，只有登录校验里的查询（内容版本号，缓存失效时还有用户）走主库
+2. 新增待办后重定向回 /todos，粘滞期内读主库，能看到刚写入的待办
+3. 粘滞期过后 /todos 重新读副本，看不到副本中不存在的新待办（证明确实读的是副本）
+
+    python scripts/replica_check.py --sticky-seconds 2
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sticky-seconds', type=int, default=2)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    primary = os.path.join(workdir, 'primary.db')
+    copy = os.path.join(workdir, 'replica.db')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + primary
+    os.environ['DATABASE_READ_URL'] = 'sqlite:///' + copy
+    os.environ['READ_AFTER_WRITE_SECONDS'] = str(args.sticky_seconds)
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    from sqlalchemy import event
+    from app import app, init_db
+    from models import db, User
+    from seed import seed
+    import replica
+
+    init_db()
+    with app.app_context():
+        seed(users=5, posts=50, todos_per_user=20)
+        user = User.query.filter_by(login_type='birth').first()
+        user_session = {'user_id': user.id, 'username': user.username}
+        db.engine.dispose()
+    shutil.copy(primary, copy)
+
+    counts = {'primary': 0, 'replica': 0}
+    with app.app_context():
+        engines = {'primary': db.engines[None], 'replica': db.engines[replica.BIND_KEY]}
+    for name, engine in engines.items():
+        event.listen(engine, 'before_cursor_execute',
+                     lambda *_, name=name: counts.__setitem__(name, counts[name] + 1))
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess.update(user_session)
+    token = client.post('/api/login', json={
+        'username': user.username, 'password': 'password', 'birth_date': user.birthdate,
+    }).get_json()['token']
+    # 登录时会按当前策略重新哈希密码（一次写入），等粘滞期过去再开始
+    time.sleep(args.sticky_seconds + 0.5)
+
+    def request(label, method, path, **kwargs):
+        before = dict(counts)
+        response = client.open(path, method=method, **kwargs)
+        body = response.get_data(as_text=True)
+        print(f"{label:<42}{response.status_code:>5}  primary={counts['primary'] - before['primary']:<3}"
+              f"replica={counts['replica'] - before['replica']:<3}", end='')
+        return body
+
+    for path in ('/todos', '/forum', '/group-leader'):
+        request(f'GET {path}', 'GET', path)
+        print()
+    request('GET /api/todos', 'GET', '/api/todos', headers={'Authorization': f'Bearer {token}'})
+    print()
+
+    request('POST /add-todo', 'POST', '/add-todo', data={'task': '副本检查', 'priority': 'urgent'})
+    print()
+    body = request('GET /todos (read-your-writes)', 'GET', '/todos')
+    print(f"  new todo visible: {'副本检查' in body}")
+    time.sleep(args.sticky_seconds + 0.5)
+    body = request(f'GET /todos (after {args.sticky_seconds}s)', 'GET', '/todos')
+    print(f"  new todo visible: {'副本检查' in body} (stale replica)")
+
+    headers = {'Authorization': f'Bearer {token}'}
+    request('POST /api/todos', 'POST', '/api/todos', json={'task': 'API 副本检查'}, headers=headers)
+    print()
+    body = request('GET /api/todos (read-your-writes)', 'GET', '/api/todos?limit=500', headers=headers)
+    print(f"  new todo visible: {any(todo['task'] == 'API 副本检查' for todo in json.loads(body)['todos'])}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""生成测试数据：python scripts/seed.py --users 50 --posts 500
+
+默认写入 DATABASE_URL 指向的数据库，请只在本地或测试数据库上运行。
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, update
+from werkzeug.security import generate_password_hash
+from models import db, User, Post, Comment, Like, Complaint, Todo, priority_rank
+import leaderboard
+import search
+import todo_store
+
+PRIORITIES = ['urgent', 'medium', 'low']
+# 帖子和评论的话题词，让全文检索有可区分的内容
+TOPICS = ['数学作业', '期末考试', '食堂午饭', '篮球比赛', '社团活动', '图书馆', '英语单词',
+          '物理实验', 'Python 编程', '周末电影', '运动会', '春游计划', '班级合影', '化学方程式']
+
+
+def _skewed_factors(n, skew, rng):
+    """n 个均值为 1 的活跃度系数，服从指数为 skew 的 Zipf 分布并随机打乱；skew=0 时全部为 1。"""
+    weights = [1 / (rank + 1) ** skew for rank in range(n)]
+    rng.shuffle(weights)
+    scale = n / sum(weights) if weights else 0
+    return [weight * scale for weight in weights]
+
+
+def seed(users=20, posts=200, comments_per_post=3, likes_per_post=5,
+         complaints_per_post=1, todos_per_user=20, skew=0.0, seed_value=42):
+    """批量写入测试数据并重建排行榜，需在 app context 中调用，返回普通用户名列表。
+
+    skew > 0 时模拟真实的长尾分布：少数用户发帖和待办特别多，少数帖子的评论、点赞特别多。
+    """
+    rng = random.Random(seed_value)
+    now = datetime.utcnow()
+    password = generate_password_hash('password', method='pbkdf2:sha256:1000')
+
+    start = db.session.query(db.func.count(User.id)).scalar()
+    usernames = [f'seed_user_{start + i}' for i in range(users)]
+    db.session.execute(insert(User), [
+        {
+            'username': name,
+            'password': password,
+            'login_type': 'birth',
+            'birthdate': '2000-01-01',
+            'created_by': 'seed',
+        }
+        for name in usernames
+    ])
+    user_ids = [row[0] for row in db.session.query(User.id).filter(User.username.in_(usernames))]
+    user_factors = _skewed_factors(len(user_ids), skew, rng)
+    user_weights = list(itertools.accumulate(user_factors))
+
+    post_rows = []
+    authors = rng.choices(user_ids, cum_weights=user_weights, k=posts) if user_ids else []
+    for i in range(posts):
+        post_rows.append({
+            'content': f'{rng.choice(TOPICS)}和{rng.choice(TOPICS)} 测试帖子 {i}',
+            'author_id': authors[i],
+            'created_at': now - timedelta(minutes=posts - i),
+        })
+    if post_rows:
+        db.session.execute(insert(Post), post_rows)
+    post_ids = [row[0] for row in db.session.query(Post.id).order_by(Post.id.desc()).limit(posts)]
+
+    def skewed_count(mean, factor):
+        return round(rng.randint(0, mean * 2) * factor)
+
+    comment_rows, like_rows, complaint_rows, counts = [], [], [], {}
+    post_factors = _skewed_factors(len(post_ids), skew, rng)
+    for post_id, factor in zip(post_ids, post_factors):
+        n_comments = skewed_count(comments_per_post, factor)
+        for j in range(n_comments):
+            comment_rows.append({
+                'content': f'{rng.choice(TOPICS)} 评论 {j}',
+                'post_id': post_id,
+                'author_id': rng.choices(user_ids, cum_weights=user_weights)[0],
+                'created_at': now - timedelta(seconds=n_comments - j),
+            })
+        likers = rng.sample(user_ids, min(len(user_ids), skewed_count(likes_per_post, factor)))
+        like_rows += [{'post_id': post_id, 'user_id': uid} for uid in likers]
+        complainers = rng.sample(user_ids, min(len(user_ids), skewed_count(complaints_per_post, factor)))
+        complaint_rows += [{'post_id': post_id, 'user_id': uid} for uid in complainers]
+        counts[post_id] = (len(likers), len(complainers), n_comments)
+
+    for model, rows in ((Comment, comment_rows), (Like, like_rows), (Complaint, complaint_rows)):
+        if rows:
+            db.session.execute(insert(model), rows)
+    if counts:
+        db.session.execute(update(Post), [
+            {'id': post_id, 'like_count': likes, 'complaint_count': complaints, 'comment_count': comments}
+            for post_id, (likes, complaints, comments) in counts.items()
+        ])
+
+    todo_rows = []
+    for user_id, factor in zip(user_ids, user_factors):
+        for k in range(round(todos_per_user * factor)):
+            # 约一半的待办带截止时间，分布在前后 30 天内
+            date = time = ''
+            if rng.random() < 0.5:
+                due = now + timedelta(minutes=rng.randint(-30 * 24 * 60, 30 * 24 * 60))
+                date, time = due.strftime('%Y-%m-%d'), due.strftime('%H:%M')
+            todo_rows.append({
+                'task': f'待办 {k}',
+                'date': date,
+                'time': time,
+                'due_at': todo_store.due_at_for(date, time),
+                'priority_rank': priority_rank(rng.choice(PRIORITIES)),
+                'completed': rng.random() < 0.3,
+                'user_id': user_id,
+                'created_at': now - timedelta(minutes=k),
+            })
+    if todo_rows:
+        db.session.execute(insert(Todo), todo_rows)
+
+    leaderboard.rebuild()
+    search.rebuild()
+    db.session.commit()
+    return usernames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--posts', type=int, default=200)
+    parser.add_argument('--comments-per-post', type=int, default=3)
+    parser.add_argument('--likes-per-post', type=int, default=5)
+    parser.add_argument('--complaints-per-post', type=int, default=1)
+    parser.add_argument('--todos-per-user', type=int, default=20)
+    parser.add_argument('--skew', type=float, default=0.0, help='Zipf 指数，0 为均匀分布，1 左右接近真实论坛')
+    args = parser.parse_args()
+
+    from app import app, init_db
+    init_db()
+    with app.app_context():
+        seed(
+            users=args.users,
+            posts=args.posts,
+            comments_per_post=args.comments_per_post,
+            likes_per_post=args.likes_per_post,
+            complaints_per_post=args.complaints_per_post,
+            todos_per_user=args.todos_per_user,
+            skew=args.skew,
+        )
+    print('done')
+
+
+if __name__ == '__main__':
+    main()
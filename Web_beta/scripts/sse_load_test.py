@@ -0,0 +1,131 @@
+"""/forum/stream 负载测试：在本进程内启动多线程 HTTP 服务器，建立大量空闲的 SSE 连接，
+打印每个连接增加的内存（RSS 和 Python 堆），再发一个帖子，统计推送到所有连接的耗时。
+
+    python scripts/sse_load_test.py --connections 300
+
+服务器与客户端在同一进程中，RSS 包含客户端 socket 的开销（很小）；默认使用临时 SQLite，
+FORUM_STREAM_CONNECTIONS 会被设为 --connections。
+"""
+import argparse
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def rss_kb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def open_stream(port, cookie):
+    sock = socket.create_connection(('127.0.0.1', port))
+    sock.sendall(
+        f"GET /forum/stream HTTP/1.1\r\nHost: localhost\r\nCookie: session={cookie}\r\n"
+        f"Accept: text/event-stream\r\n\r\n".encode()
+    )
+    headers = b''
+    while b'\r\n\r\n' not in headers:
+        chunk = sock.recv(4096)
+        if not chunk:
+            raise RuntimeError('connection closed before headers')
+        headers += chunk
+    if b' 200 ' not in headers.split(b'\r\n', 1)[0]:
+        raise RuntimeError(headers.split(b'\r\n', 1)[0].decode())
+    return sock
+
+
+def wait_for(sock, marker, timeout):
+    sock.settimeout(timeout)
+    received = b''
+    while marker not in received:
+        chunk = sock.recv(65536)
+        if not chunk:
+            return False
+        received += chunk
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--connections', type=int, default=300)
+    parser.add_argument('--poll-ms', type=int, default=200)
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'sse_load_test.db')
+    os.environ['FORUM_STREAM_CONNECTIONS'] = str(args.connections)
+    os.environ['FORUM_EVENTS_POLL_MS'] = str(args.poll_ms)
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ.setdefault('LOG_LEVELS', 'werkzeug=WARNING')
+
+    from werkzeug.serving import make_server
+    from app import app, init_db
+    from models import db, User, Post
+    import forum_events
+
+    init_db()
+    with app.app_context():
+        admin = User.query.filter_by(login_type='admin').first()
+        session = {'user_id': admin.id, 'username': admin.username}
+    cookie = app.session_interface.get_signing_serializer(app).dumps(session)
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    port = server.server_port
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    # 第一个连接会启动轮询线程，先建立一个连接再开始计量
+    warm = open_stream(port, cookie)
+    time.sleep(0.5)
+    tracemalloc.start()
+    base_rss = rss_kb()
+    base_heap = tracemalloc.get_traced_memory()[0]
+    base_threads = threading.active_count()
+
+    started = time.perf_counter()
+    sockets = [open_stream(port, cookie) for _ in range(args.connections - 1)]
+    connect_seconds = time.perf_counter() - started
+    time.sleep(1)
+    rss = rss_kb() - base_rss
+    heap = tracemalloc.get_traced_memory()[0] - base_heap
+    tracemalloc.stop()
+    count = len(sockets)
+    print(f"connections:        {count + 1} ({connect_seconds:.2f}s to open {count})")
+    print(f"subscribers:        {len(forum_events.broker)}")
+    print(f"threads added:      {threading.active_count() - base_threads}")
+    print(f"RSS added:          {rss / 1024:.1f} MB ({rss / count:.1f} KB per connection)")
+    print(f"Python heap added:  {heap / 1024 / 1024:.1f} MB ({heap / 1024 / count:.1f} KB per connection)")
+
+    # 写入一个帖子事件，等待所有连接收到
+    with app.app_context():
+        post = Post(content='负载测试', author_id=session['user_id'])
+        db.session.add(post)
+        db.session.flush()
+        forum_events.post_created(post, session['username'])
+        db.session.commit()
+        marker = f"id: {db.session.execute(db.select(db.func.max(forum_events.ForumEvent.id))).scalar()}".encode()
+
+    started = time.perf_counter()
+    delivered = 0
+    for sock in [warm] + sockets:
+        try:
+            delivered += wait_for(sock, marker, timeout=10)
+        except socket.timeout:
+            pass
+    print(f"fan-out:            {delivered}/{count + 1} received in {(time.perf_counter() - started) * 1000:.0f} ms "
+          f"(poll interval {args.poll_ms} ms)")
+
+    for sock in [warm] + sockets:
+        sock.close()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
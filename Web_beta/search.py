@@ -0,0 +1,240 @@
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import select, insert, delete, func, text, and_, or_, Integer, Float
+from models import db, User, Post, Comment, SearchDocument
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+MAX_PAGE = 50
+SNIPPET_LENGTH = 120
+
+# 中日韩文字没有空格分词：连续的 CJK 字符按单字和相邻二元组建索引，其余按单词建索引
+_CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff'
+_TOKEN_RE = re.compile(f'[{_CJK}]+|[^\\W_{_CJK}]+')
+_CJK_RE = re.compile(f'[{_CJK}]')
+
+
+def _tokens(value, for_query):
+    tokens = []
+    for run in _TOKEN_RE.findall(value or ''):
+        if not _CJK_RE.match(run):
+            tokens.append(run.lower())
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            bigrams = [run[i:i + 2] for i in range(len(run) - 1)]
+            # 建索引时同时写入单字，查询时两个字以上只用二元组匹配（更精确）
+            tokens.extend(bigrams if for_query else list(run) + bigrams)
+    return tokens
+
+
+def index_text(value):
+    return ' '.join(_tokens(value, for_query=False))
+
+
+def query_tokens(value):
+    # 去重并保持顺序
+    return list(dict.fromkeys(_tokens(value, for_query=True)))
+
+
+# 搜索结果，帖子和评论统一表示
+@dataclass
+class SearchHit:
+    kind: str
+    post_id: int
+    comment_id: Optional[int]
+    content: str
+    snippet: str
+    author_name: str
+    created_at: datetime
+
+    def to_dict(self):
+        return {
+            'kind': self.kind,
+            'post_id': self.post_id,
+            'comment_id': self.comment_id,
+            'content': self.content,
+            'snippet': self.snippet,
+            'author_name': self.author_name,
+            'created_at': self.created_at.isoformat(),
+        }
+
+
+def index_post(post_id, content):
+    """新建帖子后调用（需已 flush 得到 ID）。"""
+    db.session.execute(insert(SearchDocument).values(
+        kind='post', source_id=post_id, post_id=post_id, tokens=index_text(content)
+    ))
+
+
+def index_comment(comment_id, post_id, content):
+    db.session.execute(insert(SearchDocument).values(
+        kind='comment', source_id=comment_id, post_id=post_id, tokens=index_text(content)
+    ))
+
+
+def _delete(*conditions):
+    return db.session.execute(
+        delete(SearchDocument).where(*conditions).execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def remove_post(post_id):
+    """删除帖子及其评论的检索文档。"""
+    _delete(SearchDocument.post_id == post_id)
+
+
+def remove_user_content(user_id):
+    """删除用户的帖子（含其下所有评论）和该用户在别处的评论的检索文档，需在删除帖子和评论之前调用。"""
+    own_posts = select(Post.id).where(Post.author_id == user_id)
+    own_comments = select(Comment.id).where(Comment.author_id == user_id)
+    _delete(or_(
+        SearchDocument.post_id.in_(own_posts),
+        and_(SearchDocument.kind == 'comment', SearchDocument.source_id.in_(own_comments)),
+    ))
+
+
+def remove_orphans():
+    return _delete(or_(
+        SearchDocument.post_id.not_in(select(Post.id)),
+        and_(SearchDocument.kind == 'comment', SearchDocument.source_id.not_in(select(Comment.id))),
+    ))
+
+
+def create_sqlite_index():
+    """在 SQLite 上创建 FTS5 外部内容表和同步触发器（可重复执行）。"""
+    for statement in (
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5("
+        "tokens, content='search_documents', content_rowid='id', tokenize='unicode61')",
+        "CREATE TRIGGER IF NOT EXISTS search_documents_ai AFTER INSERT ON search_documents BEGIN "
+        "INSERT INTO search_fts(rowid, tokens) VALUES (new.id, new.tokens); END",
+        "CREATE TRIGGER IF NOT EXISTS search_documents_ad AFTER DELETE ON search_documents BEGIN "
+        "INSERT INTO search_fts(search_fts, rowid, tokens) VALUES ('delete', old.id, old.tokens); END",
+        "CREATE TRIGGER IF NOT EXISTS search_documents_au AFTER UPDATE ON search_documents BEGIN "
+        "INSERT INTO search_fts(search_fts, rowid, tokens) VALUES ('delete', old.id, old.tokens); "
+        "INSERT INTO search_fts(rowid, tokens) VALUES (new.id, new.tokens); END",
+    ):
+        db.session.execute(text(statement))
+
+
+def rebuild(batch_size=5000):
+    """清空并从帖子和评论重建全部检索文档，返回写入的文档数。"""
+    _delete()
+    written = 0
+    for kind, stmt in (
+        ('post', select(Post.id, Post.id, Post.content).order_by(Post.id)),
+        ('comment', select(Comment.id, Comment.post_id, Comment.content).order_by(Comment.id)),
+    ):
+        result = db.session.execute(stmt.execution_options(yield_per=batch_size))
+        for rows in result.partitions():
+            db.session.execute(insert(SearchDocument), [
+                {'kind': kind, 'source_id': source_id, 'post_id': post_id, 'tokens': index_text(content)}
+                for source_id, post_id, content in rows
+            ])
+            written += len(rows)
+    return written
+
+
+def _ranked_documents(tokens, limit, offset):
+    columns = (SearchDocument.kind, SearchDocument.source_id, SearchDocument.post_id)
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        # FTS5 MATCH：每个词加引号，空格表示 AND；在 FTS 表内按 rank（bm25）排序并分页，只回表一页
+        match = ' '.join(f'"{token}"' for token in tokens)
+        fts = (
+            text(
+                "SELECT rowid AS id, rank FROM search_fts WHERE search_fts MATCH :match "
+                "ORDER BY rank, rowid DESC LIMIT :limit OFFSET :offset"
+            )
+            .bindparams(match=match, limit=limit, offset=offset)
+            .columns(id=Integer, rank=Float)
+            .subquery()
+        )
+        stmt = (
+            select(*columns)
+            .join(fts, fts.c.id == SearchDocument.id)
+            .order_by(fts.c.rank, SearchDocument.id.desc())
+        )
+        return db.session.execute(stmt).all()
+    elif dialect == 'postgresql':
+        # 表达式与 ix_search_documents_tsv 完全一致才能走 GIN 索引
+        tsv = func.to_tsvector(text("'simple'"), SearchDocument.tokens)
+        tsq = func.plainto_tsquery(text("'simple'"), ' '.join(tokens))
+        stmt = (
+            select(*columns)
+            .where(tsv.op('@@')(tsq))
+            .order_by(func.ts_rank(tsv, tsq).desc(), SearchDocument.id.desc())
+        )
+    else:
+        # 其他数据库没有全文索引，按词逐个 LIKE 匹配，结果按时间倒序
+        padded = ' ' + SearchDocument.tokens + ' '
+        stmt = (
+            select(*columns)
+            .where(*[padded.contains(f' {token} ') for token in tokens])
+            .order_by(SearchDocument.id.desc())
+        )
+    return db.session.execute(stmt.limit(limit).offset(offset)).all()
+
+
+def _snippet(content, tokens):
+    if len(content) <= SNIPPET_LENGTH:
+        return content
+    lowered = content.lower()
+    positions = [lowered.find(token) for token in tokens]
+    position = min([p for p in positions if p >= 0], default=0)
+    start = max(0, position - SNIPPET_LENGTH // 4)
+    end = start + SNIPPET_LENGTH
+    return ('…' if start else '') + content[start:end] + ('…' if end < len(content) else '')
+
+
+def search(query, page=1, per_page=PAGE_SIZE):
+    """按相关度返回一页结果：(SearchHit 列表, 是否还有下一页)。
+
+    一条全文检索查询加上帖子、评论各一条回表查询。
+    """
+    tokens = query_tokens(query)
+    if not tokens:
+        return [], False
+    per_page = max(1, min(per_page, MAX_PAGE_SIZE))
+    page = max(1, min(page, MAX_PAGE))
+
+    documents = _ranked_documents(tokens, per_page + 1, (page - 1) * per_page)
+    has_more = len(documents) > per_page and page < MAX_PAGE
+    documents = documents[:per_page]
+
+    post_ids = [source_id for kind, source_id, _ in documents if kind == 'post']
+    comment_ids = [source_id for kind, source_id, _ in documents if kind == 'comment']
+    sources = {}
+    if post_ids:
+        for row in db.session.execute(
+            select(Post.id, Post.content, Post.created_at, User.username)
+            .join(User, User.id == Post.author_id)
+            .where(Post.id.in_(post_ids))
+        ):
+            sources[('post', row[0])] = row
+    if comment_ids:
+        for row in db.session.execute(
+            select(Comment.id, Comment.content, Comment.created_at, User.username)
+            .join(User, User.id == Comment.author_id)
+            .where(Comment.id.in_(comment_ids))
+        ):
+            sources[('comment', row[0])] = row
+
+    hits = []
+    for kind, source_id, post_id in documents:
+        row = sources.get((kind, source_id))
+        if row is None:
+            continue
+        _, content, created_at, author_name = row
+        hits.append(SearchHit(
+            kind=kind,
+            post_id=post_id,
+            comment_id=source_id if kind == 'comment' else None,
+            content=content,
+            snippet=_snippet(content, tokens),
+            author_name=author_name,
+            created_at=created_at,
+        ))
+    return hits, has_more
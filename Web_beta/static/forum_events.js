@@ -0,0 +1,23 @@
+// 论坛实时更新的事件去重：每个事件的 data 为 {"seq": 事件 id, "data": 内容}。
+// 晚提交的事件 id 比已收到的小，且不带 SSE id 行（event.lastEventId 沿用上一个事件的值），
+// 因此不能按 lastEventId 递增去重，只能记录已应用过的 seq。
+function createEventFilter(limit) {
+    limit = limit || 2000;
+    const seen = new Set();
+    // 返回 true 表示该 seq 第一次出现，应当应用
+    return function (seq) {
+        if (seen.has(seq)) return false;
+        seen.add(seq);
+        if (seen.size > limit) {
+            // 只保留较新的一半；晚提交的事件最多晚 GAP_SECONDS 秒，不会落到这么远之前
+            Array.from(seen).sort(function (a, b) { return a - b; })
+                .slice(0, seen.size - limit / 2)
+                .forEach(function (old) { seen.delete(old); });
+        }
+        return true;
+    };
+}
+
+if (typeof module !== 'undefined') {
+    module.exports = { createEventFilter: createEventFilter };
+}
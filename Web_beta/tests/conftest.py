@@ -0,0 +1,84 @@
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+import pytest
+
+# 测试使用临时 SQLite 文件；环境变量需在导入 app 之前设置
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.db')
+os.environ['FRAGMENT_CACHE'] = 'off'
+os.environ['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'  # 测试中不需要真实的哈希成本
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app, migrate_db
+    app.config['TESTING'] = True
+    migrate_db()
+    return app
+
+
+@pytest.fixture
+def db(app):
+    """每个测试在 app context 中运行，结束后清空所有表。"""
+    from models import db
+    import identity
+    import passwords
+    passwords.user_limiter.clear()
+    passwords.ip_limiter.clear()
+    with app.app_context():
+        yield db
+        db.session.rollback()
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
+    identity.identity_cache.clear()
+
+
+@pytest.fixture
+def client(app, db):
+    return app.test_client()
+
+
+@pytest.fixture
+def count_queries(db):
+    """返回上下文管理器，收集其中执行的 SQL 语句：with count_queries() as statements: ..."""
+    from sqlalchemy import event
+
+    @contextmanager
+    def counting():
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+
+    return counting
+
+
+def make_user(username, login_type='birth', birthdate='2010-01-01', password='password'):
+    from werkzeug.security import generate_password_hash
+    from models import db, User
+    import leaderboard
+    import passwords
+    user = User(username=username, password=generate_password_hash(password, passwords.HASH_METHOD), login_type=login_type,
+                birthdate=birthdate)
+    db.session.add(user)
+    db.session.flush()
+    leaderboard.add_user(user)
+    db.session.commit()
+    return user
+
+
+def log_in(client, user):
+    with client.session_transaction() as sess:
+        sess['user_id'] = user.id
+        sess['username'] = user.username
@@ -0,0 +1,47 @@
+from conftest import make_user
+
+
+def api_headers(client, username, login_type='birth'):
+    if login_type == 'admin':
+        body = {'username': username, 'password': 'password', 'is_admin': True}
+    else:
+        body = {'username': username, 'password': 'password', 'birth_date': '2010-01-01'}
+    token = client.post('/api/login', json=body).get_json()['token']
+    return {'Authorization': f'Bearer {token}'}
+
+
+def test_user_may_name_their_own_id_as_a_string(db, client):
+    student = make_user('student')
+    headers = api_headers(client, 'student')
+    response = client.post('/api/todos', json={'task': 'read', 'user_id': str(student.id)}, headers=headers)
+    assert response.status_code == 201
+    assert client.get(f'/api/todos?user_id={student.id}', headers=headers).status_code == 200
+
+
+def test_invalid_or_unknown_target_user_is_rejected(db, client):
+    from models import Todo
+    admin = make_user('admin', login_type='admin', birthdate=None)
+    student = make_user('student')
+    headers = api_headers(client, 'admin', login_type='admin')
+
+    for user_id in ('abc', '1.5', True, [1]):
+        response = client.post('/api/todos', json={'task': 'x', 'user_id': user_id}, headers=headers)
+        assert response.status_code == 400, user_id
+    assert client.get('/api/todos?user_id=abc', headers=headers).status_code == 400
+    assert client.post('/api/todos', json={'task': 'x', 'user_id': 999}, headers=headers).status_code == 404
+    assert client.get('/api/todos?user_id=999', headers=headers).status_code == 404
+    response = client.post('/api/todos/batch', json={'user_id': 999, 'operations': []}, headers=headers)
+    assert response.status_code == 404
+    assert db.session.query(Todo).count() == 0
+
+    response = client.post('/api/todos', json={'task': 'x', 'user_id': str(student.id)}, headers=headers)
+    assert response.status_code == 201
+    assert db.session.query(Todo.user_id).scalar() == student.id
+    assert admin.id != student.id
+
+
+def test_student_cannot_target_another_user(db, client):
+    make_user('student')
+    other = make_user('other')
+    headers = api_headers(client, 'student')
+    assert client.get(f'/api/todos?user_id={other.id}', headers=headers).status_code == 403
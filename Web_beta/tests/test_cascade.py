@@ -0,0 +1,88 @@
+import pytest
+from sqlalchemy import select, func
+from conftest import make_user, log_in
+
+
+def build_forum(db, client, target, others, posts_per_user):
+    """每个用户发帖、互相评论、点赞和投诉，目标用户另有待办。"""
+    from models import Post
+    users = [target] + others
+    for user in users:
+        log_in(client, user)
+        for i in range(posts_per_user):
+            client.post('/create-post', data={'content': f'{user.username} 的帖子 {i}'})
+        client.post('/add-todo', data={'task': f'{user.username} 的待办'})
+    post_ids = db.session.scalars(select(Post.id)).all()
+    for user in users:
+        log_in(client, user)
+        for post_id in post_ids:
+            client.post(f'/create-comment/{post_id}', data={'content': f'{user.username} 的评论'})
+            client.get(f'/toggle-like/{post_id}')
+            if post_id % 2:
+                client.get(f'/toggle-complaint/{post_id}')
+
+
+def assert_consistent(db):
+    """没有指向已删除用户或帖子的明细，冗余计数和排行榜与明细一致。"""
+    from models import User, Post, Comment, Like, Complaint, Todo, SearchDocument, UserScore
+    import counters
+    import leaderboard
+    users = select(User.id)
+    posts = select(Post.id)
+    for model, user_column in ((Like, Like.user_id), (Complaint, Complaint.user_id), (Comment, Comment.author_id)):
+        orphans = select(func.count()).select_from(model).where(
+            model.post_id.not_in(posts) | user_column.not_in(users))
+        assert db.session.scalar(orphans) == 0, model.__name__
+    assert db.session.scalar(select(func.count()).where(Post.author_id.not_in(users))) == 0
+    assert db.session.scalar(select(func.count()).where(Todo.user_id.not_in(users))) == 0
+    assert db.session.scalar(select(func.count()).where(SearchDocument.post_id.not_in(posts))) == 0
+    assert counters.find_drift() == []
+    scores = db.session.execute(select(UserScore.user_id, UserScore.net_score).order_by(UserScore.user_id)).all()
+    leaderboard.rebuild()
+    assert db.session.execute(select(UserScore.user_id, UserScore.net_score).order_by(UserScore.user_id)).all() == scores
+    db.session.rollback()
+
+
+@pytest.mark.parametrize('posts_per_user', [1, 5])
+def test_delete_user_leaves_no_orphans_in_constant_statements(db, client, count_queries, posts_per_user):
+    from models import User
+    admin = make_user('admin', login_type='admin')
+    target = make_user('target')
+    others = [make_user(f'other{i}') for i in range(3)]
+    build_forum(db, client, target, others, posts_per_user)
+    target_id = target.id
+
+    log_in(client, admin)
+    client.post('/create-user', data={'username': 'warmup', 'password': 'pw', 'birthdate': '2011-01-01'})
+    client.get('/user-management')  # 预热当前用户缓存（此时 users 版本行已存在），语句数不含用户查询
+    with count_queries() as statements:
+        response = client.get('/delete-user/target')
+    assert response.status_code == 302
+    # 登录校验读内容版本 1 条；查用户 ID 1 条；cascade.delete_user 13 条（查受影响的作者和帖子 2 条、删除明细 8 条、
+    # 重算分数和计数 2 条、删除用户 1 条）；内容版本 2 条（论坛和排行榜合为 1 条，用户 1 条）；吊销令牌 3 条。
+    # 语句数与用户的数据量无关
+    assert len(statements) == 20
+
+    assert db.session.get(User, target_id) is None
+    assert_consistent(db)
+
+
+@pytest.mark.parametrize('posts_per_user', [1, 5])
+def test_delete_post_leaves_no_orphans_in_constant_statements(db, client, count_queries, posts_per_user):
+    from models import Post, ForumEvent
+    admin = make_user('admin', login_type='admin')
+    others = [make_user(f'other{i}') for i in range(3)]
+    build_forum(db, client, others[0], others[1:], posts_per_user)
+    post_id = db.session.scalar(select(Post.id).where(Post.comment_count > 0).limit(1))
+
+    log_in(client, admin)
+    client.get('/user-management')
+    with count_queries() as statements:
+        response = client.get(f'/delete-post/{post_id}')
+    assert response.status_code == 302
+    # 登录校验读内容版本 1 条，cascade.delete_post 6 条，内容版本 1 条（论坛和排行榜），实时更新事件 1 条
+    assert len(statements) == 9
+
+    assert db.session.get(Post, post_id) is None
+    assert db.session.scalar(select(func.count()).select_from(ForumEvent).where(ForumEvent.kind == 'delete')) == 1
+    assert_consistent(db)
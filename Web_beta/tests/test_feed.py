@@ -0,0 +1,40 @@
+import pytest
+from conftest import make_user
+
+
+def add_posts(db, author_ids, viewer_id, count):
+    from models import Post, Comment, Like, Complaint
+    for i in range(count):
+        post = Post(content=f'帖子 {i}', author_id=author_ids[i % len(author_ids)],
+                    like_count=1, complaint_count=i % 2, comment_count=5)
+        db.session.add(post)
+        db.session.flush()
+        for j in range(5):
+            db.session.add(Comment(content=f'评论 {j}', post_id=post.id, author_id=author_ids[j % len(author_ids)]))
+        db.session.add(Like(post_id=post.id, user_id=viewer_id))
+        if i % 2:
+            db.session.add(Complaint(post_id=post.id, user_id=viewer_id))
+    db.session.commit()
+
+
+@pytest.mark.parametrize('viewer_aware', [True, False])
+def test_forum_feed_query_count_does_not_grow_with_posts(db, count_queries, viewer_aware):
+    from feed import load_forum_feed, INLINE_COMMENTS
+    author_ids = [make_user(f'author{i}').id for i in range(3)]
+    liker_id = make_user('viewer').id
+    viewer_id = liker_id if viewer_aware else None
+
+    counts = {}
+    total = 0
+    for posts in (1, 10, 50):
+        add_posts(db, author_ids, liker_id, posts - total)
+        total = posts
+        with count_queries() as statements:
+            feed, _ = load_forum_feed(viewer_id, limit=100)
+        assert len(feed) == posts
+        assert all(len(post.comments) == INLINE_COMMENTS and post.comment_count == 5 for post in feed)
+        assert all(post.is_liked == viewer_aware for post in feed)
+        counts[posts] = len(statements)
+
+    # 帖子（含计数与当前用户的点赞/投诉状态）一条查询，内联评论一条查询
+    assert counts == {1: 2, 10: 2, 50: 2}
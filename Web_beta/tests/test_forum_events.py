@@ -0,0 +1,138 @@
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+from sqlalchemy import select, insert
+
+WEB_BETA = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def poll(db, cursor):
+    from models import ForumEvent
+    rows = db.session.execute(
+        select(ForumEvent.id, ForumEvent.kind, ForumEvent.payload).where(cursor.condition()).order_by(ForumEvent.id)
+    ).all()
+    return cursor.advance(rows)
+
+
+def add_event(db, event_id, kind='post'):
+    from models import ForumEvent
+    db.session.execute(insert(ForumEvent).values(id=event_id, kind=kind, payload='{}'))
+    db.session.commit()
+
+
+def test_event_committed_after_a_higher_id_is_still_delivered(db):
+    from forum_events import EventCursor
+    cursor = EventCursor(0)
+    add_event(db, 1)
+    add_event(db, 3)  # id 2 已分配，但所在事务还未提交
+    assert poll(db, cursor) == ['id: 1\nevent: post\ndata: {"seq": 1, "data": {}}\n\n',
+                                'id: 3\nevent: post\ndata: {"seq": 3, "data": {}}\n\n']
+    assert set(cursor.gaps) == {2}
+
+    add_event(db, 2, kind='comment')
+    add_event(db, 4)
+    # 晚提交的事件不带 id 行，浏览器的 Last-Event-ID 仍是 3，页面按 data 中的 seq 去重
+    assert poll(db, cursor) == ['event: comment\ndata: {"seq": 2, "data": {}}\n\n',
+                                'id: 4\nevent: post\ndata: {"seq": 4, "data": {}}\n\n']
+    assert cursor.gaps == {}
+    assert poll(db, cursor) == []
+
+
+def test_gaps_from_rolled_back_ids_expire():
+    from forum_events import EventCursor, GAP_SECONDS, MAX_GAPS
+    cursor = EventCursor(0)
+    cursor.advance([(5, 'post', '{}')], now=100)
+    assert set(cursor.gaps) == {1, 2, 3, 4}
+    cursor.advance([], now=100 + GAP_SECONDS + 1)
+    assert cursor.gaps == {}
+    # id 跳跃过大（如序列被重置）时不逐个记录空缺
+    cursor.advance([(6 + MAX_GAPS + 1, 'post', '{}')], now=200)
+    assert cursor.gaps == {}
+
+
+def browser_events(chunks):
+    """按 EventSource 的规则解析 SSE 文本：没有 id 行的事件沿用上一个 lastEventId。"""
+    last_event_id = ''
+    events = []
+    for chunk in chunks:
+        fields = dict(line.split(': ', 1) for line in chunk.strip().split('\n'))
+        last_event_id = fields.get('id', last_event_id)
+        events.append({'lastEventId': last_event_id, 'data': fields['data']})
+    return events
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='需要 node 运行页面脚本')
+def test_page_applies_late_event_and_drops_replayed_duplicates():
+    from forum_events import EventCursor, format_event
+    cursor = EventCursor(0)
+    chunks = cursor.advance([(1, 'post', '{"id": 1}'), (3, 'post', '{"id": 3}')], now=0)
+    chunks += cursor.advance([(2, 'post', '{"id": 2}')], now=1)
+    # 重连补发与实时推送重叠时，同一个事件会收到两次
+    chunks.append(format_event(3, 'post', '{"id": 3}'))
+    events = browser_events(chunks)
+    assert events[2]['lastEventId'] == '3'
+
+    script = """
+        const { createEventFilter } = require(process.argv[1]);
+        const firstTime = createEventFilter();
+        const applied = [];
+        JSON.parse(process.argv[2]).forEach(function (event) {
+            const message = JSON.parse(event.data);
+            if (firstTime(message.seq)) applied.push(message.data.id);
+        });
+        console.log(JSON.stringify(applied));
+    """
+    result = subprocess.run(['node', '-e', script, os.path.join(WEB_BETA, 'static', 'forum_events.js'),
+                             json.dumps(events)], capture_output=True, text=True, check=True)
+    assert json.loads(result.stdout) == [1, 3, 2]
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='需要 node 运行页面脚本')
+def test_event_filter_keeps_recent_seqs_when_pruning():
+    script = """
+        const { createEventFilter } = require(process.argv[1]);
+        const firstTime = createEventFilter(10);
+        for (let seq = 1; seq <= 11; seq++) firstTime(seq);
+        console.log(JSON.stringify([firstTime(11), firstTime(7), firstTime(1)]));
+    """
+    result = subprocess.run(['node', '-e', script, os.path.join(WEB_BETA, 'static', 'forum_events.js')],
+                            capture_output=True, text=True, check=True)
+    assert json.loads(result.stdout) == [False, False, True]
+
+
+def test_stream_threads_do_not_raise_request_concurrency(monkeypatch):
+    import config
+    monkeypatch.setenv('DB_POOL_SIZE', '5')
+    monkeypatch.setenv('DB_MAX_OVERFLOW', '5')
+    monkeypatch.setenv('GUNICORN_THREADS', '50')
+    monkeypatch.setenv('FORUM_STREAM_CONNECTIONS', '32')
+    assert config.request_threads() == 10
+    assert config.worker_settings(cpu_count=1)[1] == 10 + 32
+
+
+def test_request_gate_queues_requests_but_not_open_streams(db, client, monkeypatch):
+    import threading
+    import forum_events
+    from conftest import make_user, log_in
+    log_in(client, make_user('student'))
+    gate = threading.BoundedSemaphore(1)
+    monkeypatch.setattr(forum_events, 'request_gate', gate)
+
+    # 订阅请求的视图返回后即释放闸门，推送事件期间不占用
+    stream = client.get('/forum/stream', buffered=False)
+    assert stream.status_code == 200
+    assert gate.acquire(blocking=False)
+
+    # 闸门被占满时，普通请求排队等待，而不是去争抢连接池
+    finished = threading.Event()
+    waiting = threading.Thread(target=lambda: (client.get('/todos'), finished.set()))
+    waiting.start()
+    assert not finished.wait(0.3)
+    gate.release()
+    assert finished.wait(10)
+    waiting.join()
+    stream.close()
+    assert gate.acquire(blocking=False)
@@ -0,0 +1,45 @@
+from conftest import make_user, log_in
+
+
+def test_session_of_deleted_user_does_not_match_reused_id(db, client):
+    from models import User
+    admin = make_user('admin', login_type='admin')
+    old = make_user('old_student')
+    old_id = old.id
+    old_client = client.application.test_client()
+    log_in(old_client, old)
+    assert old_client.get('/todos').status_code == 200
+    log_in(client, admin)
+    db.session.expunge_all()  # 测试与请求共用会话，删除后 identity map 里不能留着旧对象
+
+    client.get('/delete-user/old_student')
+    client.post('/create-user', data={'username': 'new_student', 'password': 'pw', 'birthdate': '2011-01-01'})
+    new_id = db.session.scalar(db.select(User.id).where(User.username == 'new_student'))
+    assert new_id == old_id  # SQLite 复用了最大的 rowid
+
+    response = old_client.get('/todos')
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/login')
+    with old_client.session_transaction() as sess:
+        assert 'user_id' not in sess
+
+
+def test_delete_in_another_worker_ends_cached_session(db, client):
+    import identity
+    from sqlalchemy import text
+    student = make_user('student')
+    log_in(client, student)
+    assert client.get('/todos').status_code == 200
+    assert identity.identity_cache.get(student.id, identity._version()) is not None
+
+    # 另一个 worker 删除用户：只改数据库，本进程的缓存条目仍在
+    db.session.expunge_all()
+    with db.engine.begin() as conn:
+        conn.execute(text("DELETE FROM user_scores WHERE user_id = :id"), {'id': student.id})
+        conn.execute(text("DELETE FROM users WHERE id = :id"), {'id': student.id})
+        conn.execute(text("INSERT INTO content_versions (name, version) VALUES (:name, 1)"),
+                     {'name': identity.VERSION})
+
+    response = client.get('/todos')
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/login')
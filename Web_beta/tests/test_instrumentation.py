@@ -0,0 +1,32 @@
+import json
+import logging
+
+from conftest import make_user, log_in
+
+
+def test_slow_request_is_logged_as_one_flat_json_object(db, client, monkeypatch):
+    import instrumentation
+    from logging_config import JsonFormatter
+    monkeypatch.setattr(instrumentation, 'SLOW_REQUEST_QUERIES', 1)
+    lines = []
+
+    class Capture(logging.Handler):
+        def emit(self, record):
+            lines.append(self.format(record))
+
+    handler = Capture()
+    handler.setFormatter(JsonFormatter())
+    instrumentation.slow_log.addHandler(handler)
+    try:
+        log_in(client, make_user('student'))
+        assert client.get('/todos').status_code == 200
+    finally:
+        instrumentation.slow_log.removeHandler(handler)
+
+    entry = json.loads(lines[-1])
+    assert entry['logger'] == 'slow_requests'
+    assert entry['event'] == 'slow_request'
+    assert (entry['method'], entry['path'], entry['endpoint'], entry['status']) == ('GET', '/todos', 'todos', 200)
+    assert entry['queries'] > 1 and isinstance(entry['total_ms'], float)
+    assert entry['slowest'] and set(entry['slowest'][0]) == {'ms', 'sql'}
+    assert entry['message'].startswith('Slow request GET /todos')
@@ -0,0 +1,38 @@
+from conftest import make_user
+
+
+def api_login(client, username, password='password', birth_date='2010-01-01'):
+    return client.post('/api/login', json={'username': username, 'password': password, 'birth_date': birth_date})
+
+
+def test_class_logging_in_behind_one_ip_is_not_rate_limited(db, client):
+    import passwords
+    for i in range(passwords.ip_limiter.limit + 10):
+        make_user(f'student{i}')
+    for i in range(passwords.ip_limiter.limit + 10):
+        assert api_login(client, f'student{i}').status_code == 200
+    for i in range(10):
+        response = client.post('/login', data={'username': f'student{i}', 'password': 'password',
+                                               'birthdate': '2010-01-01'})
+        assert response.status_code == 302
+
+
+def test_failed_logins_are_limited_per_user(db, client):
+    import passwords
+    make_user('student')
+    make_user('neighbour')
+    for _ in range(passwords.user_limiter.limit):
+        assert api_login(client, 'student', password='wrong').status_code == 401
+    # 达到失败次数后，正确的密码也要等窗口过去
+    assert api_login(client, 'student').status_code == 429
+    assert api_login(client, 'neighbour').status_code == 200
+
+
+def test_failed_logins_are_limited_per_ip(db, client):
+    import passwords
+    make_user('student')
+    for i in range(passwords.ip_limiter.limit):
+        assert api_login(client, f'guess{i}').status_code == 401
+    assert api_login(client, 'student').status_code == 429
+    response = client.post('/login', data={'username': 'student', 'password': 'password', 'birthdate': '2010-01-01'})
+    assert '登录尝试过于频繁' in response.get_data(as_text=True)
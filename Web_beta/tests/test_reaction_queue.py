@@ -0,0 +1,173 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+
+import reaction_queue
+import reactions
+from conftest import make_user, log_in
+from models import Post, Like
+from reaction_queue import MemoryStore, SQLiteStore
+
+KEY = ('like', 1, 1)
+
+
+def flush(store, database):
+    """模拟后台线程：按目标状态写库后确认。"""
+    taken = store.take(100)
+    for key, desired, _ in taken:
+        database[key] = desired
+    store.ack(taken)
+
+
+def test_toggle_uses_database_state_after_entry_is_flushed():
+    store = MemoryStore()
+    database = {KEY: False}
+    assert store.toggle(KEY, lambda: database[KEY]) is True
+    flush(store, database)
+    assert database[KEY] is True
+    assert len(store) == 0
+    # 条目已写库并移出队列，再次切换要以数据库中的点赞为基准
+    assert store.toggle(KEY, lambda: database[KEY]) is False
+    flush(store, database)
+    assert database[KEY] is False
+
+
+def test_toggle_reloads_base_when_flush_races_with_lookup():
+    store = MemoryStore()
+    database = {KEY: False}
+    calls = []
+
+    def load_base():
+        calls.append(database[KEY])
+        if len(calls) == 1:
+            # 查询数据库期间，同一用户的另一个请求点了赞并已写库
+            stale = database[KEY]
+            assert store.toggle(KEY, lambda: database[KEY]) is True
+            flush(store, database)
+            return stale
+        return database[KEY]
+
+    assert store.toggle(KEY, load_base) is False
+    assert calls == [False, True]
+    flush(store, database)
+    assert database[KEY] is False
+
+
+def test_pending_state_and_deltas():
+    store = MemoryStore()
+    store.toggle(KEY, lambda: False)
+    store.toggle(('like', 2, 1), lambda: True)
+    assert store.viewer_state(1, [1]) == {('like', 1): True}
+    assert store.post_deltas([1]).get(('like', 1), 0) == 0  # 一个点赞一个取消，互相抵消
+    store.toggle(('like', 2, 1), lambda: True)
+    assert store.post_deltas([1]) == {('like', 1): 1}
+
+
+def test_sqlite_toggle_reads_database_without_holding_queue_lock(tmp_path):
+    path = str(tmp_path / 'queue.sqlite3')
+    store = SQLiteStore(path)
+
+    def load_base():
+        # 查询主库期间其他 worker 仍能取得队列文件的写锁
+        other = sqlite3.connect(path, timeout=0, isolation_level=None)
+        other.execute('BEGIN IMMEDIATE')
+        other.execute('ROLLBACK')
+        other.close()
+        return False
+
+    assert store.toggle(KEY, load_base) is True
+    assert store.toggle(KEY, load_base) is False
+    assert store.viewer_state(1, [1]) == {('like', 1): False}
+
+
+def test_sqlite_toggle_reloads_base_when_flush_races_with_lookup(tmp_path):
+    path = str(tmp_path / 'queue.sqlite3')
+    store, other_worker = SQLiteStore(path), SQLiteStore(path)
+    database = {KEY: False}
+    calls = []
+
+    def load_base():
+        calls.append(database[KEY])
+        if len(calls) == 1:
+            # 查询数据库期间，另一个 worker 点了赞并已写库
+            stale = database[KEY]
+            assert other_worker.toggle(KEY, lambda: database[KEY]) is True
+            flush(other_worker, database)
+            return stale
+        return database[KEY]
+
+    assert store.toggle(KEY, load_base) is False
+    assert calls == [False, True]
+    flush(store, database)
+    assert database[KEY] is False
+
+
+@pytest.fixture
+def queued(db, client, monkeypatch):
+    """使用内存队列，返回 (队列, 用户 ID, 帖子 ID 列表)。"""
+    store = MemoryStore()
+    monkeypatch.setattr(reaction_queue, 'store', store)
+    monkeypatch.setattr(reaction_queue, '_batch_limit', reaction_queue.BATCH_SIZE)
+    monkeypatch.setattr(reaction_queue, '_failures', {})
+    user = make_user('student')
+    log_in(client, user)
+    for i in range(8):
+        client.post('/create-post', data={'content': f'帖子 {i}'})
+    post_ids = db.session.scalars(select(Post.id).order_by(Post.id)).all()
+    for post_id in post_ids:
+        store.toggle(('like', user.id, post_id), lambda: False)
+    return store, user.id, post_ids
+
+
+def test_flush_dead_letters_an_entry_that_keeps_failing(db, queued, monkeypatch, caplog):
+    store, user_id, post_ids = queued
+    poison = post_ids[5]
+    set_state = reactions.set_state
+
+    def failing_set_state(model, post_id, user_id, active):
+        if post_id == poison:
+            raise ValueError('bad row')
+        return set_state(model, post_id, user_id, active)
+
+    monkeypatch.setattr(reactions, 'set_state', failing_set_state)
+    rounds = 0
+    while len(store):
+        rounds += 1
+        assert rounds < 20
+        reaction_queue.flush_all()
+
+    # 8 条 → 4 条 → 2 条 → 1 条逐步缩小，出错的那条单独失败 MAX_ATTEMPTS 次后移入死信
+    assert store.dead == [(('like', user_id, poison), True, store.dead[0][2])]
+    liked = set(db.session.scalars(select(Like.post_id).where(Like.user_id == user_id)))
+    assert liked == set(post_ids) - {poison}
+    assert reaction_queue._batch_limit == reaction_queue.BATCH_SIZE
+    assert f'like:{user_id}:{poison}=1' in caplog.text
+    assert any(record.levelname == 'ERROR' and 'Dropping' in record.getMessage() for record in caplog.records)
+
+
+def test_flush_keeps_the_batch_on_transient_errors(db, queued, monkeypatch):
+    store, _, post_ids = queued
+
+    def unavailable(*args):
+        raise OperationalError('UPDATE', {}, Exception('database is locked'))
+
+    monkeypatch.setattr(reactions, 'set_state', unavailable)
+    for _ in range(reaction_queue.MAX_ATTEMPTS + 1):
+        with pytest.raises(OperationalError):
+            reaction_queue.flush()
+    assert len(store) == len(post_ids)
+    assert store.dead == []
+    assert reaction_queue._batch_limit == reaction_queue.BATCH_SIZE
+
+
+def test_sqlite_dead_letter_moves_entries_out_of_the_queue(tmp_path):
+    store = SQLiteStore(str(tmp_path / 'queue.sqlite3'))
+    store.toggle(KEY, lambda: False)
+    store.dead_letter(store.take(10))
+    assert len(store) == 0
+    conn = sqlite3.connect(str(tmp_path / 'queue.sqlite3'))
+    assert conn.execute("SELECT kind, user_id, post_id, desired FROM dead_reactions").fetchall() == [('like', 1, 1, 1)]
+    # 移出队列后再次切换以数据库状态为基准
+    assert store.toggle(KEY, lambda: False) is True
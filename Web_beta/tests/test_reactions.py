@@ -0,0 +1,46 @@
+from sqlalchemy import select, func
+from conftest import make_user, log_in
+
+
+def test_toggle_on_deleted_post_leaves_no_orphan(db, client):
+    from models import Like, Complaint
+    log_in(client, make_user('student'))
+    assert client.post('/api/posts/999999/like').status_code == 404
+    # 整页回退链接同样不能为不存在的帖子写入
+    assert client.get('/toggle-like/999999').status_code == 302
+    assert client.get('/toggle-complaint/999999').status_code == 302
+    assert db.session.scalar(select(func.count()).select_from(Like)) == 0
+    assert db.session.scalar(select(func.count()).select_from(Complaint)) == 0
+
+
+def test_page_toggle_still_works(db, client):
+    from models import Post
+    user = make_user('student')
+    log_in(client, user)
+    client.post('/create-post', data={'content': 'hello'})
+    post_id = db.session.scalar(select(Post.id))
+    client.get(f'/toggle-like/{post_id}')
+    assert db.session.get(Post, post_id).like_count == 1
+    db.session.expire_all()
+    client.get(f'/toggle-like/{post_id}')
+    assert db.session.get(Post, post_id).like_count == 0
+
+
+def test_api_toggle_statements(db, client, count_queries):
+    from models import Post
+    log_in(client, make_user('student'))
+    client.post('/create-post', data={'content': 'hello'})
+    post_id = db.session.scalar(select(Post.id))
+    client.post(f'/api/posts/{post_id}/like')
+    client.post(f'/api/posts/{post_id}/like')  # 预热：内容版本行已存在
+
+    # 登录校验读内容版本 1 条；删除 1 条（没有删到时再插入 1 条）；帖子计数 UPDATE ... RETURNING 1 条；
+    # 作者分数 1 条；论坛和排行榜内容版本合为 1 条；实时更新事件 1 条
+    with count_queries() as statements:
+        response = client.post(f'/api/posts/{post_id}/like')
+    assert response.get_json() == {'success': True, 'post_id': post_id, 'active': True, 'count': 1}
+    assert len(statements) == 7
+    with count_queries() as statements:
+        response = client.post(f'/api/posts/{post_id}/like')
+    assert response.get_json() == {'success': True, 'post_id': post_id, 'active': False, 'count': 0}
+    assert len(statements) == 6
@@ -0,0 +1,103 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+WEB_BETA = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 本系列改动之前（baseline）由 db.create_all 建出的表结构
+LEGACY_SCHEMA = """
+CREATE TABLE users (id INTEGER NOT NULL, username VARCHAR(80) NOT NULL, password VARCHAR(200) NOT NULL,
+    login_type VARCHAR(20) NOT NULL, birthdate VARCHAR(10), created_by VARCHAR(80), created_at DATETIME NOT NULL,
+    PRIMARY KEY (id), UNIQUE (username));
+CREATE TABLE posts (id INTEGER NOT NULL, content TEXT NOT NULL, author_id INTEGER NOT NULL,
+    created_at DATETIME NOT NULL, PRIMARY KEY (id), FOREIGN KEY(author_id) REFERENCES users (id));
+CREATE TABLE todos (id INTEGER NOT NULL, task VARCHAR(200) NOT NULL, date VARCHAR(10), time VARCHAR(5),
+    priority VARCHAR(10) NOT NULL, completed BOOLEAN NOT NULL, created_at DATETIME NOT NULL, user_id INTEGER NOT NULL,
+    PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES users (id));
+CREATE TABLE comments (id INTEGER NOT NULL, content TEXT NOT NULL, post_id INTEGER NOT NULL,
+    author_id INTEGER NOT NULL, created_at DATETIME NOT NULL, PRIMARY KEY (id),
+    FOREIGN KEY(post_id) REFERENCES posts (id), FOREIGN KEY(author_id) REFERENCES users (id));
+CREATE TABLE likes (id INTEGER NOT NULL, post_id INTEGER NOT NULL, user_id INTEGER NOT NULL,
+    created_at DATETIME NOT NULL, PRIMARY KEY (id),
+    FOREIGN KEY(post_id) REFERENCES posts (id), FOREIGN KEY(user_id) REFERENCES users (id));
+CREATE TABLE complaints (id INTEGER NOT NULL, post_id INTEGER NOT NULL, user_id INTEGER NOT NULL,
+    created_at DATETIME NOT NULL, PRIMARY KEY (id),
+    FOREIGN KEY(post_id) REFERENCES posts (id), FOREIGN KEY(user_id) REFERENCES users (id));
+
+INSERT INTO users VALUES (1, 'S1f', 'x', 'admin', NULL, NULL, '2024-01-01 00:00:00');
+INSERT INTO users VALUES (2, 'stu', 'x', 'birth', '2010-01-01', 'S1f', '2024-01-01 00:00:00');
+INSERT INTO todos VALUES (1, 'past', '2020-01-01', '08:00', 'urgent', 0, '2024-01-01 00:00:00', 2);
+INSERT INTO todos VALUES (2, 'future', '2099-01-01', '', 'low', 0, '2024-01-02 00:00:00', 2);
+INSERT INTO todos VALUES (3, 'no date', NULL, NULL, 'unknown', 0, '2024-01-03 00:00:00', 2);
+INSERT INTO posts VALUES (1, 'hello', 2, '2024-01-01 00:00:00');
+INSERT INTO comments VALUES (1, 'c', 1, 1, '2024-01-01 00:00:00');
+INSERT INTO likes VALUES (1, 1, 1, '2024-01-01 00:00:00');
+INSERT INTO likes VALUES (2, 1, 1, '2024-01-01 00:00:00');
+"""
+
+
+def migrate(path):
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{path}', LOG_LEVEL='WARNING')
+    return subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'migrate'],
+                          cwd=WEB_BETA, env=env, capture_output=True, text=True)
+
+
+def test_legacy_database_upgrades_to_current_schema(tmp_path):
+    path = tmp_path / 'legacy.db'
+    with sqlite3.connect(path) as conn:
+        conn.executescript(LEGACY_SCHEMA)
+
+    result = migrate(path)
+    assert result.returncode == 0, result.stderr
+    assert 'Applied migrations: 1, 2, 3, 4, 5, 6, 7, 8' in result.stdout
+
+    conn = sqlite3.connect(path)
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(todos)')}
+    assert 'priority' not in columns
+    assert {'priority_rank', 'updated_at', 'due_at', 'reminded_at', 'change_seq'} <= columns
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {'ix_todos_user_order', 'ix_todos_user_change', 'ix_todos_due_pending',
+            'uq_likes_post_user', 'ix_posts_created_at_id'} <= indexes
+    assert 'ix_todos_user_updated' not in indexes
+
+    todos = {row[0]: row[1:] for row in conn.execute(
+        'SELECT id, priority_rank, updated_at = created_at, due_at IS NOT NULL, reminded_at IS NOT NULL FROM todos')}
+    # 优先级换成整数，旧待办的 updated_at 回填为 created_at，已过期的待办视为已提醒
+    assert todos == {1: (0, 1, 1, 1), 2: (2, 1, 1, 0), 3: (1, 1, 0, 0)}
+    assert conn.execute('SELECT like_count, comment_count FROM posts').fetchone() == (1, 1)
+    conn.close()
+
+    result = migrate(path)
+    assert result.returncode == 0, result.stderr
+    assert 'Schema is up to date' in result.stdout
+
+
+def test_version_7_database_gets_change_counters(tmp_path):
+    path = tmp_path / 'v7.db'
+    with sqlite3.connect(path) as conn:
+        conn.executescript(LEGACY_SCHEMA)
+    assert migrate(path).returncode == 0
+    # 退回迁移 8 之前的结构：按 updated_at / deleted_at 建的同步索引，没有变更计数列
+    with sqlite3.connect(path) as conn:
+        conn.executescript("""
+            DROP INDEX ix_todos_user_change;
+            DROP INDEX ix_todo_tombstones_user_change;
+            ALTER TABLE todos DROP COLUMN change_seq;
+            ALTER TABLE todo_tombstones DROP COLUMN change_seq;
+            ALTER TABLE users DROP COLUMN todo_version;
+            CREATE INDEX ix_todos_user_updated ON todos (user_id, updated_at, id);
+            CREATE INDEX ix_todo_tombstones_user_deleted ON todo_tombstones (user_id, deleted_at);
+            DELETE FROM schema_version WHERE version = 8;
+        """)
+
+    result = migrate(path)
+    assert result.returncode == 0, result.stderr
+    assert 'Applied migrations: 8' in result.stdout
+    conn = sqlite3.connect(path)
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {'ix_todos_user_change', 'ix_todo_tombstones_user_change'} <= indexes
+    assert not {'ix_todos_user_updated', 'ix_todo_tombstones_user_deleted'} & indexes
+    assert conn.execute('SELECT DISTINCT change_seq FROM todos').fetchall() == [(0,)]
+    assert conn.execute('SELECT DISTINCT todo_version FROM users').fetchall() == [(0,)]
+    conn.close()
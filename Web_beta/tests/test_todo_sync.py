@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, text
+
+import todo_store
+from conftest import make_user
+
+
+def api_token(client, username):
+    response = client.post('/api/login', json={'username': username, 'password': 'password',
+                                                'birth_date': '2010-01-01'})
+    return {'Authorization': f"Bearer {response.get_json()['token']}"}
+
+
+def batch(client, headers, *operations):
+    response = client.post('/api/todos/batch', json={'operations': list(operations)}, headers=headers)
+    assert response.status_code == 200
+    return [result['id'] for result in response.get_json()['results']]
+
+
+def sync(client, headers, since=None):
+    query = f'?updated_since={since}' if since is not None else ''
+    payload = client.get(f'/api/todos{query}', headers=headers).get_json()
+    return {todo['task']: todo['completed'] for todo in payload['todos']}, payload.get('deleted'), payload['sync_token']
+
+
+def test_write_stamped_before_the_token_is_still_synced(db, client, monkeypatch):
+    make_user('student')
+    headers = api_token(client, 'student')
+    first, second = batch(client, headers, {'op': 'create', 'task': 'first'}, {'op': 'create', 'task': 'second'})
+    _, _, token = sync(client, headers)
+
+    # 写入者 A 的事务按应用时钟打的时间早于客户端拿到的令牌，却在令牌之后才提交
+    class EarlyClock(datetime):
+        @classmethod
+        def utcnow(cls):
+            return datetime.utcnow() - timedelta(hours=1)
+
+    monkeypatch.setattr(todo_store, 'datetime', EarlyClock)
+    batch(client, headers, {'op': 'update', 'id': first, 'completed': True})
+    monkeypatch.undo()
+    # 写入者 B 正常提交
+    batch(client, headers, {'op': 'delete', 'id': second})
+
+    todos, deleted, next_token = sync(client, headers, token)
+    assert todos == {'first': True}
+    assert deleted == [second]
+    assert int(next_token) > int(token)
+    assert sync(client, headers, next_token)[:2] == ({}, [])
+
+
+def test_commit_between_token_and_read_is_sent_again(db, client):
+    student = make_user('student')
+    headers = api_token(client, 'student')
+    batch(client, headers, {'op': 'create', 'task': 'first'})
+    _, _, token = sync(client, headers)
+
+    # 另一个写入者在本次同步读出令牌之后、读取待办之前提交
+    written = []
+
+    def concurrent_write(conn, cursor, statement, *args):
+        if 'FROM todos' in statement and 'change_seq >' in statement and not written:
+            written.append(True)
+            with db.engine.connect() as other:
+                version = other.execute(text(
+                    'UPDATE users SET todo_version = todo_version + 1 WHERE id = :id RETURNING todo_version'
+                ), {'id': student.id}).scalar()
+                other.execute(text(
+                    "INSERT INTO todos (task, date, time, priority_rank, completed, created_at, updated_at, "
+                    "user_id, change_seq) VALUES ('late', '', '', 1, 0, :now, :now, :id, :seq)"
+                ), {'now': datetime.utcnow(), 'id': student.id, 'seq': version})
+                other.commit()
+
+    batch(client, headers, {'op': 'create', 'task': 'second'})
+    event.listen(db.engine, 'before_cursor_execute', concurrent_write)
+    try:
+        todos, _, next_token = sync(client, headers, token)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', concurrent_write)
+    assert written
+    assert set(todos) == {'second', 'late'}
+
+    # 令牌在读取前取得，不含 late；下次同步再收到一次，不会丢失
+    todos, _, _ = sync(client, headers, next_token)
+    assert set(todos) == {'late'}
+
+
+def test_legacy_timestamp_token_resyncs_everything(db, client):
+    make_user('student')
+    headers = api_token(client, 'student')
+    batch(client, headers, {'op': 'create', 'task': 'first'})
+    todos, _, token = sync(client, headers, datetime.utcnow().isoformat())
+    assert todos == {'first': False}
+    assert token.isdigit()
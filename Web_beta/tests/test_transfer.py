@@ -0,0 +1,50 @@
+import io
+
+import transfer
+from conftest import make_user, log_in
+from models import User
+
+
+def users_csv(count, start=0):
+    lines = ['username,password,birthdate']
+    lines += [f'student{i},password,2010-01-01' for i in range(start, start + count)]
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def test_import_stops_starting_batches_after_deadline(db, monkeypatch):
+    # 第一批开始前未到期，第二批开始前已到期
+    clock = iter([0, 100])
+    monkeypatch.setattr(transfer.time, 'monotonic', lambda: next(clock))
+    rows = transfer.read_rows(io.BytesIO(users_csv(5)), 'csv')
+    report = transfer.import_users(rows, 'S1f', batch_size=2, deadline=50)
+
+    assert (report.total, report.created, report.error_count) == (5, 2, 0)
+    assert report.skipped == 3
+    # CSV 第 1 行是表头，student2 在第 4 行
+    assert report.resume_line == 4
+    assert sorted(user.username for user in User.query) == ['student0', 'student1']
+
+
+def test_web_import_reports_where_to_resume(db, client, monkeypatch):
+    monkeypatch.setattr(transfer, 'IMPORT_TIME_BUDGET', 0)
+    log_in(client, make_user('S1f', login_type='admin', birthdate=None))
+    response = client.post('/admin/import/users?format=json',
+                           data={'file': (io.BytesIO(users_csv(3)), 'users.csv')})
+    report = response.get_json()
+    assert (report['created'], report['skipped'], report['resume_line']) == (0, 3, 2)
+
+    response = client.post('/admin/import/users', data={'file': (io.BytesIO(users_csv(3)), 'users.csv')})
+    assert '第 2 行起的 3 行未处理' in response.get_data(as_text=True)
+
+
+def test_cli_import_has_no_time_limit(app, db, tmp_path, monkeypatch):
+    monkeypatch.setattr(transfer, 'IMPORT_TIME_BUDGET', 0)
+    make_user('student1')
+    path = tmp_path / 'users.csv'
+    path.write_bytes(users_csv(3))
+
+    result = app.test_cli_runner().invoke(args=['import-users', str(path), '--created-by', 'S1f'])
+    assert result.exit_code == 0, result.output
+    assert 'line 3 (student1)' in result.output
+    assert 'Imported 2 of 3 users (1 failed)' in result.output
+    assert User.query.filter_by(username='student2').one().created_by == 'S1f'
@@ -0,0 +1,406 @@
+import base64
+import hashlib
+import json
+import logging
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from sqlalchemy import select, insert, update, delete, func, and_, or_, literal
+from models import db, User, Todo, TodoTombstone, PRIORITY_RANKS, priority_rank
+import config
+
+# 与 ix_todos_user_order 索引列顺序一致，数据库可以直接按索引顺序返回；id 作为翻页时的唯一决胜列
+TODO_ORDER = (Todo.completed, Todo.priority_rank, Todo.created_at.desc(), Todo.id)
+# 增量同步按 (change_seq, id) 升序，对应 ix_todos_user_change 索引
+DELTA_ORDER = (Todo.change_seq, Todo.id)
+
+MAX_PAGE_SIZE = 500
+MAX_BATCH_SIZE = 500
+
+
+def _todo_timezone():
+    name = config.env_str('TODO_TIMEZONE', 'Asia/Shanghai')
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        logging.warning(f"Unknown TODO_TIMEZONE={name!r}, using UTC")
+        return timezone.utc
+
+
+# 页面上填写的日期和时间按该时区理解（TODO_TIMEZONE，默认 Asia/Shanghai）
+TODO_TIMEZONE = _todo_timezone()
+
+
+def due_at_for(date, time):
+    """把待办的日期（YYYY-MM-DD）和时间（HH:MM）换算成不带时区的 UTC 时间，无法解析时返回 None。
+
+    只填日期时视为当天 23:59 到期。
+    """
+    if not isinstance(date, str) or not date.strip():
+        return None
+    try:
+        local = datetime.strptime(date.strip(), '%Y-%m-%d').replace(hour=23, minute=59)
+        if isinstance(time, str) and time.strip():
+            clock = datetime.strptime(time.strip()[:5], '%H:%M')
+            local = local.replace(hour=clock.hour, minute=clock.minute)
+    except ValueError:
+        return None
+    return local.replace(tzinfo=TODO_TIMEZONE).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def next_change(user_id):
+    """递增用户的 todo_version 并返回新值，修改待办的事务都要调用一次，把结果写入 change_seq。
+
+    UPDATE 会锁住用户行直到事务结束，同一用户的写事务因此按提交顺序拿到递增的序号：
+    客户端读到令牌 N 时，change_seq <= N 的修改都已提交，不会像按应用时钟打的 updated_at 那样漏掉晚提交的事务。
+    """
+    return db.session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(todo_version=User.todo_version + 1)
+        .returning(User.todo_version)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+
+
+def refresh_due_at(todo_ids):
+    """按数据库中当前的日期和时间重新计算截止时间并清除提醒记录（部分更新日期或时间后调用）。"""
+    rows = db.session.execute(select(Todo.id, Todo.date, Todo.time).where(Todo.id.in_(todo_ids))).all()
+    if rows:
+        db.session.execute(update(Todo), [
+            {'id': todo_id, 'due_at': due_at_for(date, time), 'reminded_at': None}
+            for todo_id, date, time in rows
+        ])
+
+
+def ordered_todos(user_id):
+    return Todo.query.filter_by(user_id=user_id).order_by(*TODO_ORDER).all()
+
+
+def todo_to_dict(todo):
+    # API 边界上优先级仍以字符串表示
+    return {
+        'id': todo.id,
+        'task': todo.task,
+        'date': todo.date,
+        'time': todo.time,
+        'priority': todo.priority,
+        'completed': todo.completed,
+        'due_at': todo.due_at.isoformat() if todo.due_at else None,
+        'created_at': todo.created_at.isoformat(),
+        'updated_at': todo.updated_at.isoformat() if todo.updated_at else None
+    }
+
+
+def record_tombstones(user_id, todo_ids, change_seq):
+    """删除待办时调用，记录墓碑供增量同步使用。"""
+    if todo_ids:
+        db.session.execute(insert(TodoTombstone), [
+            {'todo_id': todo_id, 'user_id': user_id, 'change_seq': change_seq} for todo_id in todo_ids
+        ])
+
+
+# 游标为 base64 编码的 JSON 数组，内容是上一页最后一条记录的排序键
+def _encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _decode_cursor(cursor, size):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('无效的分页游标')
+    if not isinstance(values, list) or len(values) != size or not isinstance(values[-1], int):
+        raise ValueError('无效的分页游标')
+    return values
+
+
+def parse_limit(value):
+    """未提供 limit 时返回 None（返回全部，兼容旧客户端）。"""
+    if value in (None, ''):
+        return None
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError('limit 必须是整数')
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def parse_timestamp(value):
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError('无效的分页游标')
+
+
+def parse_since(value):
+    """解析客户端传回的同步令牌（非负整数）；旧版本签发的 ISO 时间令牌按 0 处理，客户端收到全部数据。"""
+    if value.isdigit():
+        return int(value)
+    try:
+        datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError('updated_since 必须是 sync_token')
+    return 0
+
+
+def _after_in_list_order(cursor):
+    completed, rank, created_at, todo_id = _decode_cursor(cursor, 4)
+    created_at = parse_timestamp(created_at)
+    # (completed ASC, priority_rank ASC, created_at DESC, id ASC) 的键集条件
+    same_completed = and_(Todo.completed == bool(completed), or_(
+        Todo.priority_rank > rank,
+        and_(Todo.priority_rank == rank, or_(
+            Todo.created_at < created_at,
+            and_(Todo.created_at == created_at, Todo.id > todo_id),
+        )),
+    ))
+    if completed:
+        return same_completed
+    return or_(Todo.completed.is_(True), same_completed)
+
+
+def _after_in_delta_order(cursor):
+    change_seq, todo_id = _decode_cursor(cursor, 2)
+    if not isinstance(change_seq, int):
+        raise ValueError('无效的分页游标')
+    return or_(
+        Todo.change_seq > change_seq,
+        and_(Todo.change_seq == change_seq, Todo.id > todo_id),
+    )
+
+
+def _page(stmt, limit, cursor_of):
+    if limit is not None:
+        stmt = stmt.limit(limit + 1)
+    todos = db.session.execute(stmt).scalars().all()
+    next_cursor = None
+    if limit is not None and len(todos) > limit:
+        todos = todos[:limit]
+        next_cursor = _encode_cursor(cursor_of(todos[-1]))
+    return todos, next_cursor
+
+
+def list_page(user_id, limit=None, cursor=None):
+    """按列表顺序返回一页待办：(待办, 下一页游标)。"""
+    stmt = select(Todo).where(Todo.user_id == user_id).order_by(*TODO_ORDER)
+    if cursor:
+        stmt = stmt.where(_after_in_list_order(cursor))
+    return _page(stmt, limit, lambda todo: [
+        todo.completed, todo.priority_rank, todo.created_at.isoformat(), todo.id
+    ])
+
+
+def delta_page(user_id, since, limit=None, cursor=None):
+    """返回同步令牌 since 之后变化的待办和删除的待办 ID：(待办, 删除的 ID, 下一页游标)。
+
+    删除的 ID 只在第一页返回。
+    """
+    stmt = (
+        select(Todo)
+        .where(Todo.user_id == user_id, Todo.change_seq > since)
+        .order_by(*DELTA_ORDER)
+    )
+    if cursor:
+        stmt = stmt.where(_after_in_delta_order(cursor))
+    todos, next_cursor = _page(stmt, limit, lambda todo: [todo.change_seq, todo.id])
+
+    deleted = []
+    if not cursor:
+        deleted = db.session.execute(
+            select(TodoTombstone.todo_id)
+            .where(TodoTombstone.user_id == user_id, TodoTombstone.change_seq > since)
+            .order_by(TodoTombstone.change_seq, TodoTombstone.id)
+        ).scalars().all()
+    return todos, deleted, next_cursor
+
+
+def sync_state(user_id):
+    """一次查询得到 (待办数, 用户的 todo_version)，用于 ETag 与同步令牌；需在读取待办之前调用。"""
+    row = db.session.execute(
+        select(
+            select(func.count(Todo.id)).where(Todo.user_id == user_id).scalar_subquery(),
+            select(User.todo_version).where(User.id == user_id).scalar_subquery(),
+        )
+    ).one()
+    return tuple(row)
+
+
+def etag_for(user_id, state, *params):
+    raw = json.dumps([user_id, [str(value) for value in state], list(params)])
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def sync_token(state):
+    # 客户端下次以 updated_since=sync_token 请求增量数据。令牌在读取待办之前取得：
+    # 之后提交的修改序号更大，下次同步会再次返回（客户端按 id 覆盖即可），不会漏掉
+    return str(state[1] or 0)
+
+
+def toggle(user_id, todo_id):
+    """一条 UPDATE ... RETURNING 切换完成状态，返回新的状态；待办不存在时返回 None。"""
+    return db.session.execute(
+        update(Todo)
+        .where(Todo.id == todo_id, Todo.user_id == user_id)
+        .values(completed=~Todo.completed, updated_at=datetime.utcnow(), change_seq=next_change(user_id))
+        .returning(Todo.completed)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+
+
+def delete_one(user_id, todo_id):
+    """删除单条待办并记录墓碑，返回是否删除成功。"""
+    result = db.session.execute(
+        delete(Todo)
+        .where(Todo.id == todo_id, Todo.user_id == user_id)
+        .execution_options(synchronize_session=False)
+    )
+    if not result.rowcount:
+        return False
+    record_tombstones(user_id, [todo_id], next_change(user_id))
+    return True
+
+
+def complete_all(user_id):
+    """一条 UPDATE 把用户所有未完成的待办标记为完成，返回受影响行数。"""
+    result = db.session.execute(
+        update(Todo)
+        .where(Todo.user_id == user_id, Todo.completed.is_(False))
+        .values(completed=True, updated_at=datetime.utcnow(), change_seq=next_change(user_id))
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+def delete_completed(user_id):
+    """用 INSERT ... SELECT 记录墓碑后一条 DELETE 删除已完成的待办，返回删除数。"""
+    completed = and_(Todo.user_id == user_id, Todo.completed.is_(True))
+    db.session.execute(
+        insert(TodoTombstone).from_select(
+            ['todo_id', 'user_id', 'deleted_at', 'change_seq'],
+            select(Todo.id, Todo.user_id, literal(datetime.utcnow()), literal(next_change(user_id))).where(completed),
+        )
+    )
+    result = db.session.execute(
+        delete(Todo).where(completed).execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+# 批量接口允许更新的字段
+UPDATABLE_FIELDS = ('task', 'date', 'time', 'priority', 'completed')
+
+
+def _todo_values(data, partial):
+    values = {}
+    if 'task' in data or not partial:
+        task = data.get('task')
+        if not isinstance(task, str) or not task.strip():
+            raise ValueError('task 不能为空')
+        if len(task) > 200:
+            raise ValueError('task 过长')
+        values['task'] = task
+    for name in ('date', 'time'):
+        if name in data or not partial:
+            value = data.get(name) or ''
+            if not isinstance(value, str):
+                raise ValueError(f'{name} 必须是字符串')
+            values[name] = value
+    if not partial:
+        values['due_at'] = due_at_for(values['date'], values['time'])
+    if 'priority' in data or not partial:
+        priority = data.get('priority', 'medium')
+        if priority not in PRIORITY_RANKS:
+            raise ValueError('无效的优先级')
+        values['priority_rank'] = priority_rank(priority)
+    if 'completed' in data:
+        if not isinstance(data['completed'], bool):
+            raise ValueError('completed 必须是布尔值')
+        values['completed'] = data['completed']
+    return values
+
+
+def apply_batch(user_id, operations):
+    """在一个事务内批量执行 create/update/delete 操作，返回逐条结果。
+
+    每个操作形如 {"op": "create", "task": ...}、{"op": "update", "id": 1, "completed": true}
+    或 {"op": "delete", "id": 1}。校验失败的操作单独报错，不影响其他操作；
+    调用方负责提交事务。
+    """
+    results = [None] * len(operations)
+    creates, updates, deletes = [], [], []
+
+    for index, operation in enumerate(operations):
+        try:
+            if not isinstance(operation, dict):
+                raise ValueError('操作必须是对象')
+            op = operation.get('op')
+            if op == 'create':
+                creates.append((index, _todo_values(operation, partial=False)))
+            elif op in ('update', 'delete'):
+                todo_id = operation.get('id')
+                if not isinstance(todo_id, int) or isinstance(todo_id, bool):
+                    raise ValueError('需要待办 ID')
+                if op == 'update':
+                    values = _todo_values(operation, partial=True)
+                    if not values:
+                        raise ValueError('没有需要更新的字段')
+                    updates.append((index, todo_id, values))
+                else:
+                    deletes.append((index, todo_id))
+            else:
+                raise ValueError('未知的操作类型')
+        except ValueError as e:
+            results[index] = {'index': index, 'status': 'error', 'error': str(e)}
+
+    # 一次查询确认 update/delete 涉及的待办都属于该用户
+    requested = {todo_id for _, todo_id, _ in updates} | {todo_id for _, todo_id in deletes}
+    owned = set()
+    if requested:
+        owned = set(db.session.execute(
+            select(Todo.id).where(Todo.user_id == user_id, Todo.id.in_(requested))
+        ).scalars())
+
+    now = datetime.utcnow()
+    deleted_ids = {todo_id for _, todo_id in deletes if todo_id in owned}
+    writes = creates or deleted_ids or any(todo_id in owned for _, todo_id, _ in updates)
+    change_seq = next_change(user_id) if writes else None
+    if creates:
+        rows = [dict(values, user_id=user_id, created_at=now, updated_at=now, change_seq=change_seq)
+                for _, values in creates]
+        new_ids = db.session.execute(
+            insert(Todo).returning(Todo.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+        for (index, _), todo_id in zip(creates, new_ids):
+            results[index] = {'index': index, 'status': 'ok', 'op': 'create', 'id': todo_id}
+
+    update_rows = {}
+    for index, todo_id, values in updates:
+        if todo_id not in owned or todo_id in deleted_ids:
+            results[index] = {'index': index, 'status': 'error', 'id': todo_id, 'error': '待办不存在'}
+            continue
+        # 同一待办的多次更新按顺序合并
+        update_rows.setdefault(todo_id, {}).update(values)
+        results[index] = {'index': index, 'status': 'ok', 'op': 'update', 'id': todo_id}
+    if update_rows:
+        db.session.execute(
+            update(Todo),
+            [dict(values, id=todo_id, updated_at=now, change_seq=change_seq) for todo_id, values in update_rows.items()],
+        )
+        rescheduled = [todo_id for todo_id, values in update_rows.items() if 'date' in values or 'time' in values]
+        if rescheduled:
+            refresh_due_at(rescheduled)
+
+    for index, todo_id in deletes:
+        if todo_id in deleted_ids:
+            results[index] = {'index': index, 'status': 'ok', 'op': 'delete', 'id': todo_id}
+        else:
+            results[index] = {'index': index, 'status': 'error', 'id': todo_id, 'error': '待办不存在'}
+    if deleted_ids:
+        record_tombstones(user_id, sorted(deleted_ids), change_seq)
+        db.session.execute(
+            delete(Todo).where(Todo.id.in_(deleted_ids)).execution_options(synchronize_session=False)
+        )
+
+    return results
@@ -0,0 +1,272 @@
+import csv
+import io
+import json
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import select, insert, case
+from sqlalchemy.exc import IntegrityError
+from models import db, User, Post, Comment, Todo, PRIORITY_RANKS, DEFAULT_PRIORITY
+import config
+import fragment_cache
+import leaderboard
+import passwords
+
+# 管理员的数据导出与批量导入，均可通过环境变量调整：
+#   EXPORT_CHUNK_ROWS   导出时每次从数据库取出并写入响应的行数（默认 1000）；PostgreSQL 上使用服务端游标，
+#                       内存占用与总行数无关，但下载期间会一直占用一个数据库连接
+#   IMPORT_BATCH_SIZE   导入用户时每批哈希、插入并提交的行数（默认 200）
+#   IMPORT_TIME_BUDGET  网页上传导入时最多处理多少秒（默认 15），超出后不再开始新的一批，剩余行留给下次上传；
+#                       应小于 GUNICORN_TIMEOUT。按默认哈希成本，单核每秒只能哈希约 3 个密码，
+#                       整个年级的名单请用 flask --app app import-users 文件 在命令行导入（不受时间限制）
+CHUNK_ROWS = config.env_int('EXPORT_CHUNK_ROWS', 1000)
+IMPORT_BATCH_SIZE = config.env_int('IMPORT_BATCH_SIZE', 200)
+IMPORT_TIME_BUDGET = config.env_int('IMPORT_TIME_BUDGET', 15)
+# 网页导入每批的行数：一批的哈希时间要远小于时间预算，超时检查才有意义
+WEB_IMPORT_BATCH_SIZE = 20
+MAX_REPORTED_ERRORS = 1000
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+_priority_name = case(
+    *((Todo.priority_rank == rank, name) for name, rank in PRIORITY_RANKS.items()),
+    else_=DEFAULT_PRIORITY,
+)
+
+
+def export_query(dataset, include_hashes=False):
+    """返回导出用的查询，数据集不存在时返回 None；按主键排序，结果可以直接用于比对或迁移。"""
+    if dataset == 'users':
+        columns = [User.id, User.username, User.login_type, User.birthdate, User.created_by, User.created_at]
+        if include_hashes:
+            columns.append(User.password.label('password_hash'))
+        return select(*columns).order_by(User.id)
+    if dataset == 'todos':
+        return (
+            select(Todo.id, Todo.user_id, User.username, Todo.task, Todo.date, Todo.time,
+                   _priority_name.label('priority'), Todo.completed, Todo.due_at, Todo.created_at, Todo.updated_at)
+            .join(User, User.id == Todo.user_id)
+            .order_by(Todo.id)
+        )
+    if dataset == 'posts':
+        return (
+            select(Post.id, Post.author_id, User.username.label('author_name'), Post.content, Post.created_at,
+                   Post.like_count, Post.complaint_count, Post.comment_count)
+            .join(User, User.id == Post.author_id)
+            .order_by(Post.id)
+        )
+    if dataset == 'comments':
+        return (
+            select(Comment.id, Comment.post_id, Comment.author_id, User.username.label('author_name'),
+                   Comment.content, Comment.created_at)
+            .join(User, User.id == Comment.author_id)
+            .order_by(Comment.id)
+        )
+    return None
+
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def stream_export(stmt, fmt, chunk_rows=CHUNK_ROWS):
+    """逐批读取查询结果并生成响应体片段（需在 stream_with_context 中迭代）。
+
+    CSV 带 UTF-8 BOM 和表头，Excel 可以直接打开中文；NDJSON 每行一个 JSON 对象。
+    """
+    result = db.session.execute(stmt.execution_options(yield_per=chunk_rows))
+    columns = list(result.keys())
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == 'csv':
+        buffer.write('\ufeff')
+        writer.writerow(columns)
+    for rows in result.partitions():
+        for row in rows:
+            if fmt == 'csv':
+                writer.writerow(['' if value is None else _plain(value) for value in row])
+            else:
+                buffer.write(json.dumps(dict(zip(columns, map(_plain, row))), ensure_ascii=False))
+                buffer.write('\n')
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+@dataclass
+class ImportReport:
+    total: int = 0
+    created: int = 0
+    errors: List[dict] = field(default_factory=list)
+    error_count: int = 0
+    # 超出时间预算后未处理的行数，以及第一行未处理的行号（重新上传时从这一行开始）
+    skipped: int = 0
+    resume_line: Optional[int] = None
+
+    def error(self, line, username, message):
+        self.error_count += 1
+        # 只保留前若干条错误明细，报告大小不随文件增长
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'username': username, 'error': message})
+
+    def to_dict(self):
+        return {'total': self.total, 'created': self.created, 'error_count': self.error_count,
+                'errors': self.errors, 'skipped': self.skipped, 'resume_line': self.resume_line}
+
+
+def detect_format(filename):
+    """按扩展名判断上传文件的格式：.ndjson / .jsonl 为 NDJSON，其余按 CSV 解析。"""
+    return 'ndjson' if filename.lower().endswith(('.ndjson', '.jsonl')) else 'csv'
+
+
+def read_rows(stream, fmt):
+    """逐行解析上传的文件，生成 (行号, 字段字典或 None, 错误信息或 None)。"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        if fmt == 'csv':
+            reader = csv.DictReader(text)
+            for row in reader:
+                yield reader.line_num, row, None
+            return
+        for line_no, line in enumerate(text, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield line_no, None, '不是有效的 JSON'
+                continue
+            if not isinstance(row, dict):
+                yield line_no, None, '每行必须是 JSON 对象'
+                continue
+            yield line_no, row, None
+    except UnicodeDecodeError:
+        yield None, None, '文件必须是 UTF-8 编码'
+    finally:
+        text.detach()
+
+
+def _validate(row):
+    """返回 (字段, 错误信息)；password 为明文，password_hash 为导出文件中带出的哈希，二选一。"""
+    username = row.get('username')
+    if not isinstance(username, str) or not username.strip():
+        return None, '用户名不能为空'
+    username = username.strip()
+    if len(username) > 80:
+        return None, '用户名过长'
+    birthdate = row.get('birthdate')
+    if not isinstance(birthdate, str):
+        return None, '出生日期不能为空'
+    try:
+        datetime.strptime(birthdate.strip(), '%Y-%m-%d')
+    except ValueError:
+        return None, '出生日期格式应为 YYYY-MM-DD'
+    values = {'username': username, 'birthdate': birthdate.strip()}
+    password_hash = row.get('password_hash')
+    password = row.get('password')
+    if password_hash:
+        if not passwords.looks_like_hash(password_hash):
+            return None, 'password_hash 不是有效的密码哈希'
+        values['password'] = password_hash
+    elif isinstance(password, str) and password:
+        values['plain'] = password
+    else:
+        return None, '密码不能为空'
+    return values, None
+
+
+def _insert_users(rows):
+    ids = db.session.execute(
+        insert(User).returning(User.id, User.username, sort_by_parameter_order=True), rows
+    ).all()
+    leaderboard.add_users(ids)
+    return len(ids)
+
+
+def _import_batch(batch, created_by, report):
+    names = [values['username'] for _, values in batch]
+    existing = set(db.session.scalars(select(User.username).where(User.username.in_(names))))
+    for line, values in batch:
+        if values['username'] in existing:
+            report.error(line, values['username'], '用户名已存在')
+    batch = [(line, values) for line, values in batch if values['username'] not in existing]
+    plain = [values for _, values in batch if 'plain' in values]
+    if plain:
+        try:
+            hashes = passwords.hash_passwords([values.pop('plain') for values in plain])
+        except passwords.HashingBusy as e:
+            for line, values in batch:
+                report.error(line, values['username'], str(e))
+            return
+        for values, password_hash in zip(plain, hashes):
+            values['password'] = password_hash
+    if not batch:
+        return
+
+    now = datetime.utcnow()
+    rows = [dict(values, login_type='birth', created_by=created_by, created_at=now) for _, values in batch]
+    try:
+        created = _insert_users(rows)
+        fragment_cache.bump(fragment_cache.LEADERBOARD)
+        db.session.commit()
+        report.created += created
+        return
+    except IntegrityError:
+        db.session.rollback()
+    # 与其他请求并发创建了同名用户：逐行插入，只让冲突的行失败
+    for (line, values), row in zip(batch, rows):
+        try:
+            with db.session.begin_nested():
+                report.created += _insert_users([row])
+        except IntegrityError:
+            report.error(line, values['username'], '用户名已存在')
+    fragment_cache.bump(fragment_cache.LEADERBOARD)
+    db.session.commit()
+
+
+def _skip_rest(batch, rows, report):
+    report.resume_line = batch[0][0] if batch else None
+    report.skipped = len(batch)
+    for line, _, _ in rows:
+        report.total += 1
+        report.skipped += 1
+        if report.resume_line is None:
+            report.resume_line = line
+
+
+def import_users(rows, created_by, batch_size=IMPORT_BATCH_SIZE, deadline=None):
+    """批量创建普通用户：每批一次查重、并行哈希、一条多行 INSERT 并提交，返回 ImportReport。
+
+    rows 为 read_rows 生成的 (行号, 字段, 错误)；出错的行记入报告，不影响其他行。
+    deadline 为 time.monotonic() 的截止时间：到期后不再开始新的一批，剩余行记为 skipped。
+    """
+    report = ImportReport()
+    seen = set()
+    batch = []
+    rows = iter(rows)
+    for line, row, error in rows:
+        report.total += 1
+        values = None
+        if error is None:
+            values, error = _validate(row)
+        if error is None and values['username'] in seen:
+            error = '文件中用户名重复'
+        if error is not None:
+            report.error(line, row.get('username') if isinstance(row, dict) else None, error)
+            continue
+        seen.add(values['username'])
+        batch.append((line, values))
+        if len(batch) >= batch_size:
+            if deadline is not None and time.monotonic() >= deadline:
+                _skip_rest(batch, rows, report)
+                return report
+            _import_batch(batch, created_by, report)
+            batch = []
+    if batch:
+        if deadline is not None and time.monotonic() >= deadline:
+            _skip_rest(batch, rows, report)
+            return report
+        _import_batch(batch, created_by, report)
+    return report
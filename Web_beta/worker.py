@@ -0,0 +1,9 @@
+"""待办提醒 worker：与 web 进程分开运行，python worker.py。
+
+数据库迁移由部署时的 flask --app app bootstrap 完成。
+"""
+from app import app
+import reminders
+
+if __name__ == "__main__":
+    reminders.run_forever(app)
@@ -1,8 +1,6 @@
-from app import app, db, init_db
+from app import app
 
-# 确保数据库表被创建
-with app.app_context():
-    init_db()
+# 建表、迁移和管理员账户由部署时的 flask --app app bootstrap 完成一次，worker 启动时不访问数据库
 
 if __name__ == "__main__":
     app.run()